@@ -3,6 +3,9 @@ ASGI config for ai_assistant project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Producción (ver "Despliegue ASGI" en el README):
+    uvicorn ai_assistant.asgi:application --workers 4 --loop uvloop --http httptools
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +15,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ai_assistant.settings')
+# Sin conexiones persistentes a la base bajo ASGI (ver CONN_MAX_AGE en settings)
+os.environ.setdefault('AI_ASSISTANT_ASGI', '1')
 
 application = get_asgi_application()
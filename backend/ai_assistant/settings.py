@@ -11,6 +11,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,7 +48,9 @@ INSTALLED_APPS = [
 
 # ✅ ACTUALIZADO: Agregar CORS middleware
 MIDDLEWARE = [
+    'customer_support.metricas.MetricasMiddleware',  # ✅ NUEVO: Solo mide (no responde), envuelve todo el request
     'corsheaders.middleware.CorsMiddleware',  # ✅ NUEVO: CORS debe ir primero
+    'customer_support.limites.LimitesMiddleware',  # ✅ NUEVO: 429/503 con headers CORS y medidos en métricas
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,6 +89,37 @@ DATABASES = {
     }
 }
 
+# ✅ NUEVO: Perfil de producción para SQLite, aplicado a cada conexión nueva
+# WAL: los lectores no esperan a los escritores (ni al revés); con
+# synchronous=NORMAL un corte de luz puede perder el último commit, pero
+# la base nunca queda corrupta. False = configuración por defecto de SQLite
+SQLITE_PRODUCCION = True
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,  # 256 MB leídos vía mmap
+    'cache_size': -64000,            # Negativo = KiB (64 MB por conexión)
+    'temp_store': 'MEMORY',
+}
+
+# Conexiones persistentes solo con WSGI: bajo ASGI las vistas sync corren en
+# hilos del executor y cada uno se quedaría con su conexión abierta (Django
+# recomienda 0). asgi.py define AI_ASSISTANT_ASGI antes de cargar los settings
+CONN_MAX_AGE = 0 if os.environ.get('AI_ASSISTANT_ASGI') else 600
+
+if SQLITE_PRODUCCION:
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': CONN_MAX_AGE,  # Segundos (por hilo)
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': '; '.join(f'PRAGMA {nombre}={valor}' for nombre, valor in SQLITE_PRAGMAS.items()),
+            'timeout': 20,            # busy timeout en segundos antes de "database is locked"
+            # Las transacciones toman el lock de escritura al empezar: sin
+            # deadlocks al pasar de lectura a escritura (que no esperan el timeout)
+            'transaction_mode': 'IMMEDIATE',
+        },
+    })
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 AUTH_PASSWORD_VALIDATORS = [
@@ -129,11 +163,22 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Para desarrollo - cambiar en producción
     ],
+    # ✅ NUEVO: JSON con orjson y MessagePack (Accept: application/msgpack) si están instalados
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'customer_support.renderers.ORJSONRenderer',
+        'customer_support.renderers.MessagePackRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',  # Para navegador
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PARSER_CLASSES': [
+        'customer_support.renderers.ORJSONParser',
+        'customer_support.renderers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # ✅ NUEVO: API navegable solo si el cliente pide text/html (navegador)
+    'DEFAULT_CONTENT_NEGOTIATION_CLASS': 'customer_support.renderers.NegociacionContenido',
+    # ✅ NUEVO: ?page=N como siempre, o ?paginacion=cursor (keyset, sin COUNT ni OFFSET)
+    'DEFAULT_PAGINATION_CLASS': 'customer_support.paginacion.PaginacionSeleccionable',
     'PAGE_SIZE': 20
 }
 
@@ -157,8 +202,113 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',  # ✅ NUEVO: reintentos seguros de crear-ticket y registrar-pago
+    'last-event-id',    # ✅ NUEVO: reconexión de /api/events/stream/
+    'x-api-key',        # ✅ NUEVO: identidad para los límites de tasa (LIMITES)
 ]
 
+# ✅ NUEVO: Escritura de auditoría (HistorialAccion) fuera del hot path
+# MODO: 'sync' (INSERT dentro del request), 'buffered' (bulk_create en un hilo
+# de fondo) o 'sampled' (buffered + solo una fracción de los tipos en MUESTREO)
+AUDITORIA = {
+    'MODO': 'buffered',
+    'BUFFER_TAMANO': 200,           # Guardar al juntar 200 acciones...
+    'BUFFER_INTERVALO': 2.0,        # ...o cada 2 segundos
+    'MAX_PENDIENTES': 10000,        # Tope de memoria: más allá se descartan
+    'MUESTREO': {'consulta': 0.1},  # Solo en modo 'sampled': 10% de consultas
+}
+
+# ✅ NUEVO: Retención de HistorialAccion (python manage.py archivar_historial)
+# Las acciones de más de DIAS días se mueven a archivos .ndjson.gz por día
+# (datos de clientes e IPs: fuera de git; en producción, fuera del checkout)
+RETENCION_HISTORIAL = {
+    'DIAS': 90,
+    'DIRECTORIO': BASE_DIR / 'archivo' / 'historial',
+}
+
+# ✅ NUEVO: Idempotency-Key en crear-ticket y registrar-pago (customer_support/idempotencia.py)
+# Las claves vencidas se borran con python manage.py limpiar_idempotencia
+IDEMPOTENCIA = {
+    'TTL': 24 * 60 * 60,            # Segundos que se guarda cada respuesta
+    'ESPERA': 10.0,                 # Máximo esperando a un duplicado en curso (luego 409)
+    'ABANDONO': 60,                 # Una clave async "en proceso" más vieja se puede reusar
+}
+
+# ✅ NUEVO: Eventos de tickets, pagos y saldos en /api/events/stream/ (customer_support/eventos.py)
+# Los eventos viejos se borran con python manage.py limpiar_eventos
+EVENTOS = {
+    'ACTIVO': True,
+    'INTERVALO': 0.5,               # Segundos entre lecturas de eventos nuevos (una por proceso)
+    'HEARTBEAT': 15.0,              # Comentario SSE para que los proxies no corten la conexión
+    'REINTENTO': 3000,              # ms antes de que el navegador reconecte (retry:)
+    'RETENCION': 24 * 60 * 60,      # Segundos que se guardan (reconexiones con Last-Event-ID)
+    'MAX_COLA': 1000,               # Eventos sin leer antes de cerrar una conexión lenta
+}
+
+# ✅ NUEVO: Métricas por endpoint en /api/metrics/ (formato Prometheus)
+# DIRECTORIO: carpeta compartida por los workers (gunicorn/uvicorn) donde cada
+# proceso guarda sus contadores; vacío = solo los del proceso que responde
+METRICAS = {
+    'ACTIVO': True,
+    'DIRECTORIO': BASE_DIR / 'metricas',
+    'INTERVALO': 5.0,               # Segundos entre escrituras al directorio
+    'CADUCIDAD': 60.0,              # Sin latido en ese tiempo = worker terminado
+}
+
+# ✅ NUEVO: Cachés
+# 'tools' guarda las respuestas de las AI tools de solo lectura y tiene que
+# ser compartida por todos los workers: en archivos sirve en un solo host
+# (FileBasedCache que no lista el directorio en cada escritura, ver
+# customer_support/cache_archivos.py); con varios hosts usar Redis:
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#   'LOCATION': 'redis://127.0.0.1:6379/1',
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'tools': {
+        'BACKEND': 'customer_support.cache_archivos.CacheArchivos',
+        'LOCATION': BASE_DIR / 'cache' / 'tools',
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'CULL_CADA': 100,       # Revisar MAX_ENTRIES cada 100 escrituras
+        },
+    },
+}
+
+# ✅ NUEVO: Caché de buscar-cliente, saldo y dashboard (customer_support/cache_tools.py)
+# Se invalida con las señales de Cliente, Ticket y Pago; TTL es solo un tope
+CACHE_TOOLS = {
+    'ACTIVO': True,
+    'ALIAS': 'tools',
+    'TTL': 300,                     # Segundos
+    'ESPERA': 2.0,                  # Máximo esperando a otro request que calcula lo mismo
+}
+
+# ✅ NUEVO: Límites de tasa y control de admisión (customer_support/limites.py)
+# TASAS: token bucket por tool y por API key registrada (header X-API-Key,
+# keys en LIMITES_API_KEYS separadas por comas) o IP, con
+# estado en la caché compartida ALIAS: (ráfaga, llamadas por segundo sostenidas)
+# Con 'tools' en archivos cada consulta del bucket lee y escribe un archivo
+# y el límite es aproximado entre workers; en producción usar Redis
+# MAX_EN_VUELO: requests simultáneos por proceso; cada prioridad entra
+# hasta su fracción (el dashboard y las exportaciones se rechazan primero)
+LIMITES = {
+    'ACTIVO': True,
+    'ALIAS': 'tools',
+    'HEADER_API_KEY': 'X-API-Key',
+    'API_KEYS': [clave for clave in os.environ.get('LIMITES_API_KEYS', '').split(',') if clave],
+    'TASAS': {
+        'buscar_cliente': (60, 1.0),      # 60 seguidas, luego 60/min
+        'consultar_saldo': (60, 1.0),
+        'contexto_cliente': (60, 1.0),
+        'crear_ticket': (30, 0.5),        # 30 seguidas, luego 30/min
+        'registrar_pago': (30, 0.5),
+    },
+    'MAX_EN_VUELO': 64,
+    'PRIORIDADES': {'baja': 0.5, 'normal': 0.8, 'alta': 1.0},
+}
+
 # ✅ NUEVO: Configuración de logging para debugging
 LOGGING = {
     'version': 1,
@@ -3,16 +3,59 @@ Configuración del Django Admin para AI Assistant
 Interface web para administrar los datos del sistema
 """
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList, ORDER_VAR
 from django.utils.html import format_html
-from django.urls import reverse
-from django.db.models import Sum, Count
+from django.urls import get_script_prefix, get_urlconf, reverse
+from django.db import transaction
+from django.db.models import Sum, Count, Q
+from functools import lru_cache
+from . import estadisticas, search, transiciones
 from .models import Cliente, Ticket, Pago, HistorialAccion
 
+MARCA_ID = '__cliente_id__'
+
+@lru_cache(maxsize=None)
+def _url_cambio_cliente(prefijo, urlconf):
+    """URL de edición del cliente con MARCA_ID en lugar del id (un reverse por prefijo/urlconf)"""
+    return reverse('admin:customer_support_cliente_change', urlconf=urlconf, args=[MARCA_ID])
+
+def link_cliente(cliente_id, nombre):
+    """Link al admin del cliente (usa cliente_id: no dispara la consulta del FK)"""
+    url = _url_cambio_cliente(get_script_prefix(), get_urlconf()).replace(MARCA_ID, str(cliente_id))
+    return format_html('<a href="{}">{}</a>', url, nombre)
+
+class ChangeListPorRelevancia(ChangeList):
+    """
+    ChangeList que ordena por relevancia del índice FTS5 cuando hay
+    búsqueda y el usuario no eligió una columna de orden
+    """
+    def get_ordering(self, request, queryset):
+        if 'relevancia' in queryset.query.annotations and ORDER_VAR not in self.params:
+            return ['relevancia', '-pk']
+        return super().get_ordering(request, queryset)
+
+class BusquedaIndexadaMixin:
+    """
+    Reemplaza la búsqueda icontains del admin por el índice FTS5
+    (ver customer_support/search.py) cuando el término es indexable
+    """
+    filtro_busqueda = None
+    
+    def get_search_results(self, request, queryset, search_term):
+        expresion = search.usar_fts(search_term)
+        if expresion:
+            return self.filtro_busqueda(queryset, expresion), False
+        return super().get_search_results(request, queryset, search_term)
+    
+    def get_changelist(self, request, **kwargs):
+        return ChangeListPorRelevancia
+
 @admin.register(Cliente)
-class ClienteAdmin(admin.ModelAdmin):
+class ClienteAdmin(BusquedaIndexadaMixin, admin.ModelAdmin):
     """
     Administración de Clientes
     """
+    filtro_busqueda = staticmethod(search.filtrar_clientes)
     list_display = [
         'nombre', 
         'email', 
@@ -60,10 +103,17 @@ class ClienteAdmin(admin.ModelAdmin):
     saldo_badge.short_description = "💰 Saldo"
     saldo_badge.admin_order_field = 'saldo'
     
+    def get_queryset(self, request):
+        """Conteos de tickets anotados: el changelist no consulta por fila"""
+        return super().get_queryset(request).annotate(
+            tickets_total=Count('tickets'),
+            tickets_abiertos=Count('tickets', filter=Q(tickets__estado__in=['abierto', 'en_proceso'])),
+        )
+    
     def total_tickets_badge(self, obj):
         """Badge con total de tickets"""
-        total = obj.tickets.count()
-        abiertos = obj.tickets.filter(estado__in=['abierto', 'en_proceso']).count()
+        total = obj.tickets_total
+        abiertos = obj.tickets_abiertos
         
         if abiertos > 0:
             color = 'red'
@@ -77,6 +127,7 @@ class ClienteAdmin(admin.ModelAdmin):
             color, icon, total, abiertos
         )
     total_tickets_badge.short_description = "🎫 Tickets"
+    total_tickets_badge.admin_order_field = 'tickets_total'
     
     def total_pagos(self, obj):
         """Total de pagos realizados"""
@@ -96,21 +147,26 @@ class ClienteAdmin(admin.ModelAdmin):
     
     def activar_clientes(self, request, queryset):
         """Acción masiva para activar clientes"""
-        updated = queryset.update(activo=True)
+        with transaction.atomic():
+            estadisticas.registrar_update(queryset, activo=True)
+            updated = queryset.update(activo=True)
         self.message_user(request, f"{updated} clientes activados.")
     activar_clientes.short_description = "✅ Activar clientes seleccionados"
     
     def desactivar_clientes(self, request, queryset):
         """Acción masiva para desactivar clientes"""
-        updated = queryset.update(activo=False)
+        with transaction.atomic():
+            estadisticas.registrar_update(queryset, activo=False)
+            updated = queryset.update(activo=False)
         self.message_user(request, f"{updated} clientes desactivados.")
     desactivar_clientes.short_description = "❌ Desactivar clientes seleccionados"
 
 @admin.register(Ticket)
-class TicketAdmin(admin.ModelAdmin):
+class TicketAdmin(BusquedaIndexadaMixin, admin.ModelAdmin):
     """
     Administración de Tickets
     """
+    filtro_busqueda = staticmethod(search.filtrar_tickets)
     list_display = [
         'id_formateado', 
         'cliente_link', 
@@ -137,6 +193,7 @@ class TicketAdmin(admin.ModelAdmin):
         'fecha_actualizacion', 
         'tiempo_resolucion_display'
     ]
+    list_select_related = ['cliente', 'asignado_a']
     list_per_page = 25
     date_hierarchy = 'fecha_creacion'
     
@@ -165,8 +222,7 @@ class TicketAdmin(admin.ModelAdmin):
     
     def cliente_link(self, obj):
         """Link al cliente"""
-        url = reverse('admin:customer_support_cliente_change', args=[obj.cliente.id])
-        return format_html('<a href="{}">{}</a>', url, obj.cliente.nombre)
+        return link_cliente(obj.cliente_id, obj.cliente.nombre)
     cliente_link.short_description = "👤 Cliente"
     cliente_link.admin_order_field = 'cliente__nombre'
     
@@ -223,18 +279,20 @@ class TicketAdmin(admin.ModelAdmin):
     
     def marcar_como_resuelto(self, request, queryset):
         """Acción masiva para marcar tickets como resueltos"""
-        from django.utils import timezone
-        updated = queryset.filter(estado__in=['abierto', 'en_proceso']).update(
-            estado='resuelto',
-            fecha_resolucion=timezone.now()
+        pendientes = queryset.filter(estado__in=['abierto', 'en_proceso'])
+        resumen = transiciones.cambiar_estado(
+            pendientes, 'resuelto', usuario=request.user, ip=request.META.get('REMOTE_ADDR')
         )
-        self.message_user(request, f"{updated} tickets marcados como resueltos.")
+        self.message_user(request, f"{resumen['actualizados']} tickets marcados como resueltos.")
     marcar_como_resuelto.short_description = "✅ Marcar como resuelto"
     
     def marcar_como_en_proceso(self, request, queryset):
         """Acción masiva para marcar tickets en proceso"""
-        updated = queryset.filter(estado='abierto').update(estado='en_proceso')
-        self.message_user(request, f"{updated} tickets marcados en proceso.")
+        abiertos = queryset.filter(estado='abierto')
+        resumen = transiciones.cambiar_estado(
+            abiertos, 'en_proceso', usuario=request.user, ip=request.META.get('REMOTE_ADDR')
+        )
+        self.message_user(request, f"{resumen['actualizados']} tickets marcados en proceso.")
     marcar_como_en_proceso.short_description = "🟡 Marcar en proceso"
 
 @admin.register(Pago)
@@ -262,6 +320,7 @@ class PagoAdmin(admin.ModelAdmin):
         'descripcion'
     ]
     readonly_fields = ['fecha']
+    list_select_related = ['cliente', 'procesado_por']
     list_per_page = 25
     date_hierarchy = 'fecha'
     
@@ -279,16 +338,15 @@ class PagoAdmin(admin.ModelAdmin):
     
     def cliente_link(self, obj):
         """Link al cliente"""
-        url = reverse('admin:customer_support_cliente_change', args=[obj.cliente.id])
-        return format_html('<a href="{}">{}</a>', url, obj.cliente.nombre)
+        return link_cliente(obj.cliente_id, obj.cliente.nombre)
     cliente_link.short_description = "👤 Cliente"
     cliente_link.admin_order_field = 'cliente__nombre'
     
     def monto_formateado(self, obj):
         """Monto con formato de moneda"""
         return format_html(
-            '<span style="color: green; font-weight: bold;">${:,.2f}</span>',
-            obj.monto
+            '<span style="color: green; font-weight: bold;">${}</span>',
+            f'{obj.monto:,.2f}'
         )
     monto_formateado.short_description = "💰 Monto"
     monto_formateado.admin_order_field = 'monto'
@@ -344,6 +402,7 @@ class HistorialAccionAdmin(admin.ModelAdmin):
         'fecha',
         'metadata_display'
     ]
+    list_select_related = ['cliente', 'usuario']
     list_per_page = 50
     date_hierarchy = 'fecha'
     
@@ -381,9 +440,8 @@ class HistorialAccionAdmin(admin.ModelAdmin):
     
     def cliente_link(self, obj):
         """Link al cliente si existe"""
-        if obj.cliente:
-            url = reverse('admin:customer_support_cliente_change', args=[obj.cliente.id])
-            return format_html('<a href="{}">{}</a>', url, obj.cliente.nombre)
+        if obj.cliente_id:
+            return link_cliente(obj.cliente_id, obj.cliente.nombre)
         return "-"
     cliente_link.short_description = "👤 Cliente"
     cliente_link.admin_order_field = 'cliente__nombre'
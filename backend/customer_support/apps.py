@@ -4,3 +4,13 @@ class CustomerSupportConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'customer_support'
     verbose_name = 'AI Assistant - Soporte al Cliente'
+
+    def ready(self):
+        # Contadores del dashboard (estadisticas.py)
+        from . import signals  # noqa: F401
+        # Conteo de queries por request para /api/metrics/ (metricas.py)
+        from . import metricas
+        metricas.conectar()
+        # Invalidación de la caché de AI tools (cache_tools.py)
+        from . import cache_tools
+        cache_tools.conectar()
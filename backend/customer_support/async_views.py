@@ -0,0 +1,565 @@
+"""
+Versiones asíncronas (ASGI) de los endpoints de AI tools
+Usan el ORM async de Django (aget, acount, asave) para no bloquear
+un hilo del worker durante el request. Devuelven el mismo JSON que
+los endpoints síncronos de views.py.
+
+Se sirven bajo /api/async/ y solo tienen sentido detrás de un
+servidor ASGI (uvicorn); ver "Despliegue ASGI" en el README.
+También el stream de eventos SSE (/api/events/stream/).
+"""
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+import json
+import logging
+
+from . import auditoria, cache_tools, estadisticas, eventos, idempotencia, renderers, search
+from .models import Cliente, Ticket, Pago
+from .serializers import ToolResponseClienteSerializer
+from .views import (
+    datos_saldo, datos_ticket_creado, datos_pago_registrado, datos_contexto,
+    consultas_contexto, parametros_contexto, con_coincidencias, filtro_sin_indice
+)
+
+logger = logging.getLogger(__name__)
+
+def respuesta(data, status=200):
+    """Respuesta JSON con el mismo formato que el JSONRenderer de DRF"""
+    return HttpResponse(renderers.json_bytes(data), status=status, content_type='application/json')
+
+def leer_json(request):
+    """Body JSON del request (o datos de formulario)"""
+    if request.content_type == 'application/json':
+        return renderers.json_cargar(request.body or b'{}')
+    return request.POST.dict()
+
+async def aregistrar_accion(tipo, descripcion, cliente=None, usuario=None, ip=None, metadata=None):
+    """Versión async de views.registrar_accion"""
+    try:
+        await auditoria.aregistrar(
+            tipo=tipo,
+            descripcion=descripcion,
+            cliente=cliente,
+            usuario=usuario,
+            ip=ip,
+            metadata=metadata
+        )
+    except Exception as e:
+        logger.error(f"Error registrando acción: {e}")
+
+def json_invalido(e):
+    return respuesta({
+        'success': False,
+        'error': 'JSON inválido',
+        'message': str(e)
+    }, status=400)
+
+def cliente_no_encontrado(cliente_id):
+    return respuesta({
+        'success': False,
+        'error': 'Cliente no encontrado',
+        'message': f'No existe cliente activo con ID {cliente_id}'
+    }, status=404)
+
+def error_interno(vista, e):
+    logger.error(f"Error en {vista}: {e}")
+    return respuesta({
+        'success': False,
+        'error': 'Error interno del servidor',
+        'message': str(e)
+    }, status=500)
+
+# ============= CONSULTAS CACHEADAS (ASYNC) =============
+# Versiones async de views.ids_busqueda, datos_clientes y calcular_saldo
+
+async def ids_busqueda(query):
+    # El índice FTS5 se consulta con SQL crudo, que no tiene versión async
+    if await sync_to_async(search.usar_fts)(query):
+        return await sync_to_async(search.buscar_ids_tolerante)(query, limite=10)
+    return [
+        cliente_id async for cliente_id in Cliente.objects.filter(
+            filtro_sin_indice(query),
+            activo=True
+        ).order_by('nombre').values_list('id', flat=True)[:10]
+    ]
+
+async def datos_clientes(ids):
+    return {
+        cliente.id: dict(ToolResponseClienteSerializer(cliente).data)
+        async for cliente in Cliente.objects.filter(id__in=ids)
+    }
+
+async def calcular_saldo(cliente_id):
+    cliente = await Cliente.objects.filter(id=cliente_id, activo=True).afirst()
+    if cliente is None:
+        return None
+    return datos_saldo(
+        cliente,
+        [pago async for pago in cliente.pagos.all()[:5]],
+        total_tickets=await cliente.tickets.acount(),
+        total_pagos=await cliente.pagos.acount()
+    )
+
+async def calcular_contexto(cliente_id, max_pagos, max_actividad):
+    cliente, pagos, tickets, actividad = consultas_contexto(cliente_id, max_pagos, max_actividad)
+    cliente = await cliente.afirst()
+    if cliente is None:
+        return None
+    return datos_contexto(
+        cliente,
+        [pago async for pago in pagos],
+        [ticket async for ticket in tickets],
+        [accion async for accion in actividad]
+    )
+
+# ============= AI TOOL ENDPOINTS (ASYNC) =============
+
+@require_GET
+async def buscar_cliente_tool(request):
+    """
+    🤖 AI Tool (async): Buscar cliente por nombre o email
+
+    URL: GET /api/async/tools/buscar-cliente/?q=nombre_o_email
+    """
+    query = request.GET.get('q', '').strip()
+
+    if not query:
+        return respuesta({
+            'success': False,
+            'error': 'Parámetro "q" requerido',
+            'message': 'Proporciona un nombre o email para buscar',
+            'ejemplo': '?q=Juan Perez'
+        }, status=400)
+
+    try:
+        ids = await cache_tools.aobtener(
+            'buscar_cliente',
+            cache_tools.clave_busqueda(query),
+            [cache_tools.VERSION_BUSQUEDA],
+            lambda: ids_busqueda(query)
+        )
+        clientes = await cache_tools.adatos_clientes(ids, datos_clientes)
+
+        if not clientes:
+            return respuesta({
+                'success': True,
+                'message': f'No se encontraron clientes con "{query}"',
+                'clientes': [],
+                'sugerencia': 'Verifica la ortografía o intenta con un término más general'
+            })
+
+        await aregistrar_accion(
+            tipo='consulta',
+            descripcion=f'AI Tool: Búsqueda de cliente "{query}"',
+            ip=request.META.get('REMOTE_ADDR'),
+            metadata={'query': query, 'resultados': len(clientes)}
+        )
+
+        return respuesta({
+            'success': True,
+            'message': f'Se encontraron {len(clientes)} cliente(s) con "{query}"',
+            'total': len(clientes),
+            'clientes': clientes
+        })
+
+    except Exception as e:
+        return error_interno('buscar_cliente_tool (async)', e)
+
+@require_GET
+async def consultar_saldo_tool(request, cliente_id):
+    """
+    🤖 AI Tool (async): Consultar saldo específico de un cliente
+
+    URL: GET /api/async/tools/cliente/{cliente_id}/saldo/
+    """
+    try:
+        datos = await cache_tools.aobtener(
+            'consultar_saldo',
+            f'saldo:{cliente_id}',
+            [cache_tools.version_cliente(cliente_id)],
+            lambda: calcular_saldo(cliente_id)
+        )
+        if datos is None:
+            raise Cliente.DoesNotExist
+
+        await aregistrar_accion(
+            tipo='consulta',
+            descripcion=f'AI Tool: Consulta de saldo - {datos["cliente"]["nombre"]}',
+            cliente=cliente_id,
+            ip=request.META.get('REMOTE_ADDR'),
+            metadata={'cliente_id': cliente_id}
+        )
+
+        return respuesta(datos)
+
+    except Cliente.DoesNotExist:
+        return cliente_no_encontrado(cliente_id)
+
+    except Exception as e:
+        return error_interno('consultar_saldo_tool (async)', e)
+
+@require_GET
+async def contexto_cliente_tool(request):
+    """
+    🤖 AI Tool (async): Todo el contexto de un cliente en un request
+
+    URL: GET /api/async/tools/contexto-cliente/?id=1 (o ?q=nombre_o_email)
+    """
+    cliente_id = request.GET.get('id')
+    query = request.GET.get('q', '').strip()
+    max_pagos, max_actividad = parametros_contexto(request.GET)
+
+    if not cliente_id and not query:
+        return respuesta({
+            'success': False,
+            'error': 'Parámetro "id" o "q" requerido',
+            'message': 'Proporciona el ID del cliente o un nombre o email para buscarlo',
+            'ejemplo': '?q=Juan Perez'
+        }, status=400)
+
+    try:
+        coincidencias = None
+        if cliente_id:
+            try:
+                cliente_id = int(cliente_id)
+            except ValueError:
+                return respuesta({
+                    'success': False,
+                    'error': 'ID de cliente inválido',
+                    'message': 'El ID debe ser un número entero'
+                }, status=400)
+        else:
+            ids = await cache_tools.aobtener(
+                'buscar_cliente',
+                cache_tools.clave_busqueda(query),
+                [cache_tools.VERSION_BUSQUEDA],
+                lambda: ids_busqueda(query)
+            )
+            if not ids:
+                return respuesta({
+                    'success': False,
+                    'error': 'Cliente no encontrado',
+                    'message': f'No se encontraron clientes con "{query}"'
+                }, status=404)
+            cliente_id, coincidencias = ids[0], len(ids)
+
+        datos = await cache_tools.aobtener(
+            'contexto_cliente',
+            f'contexto:{cliente_id}:{max_pagos}:{max_actividad}',
+            [cache_tools.version_cliente(cliente_id)],
+            lambda: calcular_contexto(cliente_id, max_pagos, max_actividad)
+        )
+        if datos is None:
+            return cliente_no_encontrado(cliente_id)
+
+        await aregistrar_accion(
+            tipo='consulta',
+            descripcion=f'AI Tool: Contexto de cliente - {datos["cliente"]["nombre"]}',
+            cliente=cliente_id,
+            ip=request.META.get('REMOTE_ADDR'),
+            metadata={'cliente_id': cliente_id, 'query': query or None}
+        )
+
+        datos = con_coincidencias(datos, query, coincidencias)
+        if request.GET.get('formato') == 'texto':
+            return HttpResponse(datos['texto'], content_type='text/plain; charset=utf-8')
+        return respuesta(datos)
+
+    except Exception as e:
+        return error_interno('contexto_cliente_tool (async)', e)
+
+@csrf_exempt
+@require_POST
+async def crear_ticket_tool(request):
+    """
+    🤖 AI Tool (async): Crear ticket de soporte
+
+    URL: POST /api/async/tools/crear-ticket/
+    Body: mismo JSON que POST /api/tools/crear-ticket/
+    Headers: Idempotency-Key opcional, como en la versión síncrona
+    """
+    try:
+        data = leer_json(request)
+    except json.JSONDecodeError as e:
+        return json_invalido(e)
+
+    return await idempotencia.aejecutar(
+        'crear_ticket',
+        idempotencia.clave_de(request.META.get('HTTP_IDEMPOTENCY_KEY'), data),
+        data,
+        lambda: crear_ticket(data, ip=request.META.get('REMOTE_ADDR'))
+    )
+
+async def crear_ticket(data, ip=None):
+    """Lógica de crear_ticket_tool (async)"""
+    try:
+        required_fields = ['cliente', 'titulo', 'descripcion']
+        missing_fields = [field for field in required_fields if not data.get(field)]
+
+        if missing_fields:
+            return respuesta({
+                'success': False,
+                'error': 'Campos requeridos faltantes',
+                'campos_faltantes': missing_fields,
+                'ejemplo': {
+                    'cliente': 1,
+                    'titulo': 'Problema con factura',
+                    'descripcion': 'No puedo acceder a mi factura del mes pasado'
+                }
+            }, status=400)
+
+        try:
+            cliente = await Cliente.objects.aget(id=data['cliente'], activo=True)
+        except (Cliente.DoesNotExist, ValueError, TypeError):
+            return cliente_no_encontrado(data['cliente'])
+
+        prioridades_validas = [choice[0] for choice in Ticket.PRIORIDAD_CHOICES]
+        prioridad = data.get('prioridad', 'media')
+        if prioridad not in prioridades_validas:
+            prioridad = 'media'  # Default si es inválida
+
+        ticket = Ticket(
+            cliente=cliente,
+            titulo=data['titulo'],
+            descripcion=data['descripcion'],
+            prioridad=prioridad
+        )
+        try:
+            # Las FKs ya están resueltas: validar sin consultas extra
+            ticket.full_clean(exclude=['cliente', 'asignado_a'])
+        except ValidationError as e:
+            return respuesta({
+                'success': False,
+                'error': 'Datos inválidos para crear el ticket',
+                'detalles': e.message_dict
+            }, status=400)
+
+        await ticket.asave()
+
+        await aregistrar_accion(
+            tipo='creacion',
+            descripcion=f'AI Tool: Ticket creado - {ticket.titulo}',
+            cliente=cliente,
+            ip=ip,
+            metadata={'ticket_id': ticket.id, 'titulo': ticket.titulo}
+        )
+
+        return respuesta(datos_ticket_creado(ticket, cliente), status=201)
+
+    except Exception as e:
+        return error_interno('crear_ticket_tool (async)', e)
+
+@csrf_exempt
+@require_POST
+async def registrar_pago_tool(request):
+    """
+    🤖 AI Tool (async): Registrar pago de cliente
+
+    URL: POST /api/async/tools/registrar-pago/
+    Body: mismo JSON que POST /api/tools/registrar-pago/
+    Headers: Idempotency-Key opcional, como en la versión síncrona
+    """
+    try:
+        data = leer_json(request)
+    except json.JSONDecodeError as e:
+        return json_invalido(e)
+
+    return await idempotencia.aejecutar(
+        'registrar_pago',
+        idempotencia.clave_de(request.META.get('HTTP_IDEMPOTENCY_KEY'), data),
+        data,
+        lambda: registrar_pago(data, ip=request.META.get('REMOTE_ADDR'))
+    )
+
+async def registrar_pago(data, ip=None):
+    """Lógica de registrar_pago_tool (async)"""
+    try:
+        if not data.get('cliente'):
+            return respuesta({
+                'success': False,
+                'error': 'ID del cliente es requerido',
+                'ejemplo': {'cliente': 1, 'monto': 100.00}
+            }, status=400)
+
+        if not data.get('monto'):
+            return respuesta({
+                'success': False,
+                'error': 'Monto del pago es requerido',
+                'ejemplo': {'cliente': 1, 'monto': 100.00}
+            }, status=400)
+
+        try:
+            monto = float(data['monto'])
+        except (ValueError, TypeError):
+            return respuesta({
+                'success': False,
+                'error': 'Monto inválido, debe ser un número',
+                'monto_recibido': data['monto']
+            }, status=400)
+
+        if monto <= 0:
+            return respuesta({
+                'success': False,
+                'error': 'El monto debe ser mayor a 0',
+                'monto_recibido': data['monto']
+            }, status=400)
+        if monto > 999999.99:
+            return respuesta({
+                'success': False,
+                'error': 'El monto es demasiado alto (máximo $999,999.99)',
+                'monto_recibido': monto
+            }, status=400)
+
+        try:
+            cliente = await Cliente.objects.aget(id=data['cliente'], activo=True)
+        except (Cliente.DoesNotExist, ValueError, TypeError):
+            return cliente_no_encontrado(data['cliente'])
+
+        metodos_validos = [choice[0] for choice in Pago.METODO_CHOICES]
+        metodo_pago = data.get('metodo_pago', 'transferencia')
+        if metodo_pago not in metodos_validos:
+            metodo_pago = 'transferencia'  # Default
+
+        pago = Pago(
+            cliente=cliente,
+            monto=str(data['monto']),
+            descripcion=data.get('descripcion', ''),
+            metodo_pago=metodo_pago
+        )
+        try:
+            pago.full_clean(exclude=['cliente', 'procesado_por'])
+        except ValidationError as e:
+            return respuesta({
+                'success': False,
+                'error': 'Datos inválidos para registrar el pago',
+                'detalles': e.message_dict
+            }, status=400)
+
+        # Pago.save() suma el monto con un UPDATE atómico y deja el saldo en cliente
+        await pago.asave()
+        saldo_nuevo = float(cliente.saldo)
+        saldo_anterior = float(cliente.saldo - pago.monto)
+
+        await aregistrar_accion(
+            tipo='pago',
+            descripcion=f'AI Tool: Pago registrado ${monto} - {cliente.nombre}',
+            cliente=cliente,
+            ip=ip,
+            metadata={
+                'pago_id': pago.id,
+                'monto': monto,
+                'saldo_anterior': saldo_anterior,
+                'saldo_nuevo': saldo_nuevo,
+                'metodo': metodo_pago
+            }
+        )
+
+        return respuesta(
+            datos_pago_registrado(pago, cliente, monto, saldo_anterior, saldo_nuevo),
+            status=201
+        )
+
+    except Exception as e:
+        return error_interno('registrar_pago_tool (async)', e)
+
+# ============= ENDPOINTS ADICIONALES (ASYNC) =============
+
+@require_GET
+async def estadisticas_dashboard(request):
+    """
+    📊 Dashboard (async) con estadísticas generales
+
+    URL: GET /api/async/dashboard/estadisticas/
+    """
+    try:
+        stats = {
+            **await cache_tools.aobtener(
+                'dashboard',
+                f'dashboard:{estadisticas.hoy()}',
+                [cache_tools.VERSION_DASHBOARD],
+                estadisticas.aobtener_estadisticas
+            ),
+            'sistema': {
+                'fecha_actual': timezone.now().strftime('%d/%m/%Y %H:%M'),
+                'timezone': 'America/Guayaquil (Ecuador)',
+            }
+        }
+
+        return respuesta({
+            'success': True,
+            'estadisticas': stats,
+            'mensaje': 'Estadísticas del sistema actualizadas'
+        })
+
+    except Exception as e:
+        logger.error(f"Error en estadisticas_dashboard (async): {e}")
+        return respuesta({
+            'success': False,
+            'error': 'Error obteniendo estadísticas',
+            'message': str(e)
+        }, status=500)
+
+# ============= EVENTOS EN TIEMPO REAL (SSE) =============
+
+def lista_param(request, nombre):
+    """?nombre=a,b o ?nombre=a&nombre=b como lista (sin vacíos)"""
+    return [valor.strip() for parte in request.GET.getlist(nombre) for valor in parte.split(',') if valor.strip()]
+
+@require_GET
+async def eventos_stream(request):
+    """
+    📡 Stream de eventos (Server-Sent Events) para no consultar el dashboard en bucle
+
+    URL: GET /api/events/stream/
+    Parámetros (opcionales):
+        - cliente: IDs de clientes, separados por coma
+        - tipo: ticket_creado, ticket_estado, pago_registrado, saldo_actualizado
+        - desde: último id recibido (el navegador manda el header Last-Event-ID)
+
+    Con ASGI la conexión queda abierta; con WSGI responde lo pendiente y
+    el navegador reconecta solo (ver eventos.py)
+    """
+    conf = eventos.config()
+    if not conf['ACTIVO']:
+        return respuesta({
+            'success': False,
+            'error': 'Eventos desactivados',
+            'message': 'settings.EVENTOS["ACTIVO"] es False'
+        }, status=503)
+
+    try:
+        clientes = {int(valor) for valor in lista_param(request, 'cliente')}
+        desde = request.headers.get('Last-Event-ID') or request.GET.get('desde')
+        desde = int(desde) if desde else None
+    except ValueError:
+        return respuesta({
+            'success': False,
+            'error': 'Parámetros inválidos',
+            'message': '"cliente" y "desde" (o Last-Event-ID) deben ser números',
+            'ejemplo': '?cliente=1,2&desde=150'
+        }, status=400)
+
+    tipos = set(lista_param(request, 'tipo'))
+    if not tipos <= set(eventos.TIPOS):
+        return respuesta({
+            'success': False,
+            'error': 'Tipo de evento inválido',
+            'tipos_validos': list(eventos.TIPOS)
+        }, status=400)
+
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(
+            eventos.flujo(desde, clientes, tipos), content_type='text/event-stream'
+        )
+    else:
+        response = HttpResponse(
+            b''.join(await eventos.pendientes(desde, clientes, tipos)), content_type='text/event-stream'
+        )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: no acumular el stream
+    return response
@@ -0,0 +1,182 @@
+"""
+Escritura de auditoría (HistorialAccion) fuera del hot path de las AI tools
+
+Modos (settings.AUDITORIA['MODO']):
+- 'sync': INSERT dentro del request (comportamiento original)
+- 'buffered': cola en memoria que un hilo de fondo guarda con bulk_create
+  al llegar a BUFFER_TAMANO acciones o cada BUFFER_INTERVALO segundos
+- 'sampled': como 'buffered', pero de los tipos listados en MUESTREO solo
+  se guarda esa fracción (ej. {'consulta': 0.1} guarda 10% de las consultas)
+
+En los modos con buffer la acción se encola al confirmar la transacción,
+así que las acciones de una transacción revertida no se guardan. Lo que
+quede pendiente se guarda al terminar el proceso (atexit).
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+import atexit
+import logging
+import random
+import threading
+
+from . import cache_tools
+from .models import HistorialAccion
+
+logger = logging.getLogger(__name__)
+
+CONFIG_DEFAULT = {
+    'MODO': 'sync',
+    'BUFFER_TAMANO': 200,
+    'BUFFER_INTERVALO': 2.0,
+    'MAX_PENDIENTES': 10000,
+    'MUESTREO': {},
+}
+
+def config():
+    """Configuración efectiva de auditoría (settings.AUDITORIA sobre los defaults)"""
+    return {**CONFIG_DEFAULT, **getattr(settings, 'AUDITORIA', {})}
+
+class BufferAuditoria:
+    """
+    Cola en memoria de acciones pendientes, vaciada con bulk_create
+    por un hilo de fondo (uno por proceso, iniciado al primer uso)
+    """
+
+    def __init__(self):
+        self._pendientes = []
+        self._lock = threading.Lock()
+        self._lock_hilo = threading.Lock()
+        self._hay_trabajo = threading.Event()
+        self._hilo = None
+        self.descartadas = 0
+
+    @property
+    def pendientes(self):
+        return len(self._pendientes)
+
+    def agregar(self, accion):
+        """Encolar una acción; despierta al hilo si el buffer está lleno"""
+        conf = config()
+        with self._lock:
+            if len(self._pendientes) >= conf['MAX_PENDIENTES']:
+                self.descartadas += 1
+                logger.warning("Buffer de auditoría lleno, acción descartada")
+                return
+            self._pendientes.append(accion)
+            lleno = len(self._pendientes) >= conf['BUFFER_TAMANO']
+
+        self._asegurar_hilo()
+        if lleno:
+            self._hay_trabajo.set()
+
+    def vaciar(self):
+        """Guardar todas las acciones pendientes; retorna cuántas se guardaron"""
+        with self._lock:
+            lote, self._pendientes = self._pendientes, []
+        if not lote:
+            return 0
+
+        try:
+            HistorialAccion.objects.bulk_create(lote, batch_size=500)
+        except Exception as e:
+            logger.error(f"Error guardando {len(lote)} acciones de auditoría: {e}")
+            return 0
+        invalidar_contexto(lote)
+        return len(lote)
+
+    def _asegurar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock_hilo:
+            # El hilo no sobrevive a un fork (ej. gunicorn --preload): se recrea
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(
+                    target=self._ejecutar,
+                    name='auditoria-buffer',
+                    daemon=True
+                )
+                self._hilo.start()
+
+    def _ejecutar(self):
+        while True:
+            self._hay_trabajo.wait(timeout=config()['BUFFER_INTERVALO'])
+            self._hay_trabajo.clear()
+            if self._pendientes:
+                close_old_connections()
+                self.vaciar()
+
+buffer = BufferAuditoria()
+
+# Guardar lo pendiente cuando el worker termina
+atexit.register(buffer.vaciar)
+
+def _crear_accion(tipo, descripcion, cliente, usuario, ip, metadata):
+    # `cliente` puede ser la instancia o solo su id (ej. respuestas de cache_tools)
+    return HistorialAccion(
+        tipo=tipo,
+        descripcion=descripcion,
+        cliente_id=getattr(cliente, 'pk', cliente),
+        usuario=usuario,
+        ip_address=ip,
+        metadata=metadata or {}
+    )
+
+def invalidar_contexto(acciones):
+    """
+    La actividad reciente del contexto del cliente (cache_tools) muestra
+    las acciones que no son consultas: invalidar a sus clientes
+    """
+    cache_tools.invalidar(
+        {accion.cliente_id for accion in acciones if accion.tipo != 'consulta'},
+        dashboard=False
+    )
+
+def _muestreada(tipo, conf):
+    """En modo 'sampled', decide si se guarda una acción de este tipo"""
+    if conf['MODO'] != 'sampled':
+        return True
+    return random.random() < conf['MUESTREO'].get(tipo, 1.0)
+
+def registrar(tipo, descripcion, cliente=None, usuario=None, ip=None, metadata=None):
+    """Registrar una acción según el modo de auditoría configurado"""
+    conf = config()
+    accion = _crear_accion(tipo, descripcion, cliente, usuario, ip, metadata)
+
+    if conf['MODO'] == 'sync':
+        accion.save()
+        invalidar_contexto([accion])
+    elif _muestreada(tipo, conf):
+        transaction.on_commit(lambda: buffer.agregar(accion))
+
+def registrar_muchos(acciones, usuario=None, ip=None):
+    """
+    Registrar varias acciones (tuplas tipo, descripcion, cliente, metadata)
+    con un solo bulk_create en modo sync, o encolarlas al confirmar
+    """
+    conf = config()
+    acciones = [
+        _crear_accion(tipo, descripcion, cliente, usuario, ip, metadata)
+        for tipo, descripcion, cliente, metadata in acciones
+    ]
+
+    if conf['MODO'] == 'sync':
+        HistorialAccion.objects.bulk_create(acciones, batch_size=500)
+        invalidar_contexto(acciones)
+    else:
+        def encolar():
+            for accion in acciones:
+                if _muestreada(accion.tipo, conf):
+                    buffer.agregar(accion)
+        transaction.on_commit(encolar)
+
+async def aregistrar(tipo, descripcion, cliente=None, usuario=None, ip=None, metadata=None):
+    """Versión async de registrar (las vistas async no abren transacciones)"""
+    conf = config()
+    accion = _crear_accion(tipo, descripcion, cliente, usuario, ip, metadata)
+
+    if conf['MODO'] == 'sync':
+        await accion.asave()
+        await sync_to_async(invalidar_contexto)([accion])
+    elif _muestreada(tipo, conf):
+        buffer.agregar(accion)
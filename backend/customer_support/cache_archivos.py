@@ -0,0 +1,24 @@
+"""
+FileBasedCache para la caché de AI tools (settings.CACHES['tools'])
+
+El FileBasedCache de Django lista todo el directorio en cada set() para
+ver si pasó MAX_ENTRIES: con unos miles de entradas cada escritura cuesta
+milisegundos, y cache_tools escribe en cada fallo y en cada invalidación
+(cada pago). Este backend hace ese control solo cada CULL_CADA escrituras
+del proceso; entre controles el directorio puede pasar un poco de
+MAX_ENTRIES. Sacar una entrada o una versión de cache_tools es seguro:
+la siguiente lectura es un fallo.
+"""
+from django.core.cache.backends.filebased import FileBasedCache
+import itertools
+
+class CacheArchivos(FileBasedCache):
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        self._cull_cada = int(params.get('OPTIONS', {}).get('CULL_CADA', 100))
+        self._escrituras = itertools.count(1)
+
+    def _cull(self):
+        if next(self._escrituras) % self._cull_cada == 0:
+            super()._cull()
@@ -0,0 +1,312 @@
+"""
+Caché compartida de las AI tools de solo lectura (views.py y async_views.py):
+buscar_cliente, consultar_saldo, contexto_cliente y el dashboard
+
+Usa el alias settings.CACHE_TOOLS['ALIAS'] de CACHES, que tiene que ser
+compartido por todos los workers (archivos en un solo host, Redis
+con varios) para que una invalidación llegue a todos.
+
+Entradas:
+- buscar:<sha1 de la consulta>: ids de los clientes encontrados
+- cliente:<id>: datos del cliente en la búsqueda (ToolResponseClienteSerializer)
+- saldo:<id>: respuesta de consultar_saldo
+- contexto:<id>:<pagos>:<actividad>: respuesta de contexto_cliente
+- dashboard:<fecha>: contadores del dashboard
+
+Invalidación por versiones: cada entrada se guarda con las versiones de
+las que depende (global, búsqueda, dashboard, cliente:<id>) y solo se usa
+si siguen iguales. Las señales post_save/post_delete de Cliente, Ticket y
+Pago cambian, al confirmarse la transacción, la versión del cliente
+afectado (más la de búsqueda si cambió un Cliente, y la del dashboard).
+Las versiones se leen antes de consultar la base: un cálculo que se cruza
+con una escritura queda guardado con la versión vieja y no se vuelve a
+usar. Los update masivos invalidan desde estadisticas.registrar_update,
+las cargas desde estadisticas.recalcular (versión global) y las acciones
+de auditoría que no son consultas desde auditoria.invalidar_contexto.
+
+Single-flight: el primero que no encuentra una entrada toma un candado
+(cache.add) y la calcula; los demás esperan hasta ESPERA segundos a que
+aparezca en lugar de repetir las consultas. Entre workers solo es
+garantizado con un backend donde add() es atómico (Redis, Memcached):
+en CacheArchivos (FileBasedCache) add() comprueba y después escribe, y
+varios workers pueden calcular la misma entrada a la vez (mismo
+resultado, solo se repiten las consultas).
+
+Dentro de una transacción (ej. batch_tools) no se usa la caché: puede
+haber cambios sin confirmar que todavía no invalidaron nada.
+
+Aciertos y fallos: ai_assistant_cache_tools_total en /api/metrics/
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+
+from . import metricas, search
+from .models import Cliente, Ticket, Pago
+
+logger = logging.getLogger(__name__)
+
+CONFIG_DEFAULT = {
+    'ACTIVO': True,
+    'ALIAS': 'default',
+    'TTL': 300,
+    'ESPERA': 2.0,
+}
+
+PREFIJO = 'tools'
+VERSION_GLOBAL = f'{PREFIJO}:v:global'
+VERSION_BUSQUEDA = f'{PREFIJO}:v:busqueda'
+VERSION_DASHBOARD = f'{PREFIJO}:v:dashboard'
+PAUSA_MAXIMA = 0.05
+
+def config():
+    """Configuración efectiva de la caché (settings.CACHE_TOOLS sobre los defaults)"""
+    return {**CONFIG_DEFAULT, **getattr(settings, 'CACHE_TOOLS', {})}
+
+def _cache():
+    return caches[config()['ALIAS']]
+
+def version_cliente(cliente_id):
+    return f'{PREFIJO}:v:cliente:{cliente_id}'
+
+def clave_busqueda(query):
+    """
+    Clave de una búsqueda. Mayúsculas, acentos y espacios no cambian el
+    resultado: se busca por Cliente.clave_busqueda (ver search.py)
+    """
+    normalizada = search.normalizar(query)
+    return f'buscar:{hashlib.sha1(normalizada.encode("utf-8")).hexdigest()}'
+
+def _contar(herramienta, resultado, cantidad=1):
+    if cantidad:
+        metricas.registro.incrementar('cache_tools_total', cantidad, herramienta=herramienta, resultado=resultado)
+
+def _sin_cache():
+    return not config()['ACTIVO'] or connection.in_atomic_block
+
+# ============= VERSIONES =============
+
+def _nueva_version():
+    return uuid.uuid4().hex
+
+def _vigente(entrada, versiones):
+    return entrada is not None and entrada[0] == versiones
+
+def _versiones(cache, valores, claves):
+    """Versiones actuales de `claves` (con `valores` ya leídos); crea las que faltan"""
+    versiones = {}
+    for clave in claves:
+        version = valores.get(clave)
+        if version is None:
+            version = _nueva_version()
+            if not cache.add(clave, version, None):
+                version = cache.get(clave)  # la creó otro worker
+        versiones[clave] = version
+    return versiones
+
+async def _aversiones(cache, valores, claves):
+    versiones = {}
+    for clave in claves:
+        version = valores.get(clave)
+        if version is None:
+            version = _nueva_version()
+            if not await cache.aadd(clave, version, None):
+                version = await cache.aget(clave)
+        versiones[clave] = version
+    return versiones
+
+def _cambiar_versiones(claves):
+    try:
+        _cache().set_many({clave: _nueva_version() for clave in claves}, None)
+    except Exception as e:
+        logger.error(f"Error invalidando la caché de AI tools: {e}")
+
+def invalidar(clientes=(), busqueda=False, dashboard=True):
+    """
+    Invalida las entradas de `clientes` (ids), las búsquedas y el
+    dashboard cuando se confirme la transacción en curso (o ya, sin ella)
+    """
+    claves = sorted({version_cliente(cliente_id) for cliente_id in clientes if cliente_id is not None})
+    if busqueda:
+        claves.append(VERSION_BUSQUEDA)
+    if dashboard:
+        claves.append(VERSION_DASHBOARD)
+    if claves:
+        transaction.on_commit(lambda: _cambiar_versiones(claves))
+
+def invalidar_todo():
+    """Invalida todas las entradas (cargas masivas, recálculo de contadores)"""
+    transaction.on_commit(lambda: _cambiar_versiones([VERSION_GLOBAL]))
+
+# ============= LECTURA CON SINGLE-FLIGHT =============
+
+def obtener(herramienta, clave, dependencias, calcular):
+    """
+    Valor de calcular() para `clave`, cacheado mientras no cambien las
+    versiones de `dependencias`. Si calcular() retorna None no se guarda
+    """
+    if _sin_cache():
+        return calcular()
+
+    conf = config()
+    cache = _cache()
+    clave = f'{PREFIJO}:{clave}'
+    claves_version = [VERSION_GLOBAL, *dependencias]
+    valores = cache.get_many([clave, *claves_version])
+    versiones = _versiones(cache, valores, claves_version)
+    if _vigente(valores.get(clave), versiones):
+        _contar(herramienta, 'hit')
+        return valores[clave][1]
+
+    candado = f'{clave}:calculando'
+    # Atómico solo con Redis/Memcached (ver docstring del módulo)
+    propio = cache.add(candado, 1, conf['ESPERA'])
+    if not propio:
+        # Otro request ya la está calculando: esperar su resultado
+        limite = time.monotonic() + conf['ESPERA']
+        pausa = 0.002
+        while time.monotonic() < limite:
+            time.sleep(pausa)
+            pausa = min(pausa * 2, PAUSA_MAXIMA)
+            valores = cache.get_many([clave, candado])
+            if _vigente(valores.get(clave), versiones):
+                _contar(herramienta, 'colapsada')
+                return valores[clave][1]
+            if candado not in valores:
+                break  # terminó sin guardar nada (error o None)
+
+    _contar(herramienta, 'miss')
+    try:
+        valor = calcular()
+        if valor is not None:
+            cache.set(clave, (versiones, valor), conf['TTL'])
+        return valor
+    finally:
+        if propio:
+            cache.delete(candado)
+
+async def aobtener(herramienta, clave, dependencias, calcular):
+    """Versión async de obtener (calcular() retorna un awaitable)"""
+    if await sync_to_async(_sin_cache)():
+        return await calcular()
+
+    conf = config()
+    cache = _cache()
+    clave = f'{PREFIJO}:{clave}'
+    claves_version = [VERSION_GLOBAL, *dependencias]
+    valores = await cache.aget_many([clave, *claves_version])
+    versiones = await _aversiones(cache, valores, claves_version)
+    if _vigente(valores.get(clave), versiones):
+        _contar(herramienta, 'hit')
+        return valores[clave][1]
+
+    candado = f'{clave}:calculando'
+    propio = await cache.aadd(candado, 1, conf['ESPERA'])
+    if not propio:
+        limite = time.monotonic() + conf['ESPERA']
+        pausa = 0.002
+        while time.monotonic() < limite:
+            await asyncio.sleep(pausa)
+            pausa = min(pausa * 2, PAUSA_MAXIMA)
+            valores = await cache.aget_many([clave, candado])
+            if _vigente(valores.get(clave), versiones):
+                _contar(herramienta, 'colapsada')
+                return valores[clave][1]
+            if candado not in valores:
+                break
+
+    _contar(herramienta, 'miss')
+    try:
+        valor = await calcular()
+        if valor is not None:
+            await cache.aset(clave, (versiones, valor), conf['TTL'])
+        return valor
+    finally:
+        if propio:
+            await cache.adelete(candado)
+
+# ============= DATOS DE CLIENTES (BÚSQUEDA) =============
+
+def _claves_clientes(ids):
+    claves = {cliente_id: f'{PREFIJO}:cliente:{cliente_id}' for cliente_id in ids}
+    return claves, [VERSION_GLOBAL, *(version_cliente(cliente_id) for cliente_id in ids)]
+
+def _repartir(ids, claves, valores, versiones):
+    """({id: datos vigentes}, ids faltantes, {id: versiones de las que depende})"""
+    por_id, faltantes, dependencias = {}, [], {}
+    for cliente_id in ids:
+        dependencias[cliente_id] = {
+            VERSION_GLOBAL: versiones[VERSION_GLOBAL],
+            version_cliente(cliente_id): versiones[version_cliente(cliente_id)],
+        }
+        entrada = valores.get(claves[cliente_id])
+        if _vigente(entrada, dependencias[cliente_id]):
+            por_id[cliente_id] = entrada[1]
+        else:
+            faltantes.append(cliente_id)
+    _contar('cliente', 'hit', len(por_id))
+    _contar('cliente', 'miss', len(faltantes))
+    return por_id, faltantes, dependencias
+
+def datos_clientes(ids, cargar):
+    """
+    Datos de los clientes `ids` en ese orden (sin los que ya no existen):
+    de la caché, y los que faltan con una sola llamada a cargar(ids) -> {id: datos}
+    """
+    if not ids or _sin_cache():
+        por_id = cargar(ids) if ids else {}
+        return [por_id[cliente_id] for cliente_id in ids if cliente_id in por_id]
+
+    cache = _cache()
+    claves, claves_version = _claves_clientes(ids)
+    valores = cache.get_many([*claves.values(), *claves_version])
+    versiones = _versiones(cache, valores, claves_version)
+    por_id, faltantes, dependencias = _repartir(ids, claves, valores, versiones)
+    if faltantes:
+        cargados = cargar(faltantes)
+        cache.set_many({
+            claves[cliente_id]: (dependencias[cliente_id], datos) for cliente_id, datos in cargados.items()
+        }, config()['TTL'])
+        por_id.update(cargados)
+    return [por_id[cliente_id] for cliente_id in ids if cliente_id in por_id]
+
+async def adatos_clientes(ids, cargar):
+    """Versión async de datos_clientes (cargar() retorna un awaitable)"""
+    if not ids or await sync_to_async(_sin_cache)():
+        por_id = await cargar(ids) if ids else {}
+        return [por_id[cliente_id] for cliente_id in ids if cliente_id in por_id]
+
+    cache = _cache()
+    claves, claves_version = _claves_clientes(ids)
+    valores = await cache.aget_many([*claves.values(), *claves_version])
+    versiones = await _aversiones(cache, valores, claves_version)
+    por_id, faltantes, dependencias = _repartir(ids, claves, valores, versiones)
+    if faltantes:
+        cargados = await cargar(faltantes)
+        await cache.aset_many({
+            claves[cliente_id]: (dependencias[cliente_id], datos) for cliente_id, datos in cargados.items()
+        }, config()['TTL'])
+        por_id.update(cargados)
+    return [por_id[cliente_id] for cliente_id in ids if cliente_id in por_id]
+
+# ============= SEÑALES =============
+
+def invalidar_instancia(sender, instance, **kwargs):
+    """post_save/post_delete de Cliente, Ticket y Pago"""
+    if sender is Cliente:
+        invalidar([instance.pk], busqueda=True)
+    else:
+        invalidar([instance.cliente_id])
+
+def conectar():
+    """Conecta la invalidación a los modelos que usan las tools"""
+    for modelo in (Cliente, Ticket, Pago):
+        post_save.connect(invalidar_instancia, sender=modelo, dispatch_uid=f'cache_tools_save_{modelo.__name__}')
+        post_delete.connect(invalidar_instancia, sender=modelo, dispatch_uid=f'cache_tools_delete_{modelo.__name__}')
@@ -0,0 +1,240 @@
+"""
+Contadores incrementales para el dashboard de estadísticas
+
+Cada Cliente, Ticket y Pago "aporta" a un conjunto de contadores
+(ContadorEstadistica). Al guardar o eliminar un registro se aplica la
+diferencia entre su aporte anterior y el nuevo, así el dashboard se
+resuelve con una sola lectura indexada en lugar de ~9 COUNT(*).
+
+Los contadores diarios usan la fecha en America/Guayaquil (TIME_ZONE)
+y llevan la clave 'nombre:AAAA-MM-DD'.
+
+Si los contadores se desincronizan (ej. cargas con bulk_create o SQL
+directo) se reconstruyen con `python manage.py recalcular_estadisticas`.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+ESTADOS_PENDIENTES = ['abierto', 'en_proceso', 'pendiente']
+
+# Campos de cada modelo que influyen en los contadores
+CAMPOS_CLIENTE = ('activo', 'saldo', 'fecha_registro')
+CAMPOS_TICKET = ('estado', 'fecha_resolucion')
+CAMPOS_PAGO = ('monto', 'fecha')
+
+def dia(valor):
+    """Fecha local (America/Guayaquil) de un datetime, como 'AAAA-MM-DD'"""
+    return timezone.localtime(valor, timezone.get_default_timezone()).date().isoformat()
+
+def hoy():
+    return timezone.localdate(timezone=timezone.get_default_timezone()).isoformat()
+
+# ============= APORTES DE CADA REGISTRO =============
+# clave -> (cantidad, monto)
+
+def aportes_cliente(activo, saldo, fecha_registro):
+    if not activo:
+        return {}
+    aportes = {
+        'clientes_activos': (1, 0),
+        f'clientes_registrados:{dia(fecha_registro)}': (1, 0),
+    }
+    if saldo > 0:
+        aportes['clientes_saldo_positivo'] = (1, 0)
+    return aportes
+
+def aportes_ticket(estado, fecha_resolucion):
+    aportes = {
+        'tickets': (1, 0),
+        f'tickets_estado:{estado}': (1, 0),
+    }
+    if estado == 'resuelto' and fecha_resolucion:
+        aportes[f'tickets_resueltos:{dia(fecha_resolucion)}'] = (1, 0)
+    return aportes
+
+def aportes_pago(monto, fecha):
+    return {f'pagos:{dia(fecha)}': (1, Decimal(str(monto)))}
+
+APORTES = {
+    'Cliente': (CAMPOS_CLIENTE, aportes_cliente),
+    'Ticket': (CAMPOS_TICKET, aportes_ticket),
+    'Pago': (CAMPOS_PAGO, aportes_pago),
+}
+
+def estado_de(instance):
+    """Valores de los campos que influyen en los contadores"""
+    campos, _ = APORTES[instance.__class__.__name__]
+    return tuple(getattr(instance, campo) for campo in campos)
+
+def aportes_de(modelo, estado):
+    if estado is None:
+        return {}
+    _, funcion = APORTES[modelo]
+    return funcion(*estado)
+
+# ============= APLICAR DIFERENCIAS =============
+
+def diferencia(anteriores, nuevos):
+    """nuevos - anteriores, sin las claves que no cambian"""
+    delta = defaultdict(lambda: [0, Decimal(0)])
+    for clave, (cantidad, monto) in nuevos.items():
+        delta[clave][0] += cantidad
+        delta[clave][1] += monto
+    for clave, (cantidad, monto) in anteriores.items():
+        delta[clave][0] -= cantidad
+        delta[clave][1] -= monto
+    return {clave: tuple(valor) for clave, valor in delta.items() if valor[0] or valor[1]}
+
+def aplicar(delta):
+    """Suma el delta a los contadores con un upsert atómico por clave"""
+    if not delta:
+        return
+    from .models import ContadorEstadistica
+    tabla = ContadorEstadistica._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {tabla} (clave, cantidad, monto) VALUES (%s, %s, %s) '
+            f'ON CONFLICT (clave) DO UPDATE SET '
+            f'cantidad = {tabla}.cantidad + excluded.cantidad, '
+            f'monto = {tabla}.monto + excluded.monto',
+            [(clave, cantidad, str(monto)) for clave, (cantidad, monto) in delta.items()]
+        )
+
+def registrar_cambio(modelo, estado_anterior, estado_nuevo):
+    """Aplica el cambio de un registro (None = no existía / ya no existe)"""
+    aplicar(diferencia(aportes_de(modelo, estado_anterior), aportes_de(modelo, estado_nuevo)))
+
+def registrar_update(queryset, **cambios):
+    """
+    Aplica a los contadores un queryset.update(**cambios) que está por
+    ejecutarse (los update masivos no disparan señales). Llamar antes
+    del update y dentro de la misma transacción. También invalida la
+    caché de AI tools de los clientes afectados.
+    """
+    modelo = queryset.model.__name__
+    campos, _ = APORTES[modelo]
+    filas = queryset.values_list(*campos, 'pk' if modelo == 'Cliente' else 'cliente_id').iterator()
+    registrar_filas(modelo, filas, cambios)
+
+def registrar_filas(modelo, filas, cambios):
+    """
+    Como registrar_update, con las filas ya leídas: tuplas con los campos
+    de APORTES[modelo] y al final el id del cliente
+    """
+    from . import cache_tools
+    delta = defaultdict(lambda: [0, Decimal(0)])
+    clientes = set()
+    for *valores, cliente_id in filas:
+        clientes.add(cliente_id)
+        actualizado = tuple(cambios.get(campo, valor) for campo, valor in zip(APORTES[modelo][0], valores))
+        for clave, (cantidad, monto) in diferencia(aportes_de(modelo, valores), aportes_de(modelo, actualizado)).items():
+            delta[clave][0] += cantidad
+            delta[clave][1] += monto
+    aplicar({clave: tuple(valor) for clave, valor in delta.items() if valor[0] or valor[1]})
+    cache_tools.invalidar(clientes, busqueda=modelo == 'Cliente')
+
+# ============= LECTURA DEL DASHBOARD =============
+
+def claves_dashboard(fecha=None):
+    """Claves que necesita el dashboard para el día indicado (default: hoy)"""
+    from .models import Ticket
+    fecha = fecha or hoy()
+    return [
+        'clientes_activos',
+        'clientes_saldo_positivo',
+        f'clientes_registrados:{fecha}',
+        'tickets',
+        *[f'tickets_estado:{estado}' for estado, _ in Ticket.ESTADO_CHOICES],
+        f'tickets_resueltos:{fecha}',
+        f'pagos:{fecha}',
+    ]
+
+def armar_estadisticas(contadores, fecha=None):
+    """
+    Estructura del dashboard a partir de {clave: ContadorEstadistica}
+    Las claves sin fila valen 0
+    """
+    fecha = fecha or hoy()
+
+    def cantidad(clave):
+        contador = contadores.get(clave)
+        return contador.cantidad if contador else 0
+
+    pagos = contadores.get(f'pagos:{fecha}')
+    return {
+        'clientes': {
+            'total': cantidad('clientes_activos'),
+            'con_saldo_positivo': cantidad('clientes_saldo_positivo'),
+            'registrados_hoy': cantidad(f'clientes_registrados:{fecha}'),
+        },
+        'tickets': {
+            'total': cantidad('tickets'),
+            'abiertos': cantidad('tickets_estado:abierto'),
+            'en_proceso': cantidad('tickets_estado:en_proceso'),
+            'resueltos_hoy': cantidad(f'tickets_resueltos:{fecha}'),
+            'pendientes': sum(cantidad(f'tickets_estado:{estado}') for estado in ESTADOS_PENDIENTES),
+        },
+        'pagos_hoy': {
+            'total_transacciones': pagos.cantidad if pagos else 0,
+            'monto_total': float(pagos.monto) if pagos else 0.0,
+        },
+    }
+
+def obtener_estadisticas():
+    """Estadísticas del dashboard con una sola consulta"""
+    from .models import ContadorEstadistica
+    claves = claves_dashboard()
+    return armar_estadisticas(ContadorEstadistica.objects.in_bulk(claves, field_name='clave'))
+
+async def aobtener_estadisticas():
+    """Versión async de obtener_estadisticas"""
+    from .models import ContadorEstadistica
+    claves = claves_dashboard()
+    return armar_estadisticas(await ContadorEstadistica.objects.ain_bulk(claves, field_name='clave'))
+
+# ============= RECONSTRUCCIÓN =============
+
+def recalcular():
+    """
+    Recalcula todos los contadores desde las tablas con consultas
+    agrupadas. Invalida toda la caché de AI tools (se usa tras cargas
+    sin señales)
+    """
+    from . import cache_tools
+    from .models import Cliente, Ticket, Pago, ContadorEstadistica
+    zona = timezone.get_default_timezone()
+
+    valores = {}
+    activos = Cliente.objects.filter(activo=True)
+    valores['clientes_activos'] = (activos.count(), 0)
+    valores['clientes_saldo_positivo'] = (activos.filter(saldo__gt=0).count(), 0)
+    for fila in activos.annotate(d=TruncDate('fecha_registro', tzinfo=zona)).values('d').annotate(n=Count('id')):
+        valores[f'clientes_registrados:{fila["d"].isoformat()}'] = (fila['n'], 0)
+
+    valores['tickets'] = (Ticket.objects.count(), 0)
+    for fila in Ticket.objects.values('estado').annotate(n=Count('id')):
+        valores[f'tickets_estado:{fila["estado"]}'] = (fila['n'], 0)
+    resueltos = Ticket.objects.filter(estado='resuelto', fecha_resolucion__isnull=False)
+    for fila in resueltos.annotate(d=TruncDate('fecha_resolucion', tzinfo=zona)).values('d').annotate(n=Count('id')):
+        valores[f'tickets_resueltos:{fila["d"].isoformat()}'] = (fila['n'], 0)
+
+    por_dia = Pago.objects.annotate(d=TruncDate('fecha', tzinfo=zona)).values('d')
+    for fila in por_dia.annotate(n=Count('id'), total=Sum('monto')):
+        valores[f'pagos:{fila["d"].isoformat()}'] = (fila['n'], fila['total'] or 0)
+
+    with transaction.atomic():
+        ContadorEstadistica.objects.all().delete()
+        ContadorEstadistica.objects.bulk_create(
+            [
+                ContadorEstadistica(clave=clave, cantidad=cantidad, monto=monto)
+                for clave, (cantidad, monto) in valores.items()
+                if cantidad
+            ],
+            batch_size=500
+        )
+    cache_tools.invalidar_todo()
+    return len(valores)
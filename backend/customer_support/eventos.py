@@ -0,0 +1,256 @@
+"""
+Eventos de tickets, pagos y saldos para /api/events/stream/ (SSE)
+
+Las señales (signals.py) y Cliente.sumar_saldo guardan cada cambio en
+EventoCambio dentro de la misma transacción que el cambio: si se
+revierte, el evento no existe. El id autoincremental es el id del
+evento SSE, el que el navegador reenvía en Last-Event-ID al reconectar
+para recibir lo que se perdió. En SQLite las escrituras se serializan y
+los ids se confirman en orden; en PostgreSQL un id menor puede
+confirmarse después de uno mayor (habría que releer un margen hacia atrás).
+
+Con ASGI cada proceso tiene un Difusor: una sola tarea consulta los
+eventos nuevos cada INTERVALO segundos (una lectura por la PK, sin
+importar cuántas conexiones haya abiertas) y los reparte a las colas de
+las conexiones, que filtran por cliente y tipo. Una conexión que no
+lee y acumula más de MAX_COLA eventos se cierra; el navegador reconecta
+con Last-Event-ID y se pone al día desde la base.
+
+Con WSGI no se puede dejar la conexión abierta sin ocupar un hilo: se
+responde lo pendiente desde Last-Event-ID y se cierra, y el navegador
+reconecta a los REINTENTO ms (long polling de una lectura por índice).
+
+Los eventos de más de RETENCION segundos se borran con:
+python manage.py limpiar_eventos
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+import asyncio
+import logging
+import weakref
+
+from . import renderers
+from .models import EventoCambio
+
+logger = logging.getLogger(__name__)
+
+CONFIG_DEFAULT = {
+    'ACTIVO': True,
+    'INTERVALO': 0.5,
+    'HEARTBEAT': 15.0,
+    'REINTENTO': 3000,
+    'RETENCION': 24 * 60 * 60,
+    'LOTE': 500,
+    'MAX_COLA': 1000,
+}
+
+TIPOS = tuple(tipo for tipo, _ in EventoCambio.TIPO_CHOICES)
+HEARTBEAT = b': ping\n\n'
+
+def config():
+    """Configuración efectiva (settings.EVENTOS sobre los defaults)"""
+    return {**CONFIG_DEFAULT, **getattr(settings, 'EVENTOS', {})}
+
+# ============= PUBLICACIÓN =============
+
+def nuevo(tipo, cliente_id, datos):
+    """EventoCambio sin guardar (para publicar_muchos)"""
+    return EventoCambio(tipo=tipo, cliente_id=cliente_id, datos=datos)
+
+def publicar(tipo, cliente_id, datos):
+    """Guarda un evento (llamar dentro de la transacción del cambio)"""
+    if config()['ACTIVO']:
+        nuevo(tipo, cliente_id, datos).save()
+
+def publicar_muchos(eventos):
+    """Guarda varios eventos de nuevo() con un solo INSERT"""
+    if eventos and config()['ACTIVO']:
+        EventoCambio.objects.bulk_create(eventos)
+
+def datos_ticket_estado(ticket_id, estado_anterior, estado, fecha_resolucion):
+    return {
+        'ticket_id': ticket_id,
+        'estado_anterior': estado_anterior,
+        'estado': estado,
+        'fecha_resolucion': fecha_resolucion.isoformat() if fecha_resolucion else None,
+    }
+
+def datos_saldo(saldo_anterior, saldo):
+    return {'saldo_anterior': float(saldo_anterior), 'saldo': float(saldo)}
+
+def limpiar(antes=None):
+    """Borra los eventos anteriores a `antes` (default: RETENCION). Retorna cuántos"""
+    antes = antes or timezone.now() - timedelta(seconds=config()['RETENCION'])
+    tabla = connection.ops.quote_name(EventoCambio._meta.db_table)
+    # DELETE directo: EventoCambio no tiene señales ni FKs entrantes
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {tabla} WHERE fecha < %s',
+            [connection.ops.adapt_datetimefield_value(antes)]
+        )
+        return cursor.rowcount
+
+# ============= LECTURA =============
+
+def consulta(desde, clientes=None, tipos=None, hasta=None):
+    """Eventos con id > desde (y <= hasta), en orden de id"""
+    queryset = EventoCambio.objects.filter(id__gt=desde).order_by('id')
+    if hasta is not None:
+        queryset = queryset.filter(id__lte=hasta)
+    if clientes:
+        queryset = queryset.filter(cliente_id__in=clientes)
+    if tipos:
+        queryset = queryset.filter(tipo__in=tipos)
+    return queryset
+
+async def aleer(desde, limite, clientes=None, tipos=None, hasta=None):
+    return [evento async for evento in consulta(desde, clientes, tipos, hasta)[:limite]]
+
+async def aultimo_id():
+    return await EventoCambio.objects.order_by('-id').values_list('id', flat=True).afirst() or 0
+
+def formatear(evento):
+    """Evento en formato SSE (id/event/data)"""
+    data = renderers.json_bytes({
+        'id': evento.id,
+        'tipo': evento.tipo,
+        'cliente_id': evento.cliente_id,
+        'fecha': evento.fecha.isoformat(),
+        'datos': evento.datos,
+    })
+    return b'id: %d\nevent: %s\ndata: %s\n\n' % (evento.id, evento.tipo.encode(), data)
+
+def marcar(ultimo):
+    """Solo fija el Last-Event-ID del navegador (un evento sin data no se despacha)"""
+    return b'id: %d\n\n' % ultimo
+
+# ============= DIFUSIÓN (ASGI) =============
+
+class Suscripcion:
+    """Cola de una conexión SSE con sus filtros"""
+
+    def __init__(self, tope, clientes, tipos):
+        self.tope = tope            # Los eventos hasta este id se leen de la base
+        self.clientes = clientes
+        self.tipos = tipos
+        self.cola = asyncio.Queue()
+
+    def entregar(self, eventos, maximo):
+        if self.cola.qsize() >= maximo:
+            # None cierra la conexión: se pone al día al reconectar
+            self.cola.put_nowait(None)
+            return False
+        for evento in eventos:
+            if (not self.clientes or evento.cliente_id in self.clientes) and \
+               (not self.tipos or evento.tipo in self.tipos):
+                self.cola.put_nowait(evento)
+        return True
+
+class Difusor:
+    """Una lectura de eventos nuevos por INTERVALO para todas las conexiones del proceso"""
+
+    def __init__(self):
+        self.suscripciones = set()
+        self.ultimo = None
+        self.tarea = None
+
+    async def suscribir(self, clientes=None, tipos=None):
+        if self.ultimo is None:
+            ultimo = await aultimo_id()
+            if self.ultimo is None:  # Otra conexión pudo fijarlo mientras tanto
+                self.ultimo = ultimo
+        suscripcion = Suscripcion(self.ultimo, clientes, tipos)
+        self.suscripciones.add(suscripcion)
+        if self.tarea is None or self.tarea.done():
+            self.tarea = asyncio.create_task(self.ejecutar())
+        return suscripcion
+
+    def desuscribir(self, suscripcion):
+        self.suscripciones.discard(suscripcion)
+
+    async def ejecutar(self):
+        while self.suscripciones:
+            conf = config()
+            await asyncio.sleep(conf['INTERVALO'])
+            try:
+                eventos = await aleer(self.ultimo, conf['LOTE'])
+            except Exception as e:
+                logger.error(f"Error leyendo eventos: {e}")
+                continue
+            if not eventos:
+                continue
+            self.ultimo = eventos[-1].id
+            for suscripcion in list(self.suscripciones):
+                if not suscripcion.entregar(eventos, conf['MAX_COLA']):
+                    self.desuscribir(suscripcion)
+        # Sin conexiones no se sigue el último id: la próxima lo vuelve a leer
+        self.ultimo = None
+
+_difusores = weakref.WeakKeyDictionary()
+
+def difusor():
+    """Difusor del event loop actual (uno por proceso con uvicorn)"""
+    loop = asyncio.get_running_loop()
+    if loop not in _difusores:
+        _difusores[loop] = Difusor()
+    return _difusores[loop]
+
+# ============= FLUJOS SSE =============
+
+async def flujo(desde=None, clientes=None, tipos=None):
+    """
+    Stream SSE sin fin (ASGI): primero lo pendiente desde `desde` (Last-Event-ID)
+    leído de la base, después los eventos nuevos del Difusor y un
+    comentario cada HEARTBEAT segundos para que los proxies no corten
+    """
+    conf = config()
+    yield b'retry: %d\n\n' % conf['REINTENTO']
+    suscripciones = difusor()
+    suscripcion = await suscripciones.suscribir(clientes, tipos)
+    try:
+        enviado = suscripcion.tope if desde is None else desde
+        while enviado < suscripcion.tope:
+            eventos = await aleer(enviado, conf['LOTE'], clientes, tipos, hasta=suscripcion.tope)
+            if not eventos:
+                break
+            for evento in eventos:
+                yield formatear(evento)
+            enviado = eventos[-1].id
+        if enviado < suscripcion.tope or desde is None:
+            enviado = suscripcion.tope
+            yield marcar(enviado)
+
+        while True:
+            try:
+                evento = await asyncio.wait_for(suscripcion.cola.get(), conf['HEARTBEAT'])
+            except asyncio.TimeoutError:
+                yield HEARTBEAT
+                continue
+            if evento is None:
+                break
+            if evento.id > enviado:
+                enviado = evento.id
+                yield formatear(evento)
+    finally:
+        suscripciones.desuscribir(suscripcion)
+
+async def pendientes(desde=None, clientes=None, tipos=None):
+    """
+    Respuesta SSE finita (WSGI): hasta LOTE eventos desde `desde` y el
+    id del último, para que el navegador reconecte a los REINTENTO ms
+    """
+    conf = config()
+    bloques = [b'retry: %d\n\n' % conf['REINTENTO']]
+    # El último id se lee antes: lo confirmado después queda para la próxima
+    ultimo = await aultimo_id()
+    if desde is None:
+        bloques.append(marcar(ultimo))
+        return bloques
+    eventos = await aleer(desde, conf['LOTE'], clientes, tipos, hasta=ultimo)
+    bloques.extend(formatear(evento) for evento in eventos)
+    # Si no quedan más, avanzar hasta el último id aunque no pase el filtro
+    if len(eventos) < conf['LOTE'] and ultimo > (eventos[-1].id if eventos else desde):
+        bloques.append(marcar(ultimo))
+    return bloques
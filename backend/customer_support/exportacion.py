@@ -0,0 +1,162 @@
+"""
+Exportación por streaming de clientes, tickets, pagos e historial
+Usado por GET /api/export/<recurso>/ (views.exportar)
+
+Las filas se leen con values_list() en lotes de CHUNK_SIZE por keyset
+sobre (fecha, id), y se envían en bloques de BLOQUE_FILAS líneas: la memoria
+del worker no depende del tamaño de la exportación y las primeras filas
+salen de inmediato. Cada lote es una consulta corta (con índice), así una
+exportación larga no mantiene abierto un cursor que en SQLite bloquearía
+las escrituras. Formatos: NDJSON (un objeto JSON por línea) y CSV.
+"""
+from asgiref.sync import sync_to_async
+from datetime import datetime, time, timedelta
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+import csv
+import io
+import json
+
+from .models import Cliente, Ticket, Pago, HistorialAccion
+
+CHUNK_SIZE = 2000
+BLOQUE_FILAS = 500
+
+# recurso -> (modelo, campo de fecha, [(columna, campo ORM)])
+RECURSOS = {
+    'clientes': (Cliente, 'fecha_registro', [
+        ('id', 'id'),
+        ('nombre', 'nombre'),
+        ('email', 'email'),
+        ('telefono', 'telefono'),
+        ('saldo', 'saldo'),
+        ('activo', 'activo'),
+        ('fecha_registro', 'fecha_registro'),
+    ]),
+    'tickets': (Ticket, 'fecha_creacion', [
+        ('id', 'id'),
+        ('cliente', 'cliente_id'),
+        ('cliente_nombre', 'cliente__nombre'),
+        ('titulo', 'titulo'),
+        ('descripcion', 'descripcion'),
+        ('estado', 'estado'),
+        ('prioridad', 'prioridad'),
+        ('fecha_creacion', 'fecha_creacion'),
+        ('fecha_resolucion', 'fecha_resolucion'),
+    ]),
+    'pagos': (Pago, 'fecha', [
+        ('id', 'id'),
+        ('cliente', 'cliente_id'),
+        ('cliente_nombre', 'cliente__nombre'),
+        ('monto', 'monto'),
+        ('metodo_pago', 'metodo_pago'),
+        ('descripcion', 'descripcion'),
+        ('fecha', 'fecha'),
+    ]),
+    'historial': (HistorialAccion, 'fecha', [
+        ('id', 'id'),
+        ('tipo', 'tipo'),
+        ('descripcion', 'descripcion'),
+        ('cliente', 'cliente_id'),
+        ('usuario_username', 'usuario__username'),
+        ('ip_address', 'ip_address'),
+        ('metadata', 'metadata'),
+        ('fecha', 'fecha'),
+    ]),
+}
+
+FORMATOS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+def inicio_del_dia(fecha):
+    """Inicio del día en America/Guayaquil como datetime aware"""
+    return timezone.make_aware(datetime.combine(fecha, time.min), timezone.get_default_timezone())
+
+def filas(recurso, desde=None, hasta=None, cliente_id=None):
+    """
+    Tuplas del recurso en orden (fecha, id), filtradas por rango de fechas
+    (días locales, ambos inclusive) y cliente. Retorna (columnas, iterador)
+    """
+    modelo, campo_fecha, columnas = RECURSOS[recurso]
+    queryset = modelo.objects.order_by(campo_fecha, 'id')
+    if desde:
+        queryset = queryset.filter(**{f'{campo_fecha}__gte': inicio_del_dia(desde)})
+    if hasta:
+        queryset = queryset.filter(**{f'{campo_fecha}__lt': inicio_del_dia(hasta + timedelta(days=1))})
+    if cliente_id:
+        queryset = queryset.filter(**{'id' if modelo is Cliente else 'cliente_id': cliente_id})
+
+    campos = [campo for _, campo in columnas]
+    return [nombre for nombre, _ in columnas], _por_lotes(queryset.values_list(*campos), campos, campo_fecha)
+
+def _por_lotes(queryset, campos, campo_fecha):
+    """Recorre el queryset ordenado por (fecha, id) en lotes keyset de CHUNK_SIZE"""
+    i_fecha, i_id = campos.index(campo_fecha), campos.index('id')
+    lote_qs = queryset
+    while True:
+        lote = list(lote_qs[:CHUNK_SIZE])
+        yield from lote
+        if len(lote) < CHUNK_SIZE:
+            return
+        fecha, ultimo_id = lote[-1][i_fecha], lote[-1][i_id]
+        lote_qs = queryset.filter(
+            Q(**{f'{campo_fecha}__gte': fecha}) & (Q(**{f'{campo_fecha}__gt': fecha}) | Q(id__gt=ultimo_id))
+        )
+
+def _en_bloques(lineas):
+    bloque = []
+    for linea in lineas:
+        bloque.append(linea)
+        if len(bloque) >= BLOQUE_FILAS:
+            yield ''.join(bloque).encode('utf-8')
+            bloque = []
+    if bloque:
+        yield ''.join(bloque).encode('utf-8')
+
+def bloques_ndjson(columnas, tuplas):
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    return _en_bloques(encoder.encode(dict(zip(columnas, tupla))) + '\n' for tupla in tuplas)
+
+def _lineas_csv(columnas, tuplas):
+    salida = io.StringIO()
+    writer = csv.writer(salida)
+
+    def linea(valores):
+        writer.writerow(valores)
+        texto = salida.getvalue()
+        salida.seek(0)
+        salida.truncate()
+        return texto
+
+    yield linea(columnas)
+    for tupla in tuplas:
+        yield linea([
+            json.dumps(valor, ensure_ascii=False) if isinstance(valor, (dict, list))
+            else valor.isoformat() if isinstance(valor, datetime)
+            else valor
+            for valor in tupla
+        ])
+
+def bloques_csv(columnas, tuplas):
+    return _en_bloques(_lineas_csv(columnas, tuplas))
+
+GENERADORES = {
+    'ndjson': bloques_ndjson,
+    'csv': bloques_csv,
+}
+
+async def flujo_async(bloques):
+    """
+    Iterador async sobre un generador síncrono. Bajo ASGI Django convierte
+    los iteradores síncronos con list() (toda la exportación en memoria);
+    así cada bloque se lee en el hilo del ORM y se envía apenas está listo.
+    """
+    siguiente = sync_to_async(next, thread_sensitive=True)
+    while True:
+        bloque = await siguiente(bloques, None)
+        if bloque is None:
+            return
+        yield bloque
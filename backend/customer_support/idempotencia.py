@@ -0,0 +1,278 @@
+"""
+Idempotencia de las tools de escritura (crear_ticket, registrar_pago)
+
+Si el request trae el header Idempotency-Key (o "tool_call_id" en el
+body) la respuesta se guarda en ClaveIdempotencia, con índice único por
+clave y vencimiento a settings.IDEMPOTENCIA['TTL'] segundos. Un reintento
+con la misma clave recibe la respuesta guardada (header
+Idempotent-Replayed: true) con una lectura por índice, sin tocar
+clientes, tickets ni pagos. La misma clave con otro body (o para otra
+tool) responde 422.
+
+Sync (DRF y batch): la clave se inserta en la misma transacción que crea
+el pago o el ticket. Un duplicado concurrente se queda esperando en el
+INSERT (lock de escritura en SQLite, índice único en PostgreSQL) hasta
+que el primero confirma, y entonces recibe su respuesta. Si la tool
+responde 5xx se revierte todo y el reintento vuelve a ejecutarla.
+
+Async: las vistas async no abren transacciones, así que la clave se
+guarda "en_proceso" antes de ejecutar y se completa después; los
+duplicados consultan cada pocos ms hasta ESPERA segundos (luego 409).
+Una clave en proceso hace más de ABANDONO segundos (el worker murió) se
+puede volver a usar.
+
+Las claves vencidas se borran con: python manage.py limpiar_idempotencia
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+import asyncio
+import hashlib
+import json
+import time
+
+from . import renderers
+from .models import ClaveIdempotencia
+
+CONFIG_DEFAULT = {
+    'TTL': 24 * 60 * 60,
+    'ESPERA': 10.0,
+    'ABANDONO': 60,
+}
+
+CAMPO_BODY = 'tool_call_id'
+LARGO_MAXIMO = 255
+INTENTOS = 3
+PAUSA_MAXIMA = 0.1
+HEADER_REPETIDA = 'Idempotent-Replayed'
+
+def config():
+    """Configuración efectiva (settings.IDEMPOTENCIA sobre los defaults)"""
+    return {**CONFIG_DEFAULT, **getattr(settings, 'IDEMPOTENCIA', {})}
+
+def clave_de(header, data):
+    """Valor del header Idempotency-Key, o tool_call_id del body (None si no hay)"""
+    clave = header
+    if not clave and isinstance(data, dict):
+        clave = data.get(CAMPO_BODY)
+    clave = str(clave).strip() if clave else ''
+    return clave or None
+
+def huella_de(data):
+    """SHA-256 del body normalizado (sin tool_call_id)"""
+    if hasattr(data, 'dict'):
+        data = data.dict()  # QueryDict de un formulario
+    if isinstance(data, dict):
+        data = {campo: valor for campo, valor in data.items() if campo != CAMPO_BODY}
+    contenido = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+def _como_json(datos):
+    """Los datos tal como los recibió el cliente (para guardarlos en el JSONField)"""
+    return renderers.json_cargar(renderers.json_bytes(datos))
+
+# ============= ESTADO DE UNA CLAVE =============
+
+CAMPOS = ('id', 'tool', 'huella', 'estado', 'codigo', 'respuesta', 'fecha', 'expira')
+
+def _buscar(clave):
+    return ClaveIdempotencia.objects.filter(clave=clave).values(*CAMPOS).first()
+
+def _reutilizable(guardada, conf):
+    """Vencida, o en proceso desde hace más de ABANDONO segundos"""
+    ahora = timezone.now()
+    if guardada['expira'] <= ahora:
+        return True
+    return guardada['estado'] == 'en_proceso' and guardada['fecha'] <= ahora - timedelta(seconds=conf['ABANDONO'])
+
+def _liberar(guardada):
+    """Borra la clave si sigue igual (otro request pudo reusarla primero)"""
+    ClaveIdempotencia.objects.filter(id=guardada['id'], estado=guardada['estado'], fecha=guardada['fecha']).delete()
+
+def _resolver(tool, huella, guardada):
+    """(codigo, datos, repetida) de una clave completada, o None si hay que esperar"""
+    if guardada['tool'] != tool or guardada['huella'] != huella:
+        return status.HTTP_422_UNPROCESSABLE_ENTITY, {
+            'success': False,
+            'error': 'Idempotency-Key ya usada con otros datos',
+            'message': 'Usa una clave nueva para cada operación distinta',
+            'tool_original': guardada['tool'],
+        }, False
+    if guardada['estado'] == 'completada':
+        return guardada['codigo'], guardada['respuesta'], True
+    return None
+
+def _en_proceso():
+    return status.HTTP_409_CONFLICT, {
+        'success': False,
+        'error': 'Una petición con la misma Idempotency-Key está en proceso',
+        'message': 'Reintenta en unos segundos',
+    }, False
+
+def _clave_invalida():
+    return status.HTTP_400_BAD_REQUEST, {
+        'success': False,
+        'error': f'Idempotency-Key demasiado larga (máximo {LARGO_MAXIMO} caracteres)',
+    }, False
+
+# ============= SYNC =============
+
+def _responder(codigo, datos, repetida):
+    response = Response(datos, status=codigo)
+    if repetida:
+        response[HEADER_REPETIDA] = 'true'
+    elif codigo == status.HTTP_409_CONFLICT:
+        response['Retry-After'] = '1'
+    return response
+
+def _esperar(tool, huella, clave, guardada, conf):
+    """
+    Espera a que otro request complete la clave (`guardada` es la primera
+    lectura): (codigo, datos, repetida), o None si se puede ejecutar
+    """
+    limite = time.monotonic() + conf['ESPERA']
+    pausa = 0.005
+    while True:
+        if guardada is None or _reutilizable(guardada, conf):
+            if guardada is not None:
+                _liberar(guardada)
+            return None
+        resultado = _resolver(tool, huella, guardada)
+        if resultado is not None:
+            return resultado
+        if time.monotonic() >= limite:
+            return _en_proceso()
+        time.sleep(pausa)
+        pausa = min(pausa * 2, PAUSA_MAXIMA)
+        guardada = _buscar(clave)
+
+def ejecutar(tool, clave, data, funcion):
+    """
+    Ejecuta funcion() -> Response de DRF una sola vez por `clave`
+    (sin clave, simplemente la ejecuta)
+    """
+    if clave is None:
+        return funcion()
+    if len(clave) > LARGO_MAXIMO:
+        return _responder(*_clave_invalida())
+
+    conf = config()
+    huella = huella_de(data)
+    for _ in range(INTENTOS):
+        guardada = _buscar(clave)
+        if guardada is not None:
+            resultado = _esperar(tool, huella, clave, guardada, conf)
+            if resultado is not None:
+                return _responder(*resultado)
+        try:
+            with transaction.atomic():
+                # Un duplicado concurrente espera aquí a que este confirme
+                ClaveIdempotencia.objects.create(
+                    clave=clave,
+                    tool=tool,
+                    huella=huella,
+                    expira=timezone.now() + timedelta(seconds=conf['TTL'])
+                )
+                response = funcion()
+                if response.status_code >= 500:
+                    # Ni la clave ni cambios a medias: el reintento vuelve a ejecutar
+                    transaction.set_rollback(True)
+                    return response
+                ClaveIdempotencia.objects.filter(clave=clave).update(
+                    estado='completada',
+                    codigo=response.status_code,
+                    respuesta=_como_json(response.data)
+                )
+                return response
+        except IntegrityError:
+            continue  # la insertó otro request: leer su respuesta
+    return _responder(*_en_proceso())
+
+# ============= ASYNC =============
+
+def _responder_async(codigo, datos, repetida):
+    response = HttpResponse(renderers.json_bytes(datos), status=codigo, content_type='application/json')
+    if repetida:
+        response[HEADER_REPETIDA] = 'true'
+    elif codigo == status.HTTP_409_CONFLICT:
+        response['Retry-After'] = '1'
+    return response
+
+async def _aesperar(tool, huella, clave, conf):
+    limite = time.monotonic() + conf['ESPERA']
+    pausa = 0.005
+    while True:
+        guardada = await ClaveIdempotencia.objects.filter(clave=clave).values(*CAMPOS).afirst()
+        if guardada is None or _reutilizable(guardada, conf):
+            if guardada is not None:
+                await ClaveIdempotencia.objects.filter(
+                    id=guardada['id'], estado=guardada['estado'], fecha=guardada['fecha']
+                ).adelete()
+            return None
+        resultado = _resolver(tool, huella, guardada)
+        if resultado is not None:
+            return resultado
+        if time.monotonic() >= limite:
+            return _en_proceso()
+        await asyncio.sleep(pausa)
+        pausa = min(pausa * 2, PAUSA_MAXIMA)
+
+async def aejecutar(tool, clave, data, funcion):
+    """
+    Versión async de ejecutar: `funcion()` retorna un awaitable con un
+    HttpResponse JSON (async_views.respuesta)
+    """
+    if clave is None:
+        return await funcion()
+    if len(clave) > LARGO_MAXIMO:
+        return _responder_async(*_clave_invalida())
+
+    conf = config()
+    huella = huella_de(data)
+    for _ in range(INTENTOS):
+        resultado = await _aesperar(tool, huella, clave, conf)
+        if resultado is not None:
+            return _responder_async(*resultado)
+        try:
+            registro = await ClaveIdempotencia.objects.acreate(
+                clave=clave,
+                tool=tool,
+                huella=huella,
+                expira=timezone.now() + timedelta(seconds=conf['TTL'])
+            )
+        except IntegrityError:
+            continue
+
+        try:
+            response = await funcion()
+        except BaseException:
+            await ClaveIdempotencia.objects.filter(id=registro.id).adelete()
+            raise
+        if response.status_code >= 500:
+            await ClaveIdempotencia.objects.filter(id=registro.id).adelete()
+        else:
+            await ClaveIdempotencia.objects.filter(id=registro.id).aupdate(
+                estado='completada',
+                codigo=response.status_code,
+                respuesta=renderers.json_cargar(response.content)
+            )
+        return response
+    return _responder_async(*_en_proceso())
+
+# ============= LIMPIEZA =============
+
+def limpiar(antes=None):
+    """Borra las claves vencidas. Retorna cuántas"""
+    antes = antes or timezone.now()
+    tabla = connection.ops.quote_name(ClaveIdempotencia._meta.db_table)
+    # DELETE directo: ClaveIdempotencia no tiene señales ni FKs entrantes
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {tabla} WHERE expira <= %s',
+            [connection.ops.adapt_datetimefield_value(antes)]
+        )
+        return cursor.rowcount
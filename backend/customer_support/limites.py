@@ -0,0 +1,356 @@
+"""
+Control de admisión y límites de tasa de la API (LimitesMiddleware)
+
+Límite de tasa (429): token bucket por tool y por cliente, identificado
+por el header de API key (settings.LIMITES['HEADER_API_KEY']) si es una
+de API_KEYS o, si no, por la IP: una key inventada no da un bucket nuevo. Cada tool de TASAS tiene (capacidad, tokens por
+segundo): se permite una ráfaga de `capacidad` llamadas y después
+`tokens por segundo` sostenidas. El estado de cada bucket se guarda en el
+alias ALIAS de CACHES, compartido por todos los workers como la caché de
+cache_tools.py. Sin operaciones atómicas en la caché, requests
+simultáneos del mismo cliente en distintos workers pueden leer el mismo
+estado y pasar los dos: el límite es aproximado por arriba en esa medida.
+Con CacheArchivos (el default de desarrollo) cada consulta del bucket
+es además una lectura y una escritura de archivo; en producción usar
+Redis como ALIAS.
+Las versiones sync y async de una tool comparten bucket, y en
+/api/tools/batch/ cada llamada cuenta para el bucket de su tool.
+Para no leer y escribir la caché en cada request, cada proceso toma
+además una RESERVA (fracción de la capacidad) que gasta localmente
+durante RESERVA_TTL segundos, y recuerda los rechazos hasta que el
+bucket pueda tener tokens otra vez (ver Reservas).
+
+Admisión (503): requests en vuelo por proceso, con prioridades. Cada
+vista entra solo si los requests en vuelo están por debajo de la fracción
+de MAX_EN_VUELO de su prioridad: bajo sobrecarga se rechazan primero el
+dashboard y las exportaciones ('baja'), después lecturas y CRUD
+('normal'), y las tools de escritura ('alta') hasta el final. Una
+exportación cuenta hasta que termina de enviarse. Con WSGI los requests
+en vuelo no superan los hilos del worker: ajustar MAX_EN_VUELO a ese número.
+
+Rechazos: ai_assistant_limites_rechazos_total en /api/metrics/
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import Resolver404, resolve
+import functools
+import hashlib
+import math
+import threading
+import time
+
+from . import metricas
+
+CONFIG_DEFAULT = {
+    'ACTIVO': True,
+    'ALIAS': 'default',
+    'HEADER_API_KEY': 'X-API-Key',
+    'API_KEYS': [],
+    'TASAS': {},
+    'RESERVA': 0.1,
+    'RESERVA_TTL': 1.0,
+    'MAX_EN_VUELO': 64,
+    'PRIORIDADES': {'baja': 0.5, 'normal': 0.8, 'alta': 1.0},
+}
+
+PREFIJO = 'limites'
+
+# Prioridad de admisión por nombre de URL (sin el sufijo _async); el
+# resto es 'normal'. None = sin control de admisión: el stream SSE queda
+# abierto indefinidamente y health/metrics tienen que responder siempre
+PRIORIDAD_VISTAS = {
+    'estadisticas_dashboard': 'baja',
+    'exportar': 'baja',
+    'crear_ticket_tool': 'alta',
+    'registrar_pago_tool': 'alta',
+    'eventos_stream': None,
+    'health_check': None,
+    'metricas': None,
+}
+
+def config():
+    """Configuración efectiva (settings.LIMITES sobre los defaults)"""
+    return {**CONFIG_DEFAULT, **getattr(settings, 'LIMITES', {})}
+
+def _cache():
+    return caches[config()['ALIAS']]
+
+def _contar(herramienta, motivo):
+    metricas.registro.incrementar('limites_rechazos_total', herramienta=herramienta, motivo=motivo)
+
+@functools.lru_cache(maxsize=4096)
+def _vista(path):
+    try:
+        nombre = resolve(path).url_name
+    except Resolver404:
+        return None
+    return nombre.removesuffix('_async') if nombre else None
+
+def vista_de(request):
+    """Nombre de URL del request sin el sufijo _async (None si no hay ruta)"""
+    # resolve() recorre los patrones (~50 µs); las rutas se repiten mucho
+    return _vista(request.path_info)
+
+def herramienta_de(vista):
+    """Tool de una vista (buscar_cliente_tool -> buscar_cliente)"""
+    return vista.removesuffix('_tool') if vista and vista.endswith('_tool') else None
+
+def identidad(request):
+    """API key registrada en API_KEYS (hasheada) o IP del cliente"""
+    conf = config()
+    clave = request.headers.get(conf['HEADER_API_KEY'])
+    if clave and clave in conf['API_KEYS']:
+        return 'key:' + hashlib.sha256(clave.encode()).hexdigest()[:24]
+    return 'ip:' + request.META.get('REMOTE_ADDR', '')
+
+# ============= TOKEN BUCKET =============
+
+def _clave(herramienta, quien):
+    return f'{PREFIJO}:{herramienta}:{quien}'
+
+def _descontar(estado, capacidad, tasa, costo, ahora, reserva=0):
+    """
+    (estado nuevo, tokens tomados, 0) si alcanzan para `costo` (y se toman
+    hasta `reserva` más si hay), o (None, 0, segundos de espera)
+    """
+    costo = min(costo, capacidad)  # Un batch más grande que la ráfaga pasa con el bucket lleno
+    tokens, desde = estado if estado else (capacidad, ahora)
+    tokens = min(capacidad, tokens + max(ahora - desde, 0) * tasa)
+    if tokens < costo:
+        return None, 0, (costo - tokens) / tasa
+    tomados = min(tokens, costo + reserva)
+    return (tokens - tomados, ahora), tomados, 0
+
+def _ttl(capacidad, tasa):
+    # Un bucket que no se usa en ese tiempo se llenó: no hace falta guardarlo
+    return math.ceil(capacidad / tasa) + 1
+
+class Reservas:
+    """
+    Tokens ya descontados del bucket compartido que el proceso gasta sin
+    leer la caché (vencen a los RESERVA_TTL segundos; los no usados se
+    pierden, así que el límite nunca se pasa), y rechazos vigentes: un
+    bucket vacío no recibe tokens antes de su tiempo de espera, así que
+    hasta entonces se rechaza sin leer la caché
+    """
+    MAXIMO = 10000
+
+    def __init__(self):
+        self._reservas = {}
+        self._lock = threading.Lock()
+
+    def tomar(self, clave, costo, ahora):
+        """0 si se pagó con la reserva, los segundos de espera si hay un rechazo vigente, None si hay que ir a la caché"""
+        with self._lock:
+            tokens, vence, rechazo = self._reservas.get(clave, (0, 0, 0))
+            if rechazo > ahora:
+                return rechazo - ahora
+            if vence > ahora and tokens >= costo:
+                self._reservas[clave] = (tokens - costo, vence, 0)
+                return 0
+        return None
+
+    def guardar(self, clave, tokens, vence, rechazo=0):
+        with self._lock:
+            if len(self._reservas) >= self.MAXIMO:
+                ahora = time.time()
+                self._reservas = {
+                    c: r for c, r in self._reservas.items() if r[1] > ahora or r[2] > ahora
+                }
+            self._reservas[clave] = (tokens, vence, rechazo)
+
+reservas = Reservas()
+
+def _reserva(capacidad):
+    return math.ceil(capacidad * config()['RESERVA'])
+
+def _registrar(clave, costo, tomados, espera, ahora):
+    """Guarda lo reservado (o el rechazo) después de ir a la caché"""
+    if espera:
+        reservas.guardar(clave, 0, 0, rechazo=ahora + espera)
+    elif tomados > costo:
+        reservas.guardar(clave, tomados - costo, ahora + config()['RESERVA_TTL'])
+
+def consumir(herramienta, quien, costo=1):
+    """
+    Descuenta `costo` tokens del bucket de la tool para ese cliente.
+    Retorna 0 si se permitió, o los segundos hasta que haya tokens
+    """
+    tasa_tool = config()['TASAS'].get(herramienta)
+    if not tasa_tool:
+        return 0
+    capacidad, tasa = tasa_tool
+    clave = _clave(herramienta, quien)
+    ahora = time.time()
+    local = reservas.tomar(clave, costo, ahora)
+    if local is not None:
+        return local
+
+    cache = _cache()
+    nuevo, tomados, espera = _descontar(cache.get(clave), capacidad, tasa, costo, ahora, _reserva(capacidad))
+    if nuevo:
+        cache.set(clave, nuevo, _ttl(capacidad, tasa))
+    _registrar(clave, costo, tomados, espera, ahora)
+    return espera
+
+async def aconsumir(herramienta, quien, costo=1):
+    """Versión async de consumir"""
+    tasa_tool = config()['TASAS'].get(herramienta)
+    if not tasa_tool:
+        return 0
+    capacidad, tasa = tasa_tool
+    clave = _clave(herramienta, quien)
+    ahora = time.time()
+    local = reservas.tomar(clave, costo, ahora)
+    if local is not None:
+        return local
+
+    cache = _cache()
+    nuevo, tomados, espera = _descontar(await cache.aget(clave), capacidad, tasa, costo, ahora, _reserva(capacidad))
+    if nuevo:
+        await cache.aset(clave, nuevo, _ttl(capacidad, tasa))
+    _registrar(clave, costo, tomados, espera, ahora)
+    return espera
+
+def demasiadas(herramienta, espera):
+    """Respuesta 429 con Retry-After"""
+    _contar(herramienta, 'tasa')
+    response = JsonResponse({
+        'success': False,
+        'error': 'Demasiadas solicitudes',
+        'message': f'Límite de {herramienta} alcanzado, reintenta en {math.ceil(espera)} s',
+        'herramienta': herramienta,
+        'reintentar_en': math.ceil(espera),
+    }, status=429)
+    response['Retry-After'] = str(math.ceil(espera))
+    return response
+
+# ============= ADMISIÓN =============
+
+class Admision:
+    """Requests en vuelo del proceso (hilos WSGI y tareas ASGI)"""
+
+    def __init__(self):
+        self.en_vuelo = 0
+        self._lock = threading.Lock()
+
+    def entrar(self, prioridad):
+        conf = config()
+        limite = conf['MAX_EN_VUELO'] * conf['PRIORIDADES'][prioridad]
+        with self._lock:
+            if self.en_vuelo >= limite:
+                return False
+            self.en_vuelo += 1
+            return True
+
+    def salir(self):
+        with self._lock:
+            self.en_vuelo -= 1
+
+admision = Admision()
+
+def sobrecarga(vista, prioridad):
+    """Respuesta 503 con Retry-After"""
+    _contar(vista, f'sobrecarga_{prioridad}')
+    response = JsonResponse({
+        'success': False,
+        'error': 'Servidor sobrecargado',
+        'message': 'Demasiados requests en curso, reintenta en unos segundos',
+    }, status=503)
+    response['Retry-After'] = '1'
+    return response
+
+class _Liberar:
+    """
+    Contenido de un stream que libera su lugar en response.close(): el
+    servidor (WSGI o ASGI) la llama al terminar de enviar o si el cliente
+    se desconecta, aunque el stream no haya empezado
+    """
+
+    def __init__(self, contenido):
+        self.contenido = contenido
+        self.liberado = False
+
+    def close(self):
+        if not self.liberado:
+            self.liberado = True
+            admision.salir()
+
+class _LiberarSync(_Liberar):
+    def __iter__(self):
+        return iter(self.contenido)
+
+class _LiberarAsync(_Liberar):
+    def __aiter__(self):
+        return aiter(self.contenido)
+
+def _liberar_al_terminar(response):
+    """Libera el lugar en la admisión al terminar la respuesta (al cerrar el stream si es streaming)"""
+    if not isinstance(response, StreamingHttpResponse):
+        admision.salir()
+        return response
+    envoltura = _LiberarAsync if response.is_async else _LiberarSync
+    response.streaming_content = envoltura(response.streaming_content)
+    return response
+
+# ============= MIDDLEWARE =============
+
+class LimitesMiddleware:
+    """Aplica la admisión por prioridad y el límite de tasa de cada tool (sync y async)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def admitir(self, request):
+        """(vista, prioridad, respuesta de rechazo o None); prioridad None = no cuenta"""
+        vista = vista_de(request)
+        if vista is None:
+            return None, None, None
+        prioridad = PRIORIDAD_VISTAS.get(vista, 'normal')
+        if prioridad and not admision.entrar(prioridad):
+            return vista, None, sobrecarga(vista, prioridad)
+        return vista, prioridad, None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not config()['ACTIVO']:
+            return self.get_response(request)
+
+        vista, prioridad, rechazo = self.admitir(request)
+        if rechazo:
+            return rechazo
+        try:
+            herramienta = herramienta_de(vista)
+            espera = consumir(herramienta, identidad(request)) if herramienta else 0
+            response = demasiadas(herramienta, espera) if espera else self.get_response(request)
+        except BaseException:
+            if prioridad:
+                admision.salir()
+            raise
+        return _liberar_al_terminar(response) if prioridad else response
+
+    async def __acall__(self, request):
+        if not config()['ACTIVO']:
+            return await self.get_response(request)
+
+        vista, prioridad, rechazo = self.admitir(request)
+        if rechazo:
+            return rechazo
+        try:
+            herramienta = herramienta_de(vista)
+            espera = await aconsumir(herramienta, identidad(request)) if herramienta else 0
+            response = demasiadas(herramienta, espera) if espera else await self.get_response(request)
+        except BaseException:
+            if prioridad:
+                admision.salir()
+            raise
+        return _liberar_al_terminar(response) if prioridad else response
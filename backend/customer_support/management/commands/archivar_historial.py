@@ -0,0 +1,52 @@
+"""
+Management command para mover al archivo las acciones de HistorialAccion
+más antiguas que settings.RETENCION_HISTORIAL['DIAS'] (ver retencion.py).
+Pensado para correr a diario (cron).
+
+Para leer lo archivado: GET /api/export/historial/?incluir_archivo=1
+
+Uso: python manage.py archivar_historial --dias 90 --directorio /backups/historial
+"""
+from django.core.management.base import BaseCommand, CommandError
+from customer_support import retencion
+import time
+
+class Command(BaseCommand):
+    help = '🗄️ Archiva y borra las acciones antiguas de HistorialAccion'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            help='Conservar en la tabla los últimos N días (default: RETENCION_HISTORIAL["DIAS"])',
+        )
+        parser.add_argument(
+            '--directorio',
+            help='Directorio del archivo (default: RETENCION_HISTORIAL["DIRECTORIO"])',
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Solo contar las acciones que se archivarían',
+        )
+
+    def handle(self, *args, **options):
+        if options['dias'] is not None and options['dias'] < 0:
+            raise CommandError('--dias no puede ser negativo')
+        directorio = options['directorio'] or retencion.config()['DIRECTORIO']
+
+        inicio = time.perf_counter()
+        total, corte = retencion.archivar(
+            dias=options['dias'],
+            directorio=directorio,
+            simular=options['simular'],
+            progreso=lambda total: self.stdout.write(f'   {total} acciones archivadas...'),
+        )
+        duracion = time.perf_counter() - inicio
+
+        if options['simular']:
+            self.stdout.write(f'🗄️ Se archivarían {total} acciones anteriores al {corte}')
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {total} acciones anteriores al {corte} archivadas en {directorio} ({duracion:.1f}s)'
+        ))
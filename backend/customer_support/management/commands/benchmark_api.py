@@ -0,0 +1,352 @@
+"""
+Management command de benchmark de las AI tools: llama a los endpoints
+en proceso (handler WSGI, sin red) a distintos niveles de concurrencia y
+reporta throughput, latencia p50/p95/p99 y queries por request en JSON,
+para comparar corridas entre commits (--salida y --comparar).
+
+Endpoints: buscar-cliente, saldo, crear-ticket, registrar-pago, dashboard.
+Los clientes y términos de búsqueda se eligen de los datos actuales con
+--seed, así dos corridas sobre el mismo dataset hacen los mismos requests.
+
+Nota: crear-ticket y registrar-pago (y la auditoría) escriben en la base
+configurada; usar una base de prueba. Con --clientes N primero se genera
+un dataset nuevo con crear_datos_prueba --limpiar (borra los datos).
+
+Las tools de solo lectura responden desde la caché compartida
+(cache_tools.py) cuando repiten cliente o búsqueda; --sin-cache mide
+siempre las consultas a la base. Los límites de tasa y la admisión
+(limites.py) se desactivan durante la corrida: todos los requests salen
+de la misma IP.
+
+Uso: python manage.py benchmark_api --clientes 10000 --concurrencia 1 8 --salida base.json
+     python manage.py benchmark_api --concurrencia 1 8 --comparar base.json
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from decimal import Decimal
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import close_old_connections, connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from customer_support import cache_tools, limites
+from customer_support.models import Cliente, Ticket, Pago
+from urllib.parse import urlencode
+import django
+import io
+import json
+import platform
+import random
+import subprocess
+import threading
+import time
+
+ENDPOINTS = ['buscar-cliente', 'saldo', 'crear-ticket', 'registrar-pago', 'dashboard']
+MUESTRA_CLIENTES = 500
+
+def percentil(ordenadas, p):
+    """Percentil por rango más cercano de una lista ordenada"""
+    if not ordenadas:
+        return 0.0
+    return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p / 100))]
+
+def commit_actual():
+    """(hash corto, hay cambios sin commitear) del repositorio, o (None, None)"""
+    try:
+        rev = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=10
+        )
+        cambios = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None, None
+    if rev.returncode != 0:
+        return None, None
+    return rev.stdout.strip(), bool(cambios.stdout.strip())
+
+class Command(BaseCommand):
+    help = '⏱️ Benchmark de las AI tools: throughput, p50/p95/p99 y queries por request (JSON)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--endpoints',
+            nargs='+',
+            choices=ENDPOINTS,
+            default=ENDPOINTS,
+            help='Endpoints a medir (default: todos)',
+        )
+        parser.add_argument(
+            '--concurrencia',
+            nargs='+',
+            type=int,
+            default=[1, 8],
+            help='Niveles de concurrencia (hilos) a medir (default: 1 8)',
+        )
+        parser.add_argument(
+            '--peticiones',
+            type=int,
+            default=200,
+            help='Requests por endpoint y nivel (default: 200)',
+        )
+        parser.add_argument(
+            '--calentamiento',
+            type=int,
+            default=10,
+            help='Requests previos no medidos por endpoint (default: 10)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Semilla para elegir clientes y términos (default: 42)',
+        )
+        parser.add_argument(
+            '--clientes',
+            type=int,
+            help='Generar antes un dataset de N clientes (crear_datos_prueba --limpiar)',
+        )
+        parser.add_argument(
+            '--salida',
+            help='Archivo donde guardar el resultado en JSON',
+        )
+        parser.add_argument(
+            '--comparar',
+            help='JSON de una corrida anterior para mostrar la diferencia',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Imprimir solo el JSON del resultado',
+        )
+        parser.add_argument(
+            '--sin-cache',
+            action='store_true',
+            help='Desactivar la caché de AI tools (CACHE_TOOLS) durante la corrida',
+        )
+
+    def handle(self, *args, **options):
+        if options['peticiones'] < 1 or min(options['concurrencia']) < 1:
+            raise CommandError('--peticiones y --concurrencia deben ser mayores a 0')
+        base = None
+        if options['comparar']:
+            try:
+                with open(options['comparar']) as archivo:
+                    base = json.load(archivo)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'No se pudo leer {options["comparar"]}: {e}')
+
+        if options['clientes']:
+            call_command(
+                'crear_datos_prueba', '--limpiar', '--clientes', str(options['clientes']),
+                '--seed', str(options['seed']), stdout=io.StringIO()
+            )
+
+        self.rng = random.Random(options['seed'])
+        self.muestra = self.muestrear_clientes()
+        if not self.muestra:
+            raise CommandError('No hay clientes activos. Ejecuta "python manage.py crear_datos_prueba" primero')
+        self.wsgi = get_wsgi_application()
+
+        commit, cambios = commit_actual()
+        reporte = {
+            'fecha': timezone.now().isoformat(),
+            'commit': commit,
+            'cambios_sin_commit': cambios,
+            'entorno': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'base_de_datos': connection.vendor,
+            },
+            'datos': {
+                'clientes': Cliente.objects.count(),
+                'tickets': Ticket.objects.count(),
+                'pagos': Pago.objects.count(),
+            },
+            'config': {
+                clave: options[clave]
+                for clave in ('endpoints', 'concurrencia', 'peticiones', 'calentamiento', 'seed')
+            },
+            'cache_tools': cache_tools.config()['ACTIVO'] and not options['sin_cache'],
+            'resultados': [],
+        }
+
+        if not options['json']:
+            datos = reporte['datos']
+            self.stdout.write(
+                f'⏱️ {datos["clientes"]} clientes, {datos["tickets"]} tickets, {datos["pagos"]} pagos · '
+                f'commit {commit or "?"}{" (con cambios)" if cambios else ""}\n'
+            )
+            self.stdout.write(
+                f'{"endpoint":<15} {"hilos":>5} | {"req/s":>8} | {"p50 ms":>7} {"p95 ms":>7} {"p99 ms":>7} | '
+                f'{"queries":>7} | {"errores":>7}'
+            )
+
+        sin_cache = override_settings(CACHE_TOOLS={**cache_tools.config(), 'ACTIVO': False})
+        sin_limites = override_settings(LIMITES={**limites.config(), 'ACTIVO': False})
+        with sin_limites, sin_cache if options['sin_cache'] else nullcontext():
+            for endpoint in options['endpoints']:
+                for _ in range(options['calentamiento']):
+                    self.llamar(self.peticion(endpoint))
+                for hilos in options['concurrencia']:
+                    resultado = self.medir(endpoint, hilos, options['peticiones'])
+                    reporte['resultados'].append(resultado)
+                    if not options['json']:
+                        self.mostrar(resultado, self.buscar(base, endpoint, hilos))
+
+        if options['salida']:
+            with open(options['salida'], 'w') as archivo:
+                json.dump(reporte, archivo, indent=2)
+            if not options['json']:
+                self.stdout.write(f'\n💾 Resultado guardado en {options["salida"]}')
+        if options['json']:
+            self.stdout.write(json.dumps(reporte, indent=2))
+
+    # ----- Requests -----
+
+    def muestrear_clientes(self):
+        """Muestra reservoir (determinística con la seed) de clientes activos"""
+        muestra = []
+        filas = Cliente.objects.filter(activo=True).order_by('id').values_list('id', 'nombre')
+        for i, fila in enumerate(filas.iterator(chunk_size=5000)):
+            if i < MUESTRA_CLIENTES:
+                muestra.append(fila)
+            else:
+                j = self.rng.randint(0, i)
+                if j < MUESTRA_CLIENTES:
+                    muestra[j] = fila
+        return muestra
+
+    def peticion(self, endpoint):
+        """(método, path, query string, cuerpo JSON) de un request al endpoint"""
+        cliente_id, nombre = self.rng.choice(self.muestra)
+        if endpoint == 'buscar-cliente':
+            return 'GET', '/api/tools/buscar-cliente/', urlencode({'q': self.rng.choice(nombre.split())}), None
+        if endpoint == 'saldo':
+            return 'GET', f'/api/tools/cliente/{cliente_id}/saldo/', '', None
+        if endpoint == 'crear-ticket':
+            return 'POST', '/api/tools/crear-ticket/', '', {
+                'cliente': cliente_id,
+                'titulo': 'Benchmark: consulta de factura',
+                'descripcion': 'Ticket creado por benchmark_api',
+                'prioridad': self.rng.choice(['baja', 'media', 'alta']),
+            }
+        if endpoint == 'registrar-pago':
+            return 'POST', '/api/tools/registrar-pago/', '', {
+                'cliente': cliente_id,
+                'monto': str(Decimal(self.rng.randint(100, 10000)) / 100),
+                'descripcion': 'Pago de benchmark_api',
+                'metodo_pago': 'transferencia',
+            }
+        return 'GET', '/api/dashboard/estadisticas/', '', None
+
+    def llamar(self, peticion):
+        """Ejecuta el request en el handler WSGI. Retorna (ms, queries, error)"""
+        metodo, path, query, datos = peticion
+        cuerpo = json.dumps(datos).encode() if datos is not None else b''
+        environ = {
+            'REQUEST_METHOD': metodo,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(cuerpo)),
+            'SERVER_NAME': '127.0.0.1',
+            'SERVER_PORT': '8000',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_HOST': '127.0.0.1',
+            'wsgi.input': io.BytesIO(cuerpo),
+            'wsgi.url_scheme': 'http',
+        }
+        queries = 0
+
+        # execute_wrapper y no CaptureQueriesContext: request_started vacía connection.queries
+        def contar(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        estado = {}
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(contar):
+            respuesta = self.wsgi(environ, lambda status, headers: estado.setdefault('status', status))
+            b''.join(respuesta)
+            respuesta.close()
+        duracion = (time.perf_counter() - inicio) * 1000
+        return duracion, queries, int(estado['status'].split()[0]) >= 400
+
+    def medir(self, endpoint, hilos, total):
+        peticiones = [self.peticion(endpoint) for _ in range(total)]
+        siguiente = iter(peticiones)
+        lock = threading.Lock()
+        latencias, queries, errores = [], [], 0
+
+        def trabajador():
+            nonlocal errores
+            propias, fallidas = [], 0
+            try:
+                while True:
+                    with lock:
+                        peticion = next(siguiente, None)
+                    if peticion is None:
+                        break
+                    propias.append(self.llamar(peticion))
+            finally:
+                close_old_connections()
+            with lock:
+                for duracion, cantidad, error in propias:
+                    latencias.append(duracion)
+                    queries.append(cantidad)
+                    errores += error
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            for futuro in [pool.submit(trabajador) for _ in range(hilos)]:
+                futuro.result()
+        duracion = time.perf_counter() - inicio
+
+        ordenadas = sorted(latencias)
+        return {
+            'endpoint': endpoint,
+            'concurrencia': hilos,
+            'peticiones': total,
+            'errores': errores,
+            'rps': round(total / duracion, 1),
+            'p50_ms': round(percentil(ordenadas, 50), 2),
+            'p95_ms': round(percentil(ordenadas, 95), 2),
+            'p99_ms': round(percentil(ordenadas, 99), 2),
+            'max_ms': round(ordenadas[-1], 2),
+            'queries_por_request': round(sum(queries) / len(queries), 2),
+            'queries_max': max(queries),
+        }
+
+    # ----- Reporte -----
+
+    @staticmethod
+    def buscar(base, endpoint, hilos):
+        if not base:
+            return None
+        for resultado in base.get('resultados', []):
+            if resultado['endpoint'] == endpoint and resultado['concurrencia'] == hilos:
+                return resultado
+        return None
+
+    def mostrar(self, resultado, anterior):
+        self.stdout.write(
+            f'{resultado["endpoint"]:<15} {resultado["concurrencia"]:>5} | {resultado["rps"]:>8.1f} | '
+            f'{resultado["p50_ms"]:>7.1f} {resultado["p95_ms"]:>7.1f} {resultado["p99_ms"]:>7.1f} | '
+            f'{resultado["queries_por_request"]:>7.1f} | {resultado["errores"]:>7}'
+        )
+        if anterior:
+            def cambio(clave):
+                if not anterior[clave]:
+                    return 'n/a'
+                return f'{(resultado[clave] - anterior[clave]) / anterior[clave] * 100:+.0f}%'
+
+            self.stdout.write(
+                f'{"  vs base":<21} | {cambio("rps"):>8} | {cambio("p50_ms"):>7} {cambio("p95_ms"):>7} '
+                f'{cambio("p99_ms"):>7} | {cambio("queries_por_request"):>7} |'
+            )
@@ -0,0 +1,93 @@
+"""
+Management command para comparar la búsqueda con índice FTS5
+contra la búsqueda icontains (LIKE '%q%') sobre los datos actuales
+
+Uso: python manage.py benchmark_busqueda --repeticiones 50 --queries Maria garcia factura
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from customer_support import search
+from customer_support.models import Cliente, Ticket
+import statistics
+import time
+
+QUERIES_DEFAULT = ['Maria', 'garcia', 'email.com', 'Carlos Mendoza', 'factura', 'pago']
+
+class Command(BaseCommand):
+    help = '⏱️ Benchmark de búsqueda: índice FTS5 vs icontains'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--queries',
+            nargs='+',
+            default=QUERIES_DEFAULT,
+            help='Términos de búsqueda a medir',
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=50,
+            help='Repeticiones por término (default: 50)',
+        )
+
+    def handle(self, *args, **options):
+        if not search.fts_disponible():
+            raise CommandError('Los índices FTS5 no existen. Ejecuta "python manage.py migrate"')
+
+        repeticiones = options['repeticiones']
+        self.stdout.write(
+            f'⏱️ {Cliente.objects.count()} clientes, {Ticket.objects.count()} tickets, '
+            f'{repeticiones} repeticiones por término\n'
+        )
+
+        for query in options['queries']:
+            expresion = search.expresion_match(query)
+            if not expresion:
+                self.stdout.write(self.style.WARNING(f'   "{query}": término muy corto para el índice, omitido'))
+                continue
+
+            casos = {
+                'clientes icontains': lambda: list(Cliente.objects.filter(
+                    Q(nombre__icontains=query) | Q(email__icontains=query), activo=True
+                ).order_by('nombre')[:10]),
+                'clientes fts5': lambda: Cliente.objects.in_bulk(
+                    search.buscar_ids_clientes(expresion, limite=10)
+                ),
+                # La de buscar_cliente: sin acentos y tolerante a errores de tipeo
+                'clientes tolerante': lambda: Cliente.objects.in_bulk(
+                    search.buscar_ids_tolerante(query, limite=10)
+                ),
+                'tickets icontains': lambda: list(Ticket.objects.filter(
+                    Q(titulo__icontains=query) | Q(descripcion__icontains=query) |
+                    Q(cliente__nombre__icontains=query) | Q(cliente__email__icontains=query)
+                )[:25]),
+                'tickets fts5': lambda: list(
+                    search.filtrar_tickets(Ticket.objects.all(), expresion).order_by('relevancia')[:25]
+                ),
+            }
+
+            self.stdout.write(self.style.SUCCESS(f'🔎 "{query}"'))
+            tiempos = {nombre: self.medir(funcion, repeticiones) for nombre, funcion in casos.items()}
+            for nombre, muestras in tiempos.items():
+                self.stdout.write(
+                    f'   {nombre:<20} p50={statistics.median(muestras):8.3f}ms  '
+                    f'p95={self.percentil(muestras, 95):8.3f}ms'
+                )
+            for modelo in ('clientes', 'tickets'):
+                antes = statistics.median(tiempos[f'{modelo} icontains'])
+                despues = statistics.median(tiempos[f'{modelo} fts5'])
+                self.stdout.write(f'   {modelo}: {antes / despues if despues else 0:.1f}x')
+
+    def medir(self, funcion, repeticiones):
+        """Tiempos en ms de cada repetición (con una ejecución de calentamiento)"""
+        funcion()
+        muestras = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            muestras.append((time.perf_counter() - inicio) * 1000)
+        return muestras
+
+    def percentil(self, muestras, p):
+        ordenadas = sorted(muestras)
+        return ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * p / 100))]
@@ -0,0 +1,190 @@
+"""
+Management command para medir cuántas tool calls simultáneas sostiene
+un proceso: endpoints síncronos (DRF sobre WSGI, con un pool de hilos
+como gunicorn --threads) contra endpoints async (ASGI, un event loop
+como uvicorn). Llama a los handlers en proceso, sin red.
+
+Nota: las tools de consulta registran auditoría, así que el benchmark
+escribe filas en HistorialAccion de la base de datos configurada. Los
+límites de tasa y la admisión (limites.py) se desactivan durante la corrida.
+
+Uso: python manage.py benchmark_concurrencia --niveles 1 10 50 100 --requests 300 --hilos 4
+"""
+from concurrent.futures import ThreadPoolExecutor
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.test.utils import override_settings
+from customer_support import limites
+from customer_support.models import Cliente
+from urllib.parse import urlencode
+import asyncio
+import io
+import statistics
+import threading
+import time
+
+class Command(BaseCommand):
+    help = '⏱️ Benchmark de concurrencia: tools WSGI (DRF) vs ASGI (async)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--niveles',
+            nargs='+',
+            type=int,
+            default=[1, 10, 50, 100],
+            help='Niveles de concurrencia (requests en vuelo) a medir',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=300,
+            help='Requests totales por nivel (default: 300)',
+        )
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=4,
+            help='Hilos del worker WSGI (default: 4)',
+        )
+        parser.add_argument(
+            '--query',
+            default='Maria',
+            help='Término para buscar-cliente (default: Maria)',
+        )
+
+    def handle(self, *args, **options):
+        cliente = Cliente.objects.filter(activo=True).order_by('id').first()
+        if not cliente:
+            raise CommandError('No hay clientes. Ejecuta "python manage.py crear_datos_prueba" primero')
+
+        # Mezcla de tools de consulta: (path, query string)
+        self.rutas = [
+            ('tools/buscar-cliente/', urlencode({'q': options['query']})),
+            (f'tools/cliente/{cliente.id}/saldo/', ''),
+        ]
+        self.wsgi = get_wsgi_application()
+        self.asgi = get_asgi_application()
+        total = options['requests']
+
+        self.stdout.write(
+            f'⏱️ {total} requests por nivel, WSGI con {options["hilos"]} hilos, ASGI con 1 event loop\n'
+        )
+        self.stdout.write(f'{"en vuelo":>9} | {"WSGI req/s":>10} {"p95 ms":>8} | {"ASGI req/s":>10} {"p95 ms":>8}')
+        for nivel in options['niveles']:
+            with override_settings(LIMITES={**limites.config(), 'ACTIVO': False}):
+                wsgi = self.medir_wsgi(nivel, total, options['hilos'])
+                asgi = asyncio.run(self.medir_asgi(nivel, total))
+            self.stdout.write(
+                f'{nivel:>9} | {wsgi["rps"]:>10.1f} {wsgi["p95"]:>8.1f} | '
+                f'{asgi["rps"]:>10.1f} {asgi["p95"]:>8.1f}'
+            )
+            for nombre, resultado in (('WSGI', wsgi), ('ASGI', asgi)):
+                if resultado['errores']:
+                    self.stdout.write(self.style.WARNING(f'   {nombre}: {resultado["errores"]} respuestas con error'))
+
+    def resumen(self, latencias, errores, duracion):
+        ordenadas = sorted(latencias)
+        return {
+            'rps': len(latencias) / duracion,
+            'p50': statistics.median(ordenadas),
+            'p95': ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))],
+            'errores': errores,
+        }
+
+    # ----- WSGI: N requests en vuelo compartiendo un pool de hilos -----
+
+    def llamar_wsgi(self, indice, momento_envio):
+        path, query = self.rutas[indice % len(self.rutas)]
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': f'/api/{path}',
+            'QUERY_STRING': query,
+            'SERVER_NAME': '127.0.0.1',
+            'SERVER_PORT': '8000',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_HOST': '127.0.0.1',
+            'wsgi.input': io.BytesIO(b''),
+            'wsgi.url_scheme': 'http',
+        }
+        estado = {}
+        cuerpo = self.wsgi(environ, lambda status, headers: estado.setdefault('status', status))
+        b''.join(cuerpo)
+        # La latencia incluye la espera en cola por un hilo libre
+        return time.perf_counter() - momento_envio, not estado['status'].startswith('2')
+
+    def medir_wsgi(self, nivel, total, hilos):
+        latencias, errores = [], 0
+        en_vuelo = threading.Semaphore(nivel)
+        inicio = time.perf_counter()
+
+        def tarea(indice, momento_envio):
+            try:
+                return self.llamar_wsgi(indice, momento_envio)
+            finally:
+                en_vuelo.release()
+
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            futuros = []
+            for indice in range(total):
+                en_vuelo.acquire()
+                futuros.append(pool.submit(tarea, indice, time.perf_counter()))
+            for futuro in futuros:
+                latencia, error = futuro.result()
+                latencias.append(latencia * 1000)
+                errores += error
+
+        return self.resumen(latencias, errores, time.perf_counter() - inicio)
+
+    # ----- ASGI: N requests en vuelo en un solo event loop -----
+
+    async def llamar_asgi(self, indice):
+        path, query = self.rutas[indice % len(self.rutas)]
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': f'/api/async/{path}',
+            'raw_path': f'/api/async/{path}'.encode(),
+            'query_string': query.encode(),
+            'headers': [(b'host', b'127.0.0.1')],
+            'client': ('127.0.0.1', 50000),
+            'server': ('127.0.0.1', 8000),
+        }
+        recibido = False
+        desconexion = asyncio.Event()
+
+        async def receive():
+            nonlocal recibido
+            if not recibido:
+                recibido = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # El handler escucha una posible desconexión del cliente
+            await desconexion.wait()
+            return {'type': 'http.disconnect'}
+
+        estado = {}
+
+        async def send(mensaje):
+            if mensaje['type'] == 'http.response.start':
+                estado['status'] = mensaje['status']
+
+        inicio = time.perf_counter()
+        await self.asgi(scope, receive, send)
+        return time.perf_counter() - inicio, estado.get('status', 500) >= 400
+
+    async def medir_asgi(self, nivel, total):
+        latencias, errores = [], 0
+        en_vuelo = asyncio.Semaphore(nivel)
+
+        async def tarea(indice):
+            async with en_vuelo:
+                return await self.llamar_asgi(indice)
+
+        inicio = time.perf_counter()
+        for latencia, error in await asyncio.gather(*(tarea(i) for i in range(total))):
+            latencias.append(latencia * 1000)
+            errores += error
+        return self.resumen(latencias, errores, time.perf_counter() - inicio)
@@ -0,0 +1,136 @@
+"""
+Management command de estrés para el registro de pagos: varios hilos
+registran pagos a la vez y al final se verifica que el saldo de cada
+cliente sea exactamente la suma de sus pagos (sin actualizaciones perdidas).
+
+Escenarios:
+- mismo cliente: todos los hilos pagan al mismo cliente (máxima contención)
+- clientes distintos: cada hilo paga a su propio cliente
+
+Crea clientes temporales (benchmark-pagos-*@example.com) y los elimina al
+terminar, junto con sus pagos.
+
+Uso: python manage.py benchmark_pagos --hilos 8 --pagos 200
+"""
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections
+from customer_support.models import Cliente, Pago
+import threading
+import time
+import uuid
+
+class Command(BaseCommand):
+    help = '💰 Benchmark de estrés de pagos concurrentes (verifica que no se pierdan saldos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hilos',
+            type=int,
+            default=8,
+            help='Hilos registrando pagos a la vez (default: 8)',
+        )
+        parser.add_argument(
+            '--pagos',
+            type=int,
+            default=200,
+            help='Pagos por hilo (default: 200)',
+        )
+        parser.add_argument(
+            '--monto',
+            default='1.25',
+            help='Monto de cada pago (default: 1.25)',
+        )
+        parser.add_argument(
+            '--conservar',
+            action='store_true',
+            help='No eliminar los clientes y pagos creados',
+        )
+
+    def handle(self, *args, **options):
+        hilos, pagos = options['hilos'], options['pagos']
+        if hilos < 1 or pagos < 1:
+            raise CommandError('--hilos y --pagos deben ser mayores a 0')
+        self.monto = Decimal(options['monto'])
+
+        lote = uuid.uuid4().hex[:8]
+        clientes = [
+            Cliente.objects.create(
+                nombre=f'Benchmark Pagos {lote} {i}',
+                email=f'benchmark-pagos-{lote}-{i}@example.com',
+                saldo=0
+            )
+            for i in range(hilos)
+        ]
+
+        self.stdout.write(f'💰 {hilos} hilos x {pagos} pagos de ${self.monto}\n')
+        self.stdout.write(
+            f'{"escenario":<20} | {"pagos/s":>9} {"por cliente":>12} | {"p95 ms":>8} | {"errores":>7} | resultado'
+        )
+        correcto = True
+        try:
+            for escenario, destinos in (
+                ('mismo cliente', [clientes[0]] * hilos),
+                ('clientes distintos', clientes),
+            ):
+                correcto &= self.ejecutar(escenario, destinos, pagos)
+        finally:
+            if not options['conservar']:
+                Cliente.objects.filter(email__startswith=f'benchmark-pagos-{lote}-').delete()
+
+        if not correcto:
+            raise CommandError('Se perdieron actualizaciones de saldo')
+
+    def ejecutar(self, escenario, destinos, pagos):
+        ids = {cliente.id for cliente in destinos}
+        saldos_iniciales = dict(Cliente.objects.filter(id__in=ids).values_list('id', 'saldo'))
+        latencias, errores = [], []
+        guardados = dict.fromkeys(ids, 0)
+        lock = threading.Lock()
+
+        def trabajador(cliente_id):
+            # Cada hilo usa su propia instancia (y conexión): una lectura
+            # vieja del saldo no debe afectar el resultado
+            cliente = Cliente.objects.get(pk=cliente_id)
+            propias, fallidas = [], 0
+            try:
+                for _ in range(pagos):
+                    inicio = time.perf_counter()
+                    try:
+                        Pago.objects.create(cliente=cliente, monto=self.monto, descripcion='benchmark')
+                    except OperationalError:
+                        fallidas += 1
+                        continue
+                    propias.append((time.perf_counter() - inicio) * 1000)
+            finally:
+                close_old_connections()
+            with lock:
+                latencias.extend(propias)
+                errores.append(fallidas)
+                guardados[cliente_id] += len(propias)
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(destinos)) as pool:
+            list(pool.map(trabajador, [cliente.id for cliente in destinos]))
+        duracion = time.perf_counter() - inicio
+
+        # Verificación: saldo final = saldo inicial + suma de los pagos guardados
+        correcto = True
+        for cliente in Cliente.objects.filter(id__in=ids):
+            esperado = saldos_iniciales[cliente.id] + guardados[cliente.id] * self.monto
+            if cliente.saldo != esperado:
+                correcto = False
+                self.stdout.write(self.style.ERROR(
+                    f'   ❌ {cliente.nombre}: saldo {cliente.saldo}, esperado {esperado}'
+                ))
+
+        ordenadas = sorted(latencias) or [0.0]
+        p95 = ordenadas[min(len(ordenadas) - 1, int(len(ordenadas) * 0.95))]
+        por_segundo = len(latencias) / duracion
+        resultado = self.style.SUCCESS('✅ sin pérdidas') if correcto else self.style.ERROR('❌ saldos perdidos')
+        self.stdout.write(
+            f'{escenario:<20} | {por_segundo:>9.1f} {por_segundo / len(ids):>12.1f} | '
+            f'{p95:>8.1f} | {sum(errores):>7} | {resultado}'
+        )
+        return correcto
@@ -0,0 +1,82 @@
+"""
+Management command para comparar el tiempo de serialización de listados
+grandes: JSONRenderer de DRF contra ORJSONRenderer y MessagePackRenderer
+(renderers.py), con los datos que producen los serializers del API.
+Solo mide el renderer (el paso de dict a bytes), no la consulta.
+
+Uso: python manage.py benchmark_renderers --filas 1000 5000 --repeticiones 20
+"""
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from customer_support import renderers
+from customer_support.models import Cliente, Pago, Ticket
+from customer_support.serializers import ClienteSerializer, PagoSerializer, TicketSerializer
+import statistics
+import time
+
+class Command(BaseCommand):
+    help = '⏱️ Benchmark de renderers: JSONRenderer de DRF vs orjson vs MessagePack'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--filas',
+            nargs='+',
+            type=int,
+            default=[100, 1000, 5000],
+            help='Tamaños de listado a medir (default: 100 1000 5000)',
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=20,
+            help='Repeticiones por caso (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            raise CommandError('orjson no está instalado (pip install orjson)')
+
+        casos = {
+            'DRF JSONRenderer': JSONRenderer(),
+            'ORJSONRenderer': renderers.ORJSONRenderer(),
+        }
+        if renderers.MessagePackRenderer.disponible:
+            casos['MessagePack'] = renderers.MessagePackRenderer()
+        else:
+            self.stdout.write(self.style.WARNING('   msgpack no está instalado, se omite MessagePack'))
+
+        listados = {
+            'clientes': (Cliente.objects.order_by('id'), ClienteSerializer),
+            'tickets': (Ticket.objects.select_related('cliente').order_by('id'), TicketSerializer),
+            'pagos': (Pago.objects.select_related('cliente').order_by('id'), PagoSerializer),
+        }
+        self.stdout.write(f'⏱️ {options["repeticiones"]} repeticiones por caso, p50 en ms\n')
+        self.stdout.write(f'{"listado":<16} | ' + ' | '.join(f'{nombre:>18}' for nombre in casos) + ' | ahorro')
+
+        for nombre, (queryset, serializer) in listados.items():
+            for filas in options['filas']:
+                data = {'results': serializer(queryset[:filas], many=True).data}
+                if not data['results']:
+                    continue
+                tiempos = {}
+                for caso, renderer in casos.items():
+                    muestras = self.medir(lambda: renderer.render(data, renderer.media_type), options['repeticiones'])
+                    tiempos[caso] = (statistics.median(muestras), len(renderer.render(data, renderer.media_type)))
+
+                base, _ = tiempos['DRF JSONRenderer']
+                rapido, _ = tiempos['ORJSONRenderer']
+                self.stdout.write(
+                    f'{nombre + " x" + str(len(data["results"])):<16} | '
+                    + ' | '.join(f'{ms:>8.2f}ms {tamano / 1024:>6.0f}KB' for ms, tamano in tiempos.values())
+                    + f' | {base - rapido:.2f}ms ({base / rapido if rapido else 0:.1f}x)'
+                )
+
+    def medir(self, funcion, repeticiones):
+        """Tiempos en ms de cada repetición (con una ejecución de calentamiento)"""
+        funcion()
+        muestras = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            muestras.append((time.perf_counter() - inicio) * 1000)
+        return muestras
@@ -0,0 +1,42 @@
+"""
+Management command para restaurar un snapshot de guardar_snapshot con
+INSERT masivos: índices y triggers se recrean al final, las FKs se
+validan una sola vez y se reconstruyen el índice de búsqueda y los
+contadores del dashboard.
+
+Uso: python manage.py cargar_snapshot /ruta/snapshot --reemplazar
+"""
+from django.core.management.base import BaseCommand, CommandError
+from customer_support import snapshot
+import time
+
+class Command(BaseCommand):
+    help = '📥 Cargar un snapshot binario de los datos de soporte'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directorio', help='Directorio del snapshot')
+        parser.add_argument(
+            '--reemplazar',
+            action='store_true',
+            help='Borrar los clientes, tickets, pagos e historial existentes antes de cargar',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'📥 Cargando snapshot desde {options["directorio"]}...')
+        inicio = time.perf_counter()
+        try:
+            resultado = snapshot.cargar(options['directorio'], reemplazar=options['reemplazar'])
+        except snapshot.SnapshotError as e:
+            raise CommandError(str(e))
+        duracion = time.perf_counter() - inicio
+
+        anulados = resultado.pop('usuarios_anulados')
+        for tabla, total in resultado.items():
+            self.stdout.write(f'   {tabla}: {total} filas')
+        if anulados:
+            self.stdout.write(self.style.WARNING(
+                f'   ⚠️ {anulados} referencias a usuarios inexistentes quedaron en NULL'
+            ))
+        self.stdout.write(
+            self.style.SUCCESS(f'   ✅ {sum(resultado.values())} filas cargadas en {duracion:.2f}s')
+        )
@@ -3,13 +3,76 @@ Management command para crear datos de prueba
 Útil para testing y demo del sistema AI Assistant
 
 Uso: python manage.py crear_datos_prueba
+     python manage.py crear_datos_prueba --limpiar --clientes 100000 \
+         --tickets-por-cliente 3 --pagos-por-cliente 10 --seed 42
+
+Sin --clientes crea el set de demo (6 clientes). Con --clientes genera un
+dataset sintético reproducible (misma --seed y --fecha-base = mismos datos)
+con bulk_create por lotes, en una transacción y sin índices secundarios ni
+triggers FTS (se recrean al final). El saldo de cada cliente se calcula una
+sola vez (saldo inicial + sus pagos) antes de insertarlo.
 """
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from django.utils import timezone
+from customer_support import estadisticas, search
 from customer_support.models import Cliente, Ticket, Pago, HistorialAccion
+from customer_support.snapshot import indices_diferidos
 from decimal import Decimal
+import argparse
 import random
-from datetime import timedelta
+import time
+import unicodedata
+from datetime import date, datetime, timedelta
+
+# ============= DATOS PARA EL GENERADOR =============
+
+NOMBRES = [
+    'María', 'Juan', 'Ana', 'Carlos', 'Lucía', 'Roberto', 'Sofía', 'Andrés',
+    'Valentina', 'Diego', 'Camila', 'Luis', 'Gabriela', 'Jorge', 'Daniela',
+    'Fernando', 'Paola', 'Miguel', 'Isabel', 'Santiago', 'Verónica', 'José',
+]
+APELLIDOS = [
+    'García', 'Pérez', 'Rodríguez', 'Mendoza', 'Fernández', 'González', 'Vega',
+    'López', 'Silva', 'Torres', 'Ramírez', 'Castro', 'Morales', 'Herrera',
+    'Vásquez', 'Jaramillo', 'Zambrano', 'Cedeño', 'Salazar', 'Andrade',
+]
+DOMINIOS = ['email.com', 'gmail.com', 'yahoo.com', 'hotmail.com', 'empresa.ec']
+
+TITULOS_TICKET = [
+    ('Problema con factura del mes anterior', 'No puedo acceder a mi factura. El sistema me dice que no tengo permisos.'),
+    ('Error en el cálculo del saldo', 'Mi saldo muestra un valor incorrecto después del último pago realizado.'),
+    ('Solicitud de cambio de datos personales', 'Necesito actualizar mi número de teléfono y correo electrónico.'),
+    ('No puedo realizar pagos en línea', 'La plataforma de pagos no acepta mi tarjeta de crédito.'),
+    ('Cobro duplicado', 'Se registró dos veces el mismo pago en mi cuenta.'),
+    ('Sin servicio de internet', 'Desde ayer no tengo conexión en mi domicilio.'),
+    ('Consulta sobre plan contratado', 'Quisiera conocer los beneficios de mi plan actual.'),
+]
+# (valor, peso)
+ESTADOS_TICKET = [('abierto', 3), ('en_proceso', 2), ('pendiente', 1), ('resuelto', 5), ('cerrado', 2)]
+PRIORIDADES = [('baja', 3), ('media', 5), ('alta', 2), ('critica', 1)]
+METODOS_PAGO = [('transferencia', 5), ('tarjeta', 4), ('efectivo', 2), ('cheque', 1)]
+DESCRIPCIONES_PAGO = [
+    'Pago de factura mensual',
+    'Abono a cuenta corriente',
+    'Pago de servicios',
+    'Cancelación de deuda pendiente',
+]
+
+OPCIONES_POSITIVAS = ('clientes', 'tickets_por_cliente', 'pagos_por_cliente', 'lote')
+
+def sin_acentos(texto):
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode().lower()
+
+def entero_positivo(valor):
+    """type= de argparse: entero mayor a 0"""
+    try:
+        numero = int(valor)
+    except (TypeError, ValueError):
+        raise argparse.ArgumentTypeError(f'{valor!r} no es un entero')
+    if numero < 1:
+        raise argparse.ArgumentTypeError(f'{numero} no es mayor a 0')
+    return numero
 
 class Command(BaseCommand):
     help = '🤖 Crear datos de prueba para AI Assistant'
@@ -20,8 +83,47 @@ class Command(BaseCommand):
             action='store_true',
             help='Limpiar datos existentes antes de crear nuevos',
         )
+        parser.add_argument(
+            '--clientes',
+            type=entero_positivo,
+            help='Generar N clientes sintéticos en lugar del set de demo',
+        )
+        parser.add_argument(
+            '--tickets-por-cliente',
+            type=entero_positivo,
+            default=2,
+            help='Tickets promedio por cliente generado (default: 2)',
+        )
+        parser.add_argument(
+            '--pagos-por-cliente',
+            type=entero_positivo,
+            default=5,
+            help='Pagos promedio por cliente generado (default: 5)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Semilla del generador (default: 42)',
+        )
+        parser.add_argument(
+            '--fecha-base',
+            type=date.fromisoformat,
+            help='Fecha AAAA-MM-DD desde la que se generan fechas hacia atrás (default: hoy)',
+        )
+        parser.add_argument(
+            '--lote',
+            type=entero_positivo,
+            default=2000,
+            help='Clientes por lote de bulk_create (default: 2000)',
+        )
 
     def handle(self, *args, **options):
+        # call_command(clientes=0) no pasa por el type= del parser
+        for opcion in OPCIONES_POSITIVAS:
+            if options[opcion] is not None and options[opcion] < 1:
+                raise CommandError(f"--{opcion.replace('_', '-')} debe ser mayor a 0")
+
         self.stdout.write(
             self.style.SUCCESS('🚀 Iniciando creación de datos de prueba...')
         )
@@ -29,27 +131,153 @@ class Command(BaseCommand):
         if options['limpiar']:
             self.limpiar_datos()
 
-        # Crear datos en orden
-        clientes = self.crear_clientes()
-        tickets = self.crear_tickets(clientes)
-        pagos = self.crear_pagos(clientes)
-        self.crear_historial()
+        if options['clientes'] is not None:
+            self.generar(options)
+        else:
+            # Crear datos en orden
+            clientes = self.crear_clientes()
+            tickets = self.crear_tickets(clientes)
+            pagos = self.crear_pagos(clientes)
+            self.crear_historial()
 
-        self.mostrar_resumen(clientes, tickets, pagos)
+            self.mostrar_resumen(clientes, tickets, pagos)
+
+        # bulk_create y los DELETE directos no pasan por las señales
+        estadisticas.recalcular()
 
     def limpiar_datos(self):
-        """Limpiar todos los datos existentes"""
+        """Limpiar todos los datos existentes (DELETE directo, sin cargar filas en memoria)"""
         self.stdout.write('🧹 Limpiando datos existentes...')
         
-        HistorialAccion.objects.all().delete()
-        Pago.objects.all().delete()
-        Ticket.objects.all().delete()
-        Cliente.objects.all().delete()
+        modelos = (HistorialAccion, Pago, Ticket, Cliente)
+        with transaction.atomic(), connection.cursor() as cursor:
+            with indices_diferidos(cursor, modelos):
+                for modelo in modelos:
+                    cursor.execute(f'DELETE FROM {connection.ops.quote_name(modelo._meta.db_table)}')
+            if search.fts_disponible():
+                search.reconstruir_indices()
         
         self.stdout.write(
             self.style.WARNING('   ✅ Datos limpiados')
         )
 
+    # ============= GENERADOR SINTÉTICO =============
+
+    def generar(self, options):
+        """Genera clientes con sus tickets y pagos, en lotes de bulk_create"""
+        total_clientes = options['clientes']
+
+        rng = random.Random(options['seed'])
+        fecha_base = options['fecha_base'] or timezone.localdate()
+        self.ahora = timezone.make_aware(
+            datetime.combine(fecha_base, datetime.min.time()) + timedelta(days=1),
+            timezone.get_default_timezone()
+        )
+        self.seed = options['seed']
+        self.stdout.write(
+            f'🧪 Generando {total_clientes} clientes (~{options["tickets_por_cliente"]} tickets y '
+            f'~{options["pagos_por_cliente"]} pagos c/u), seed {self.seed}, hasta {fecha_base}'
+        )
+
+        conteo = {'clientes': 0, 'tickets': 0, 'pagos': 0}
+        inicio = time.perf_counter()
+        with transaction.atomic(), connection.cursor() as cursor:
+            with indices_diferidos(cursor, (Cliente, Ticket, Pago)):
+                for desde in range(0, total_clientes, options['lote']):
+                    hasta = min(desde + options['lote'], total_clientes)
+                    self.insertar_lote(rng, range(desde, hasta), options, conteo)
+                    filas = sum(conteo.values())
+                    self.stdout.write(
+                        f'   {conteo["clientes"]}/{total_clientes} clientes · {filas} filas · '
+                        f'{filas / (time.perf_counter() - inicio):,.0f} filas/s'
+                    )
+                self.stdout.write('   🗂️  Recreando índices...')
+
+            if search.fts_disponible():
+                self.stdout.write('   🔎 Reconstruyendo índice de búsqueda...')
+                search.reconstruir_indices()
+
+        duracion = time.perf_counter() - inicio
+        filas = sum(conteo.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'   ✅ {conteo["clientes"]} clientes, {conteo["tickets"]} tickets y {conteo["pagos"]} pagos '
+            f'en {duracion:.1f}s ({filas / duracion:,.0f} filas/s)'
+        ))
+
+    def insertar_lote(self, rng, indices, options, conteo):
+        """Genera e inserta un lote de clientes con sus tickets y pagos"""
+        lote = [
+            self.generar_cliente(rng, i, options['tickets_por_cliente'], options['pagos_por_cliente'])
+            for i in indices
+        ]
+        # bulk_create asigna el id a cada cliente (RETURNING en SQLite/PostgreSQL)
+        Cliente.objects.bulk_create([cliente for cliente, _, _ in lote])
+        tickets, pagos = [], []
+        for cliente, tickets_cliente, pagos_cliente in lote:
+            for objeto in tickets_cliente + pagos_cliente:
+                objeto.cliente = cliente
+            tickets.extend(tickets_cliente)
+            pagos.extend(pagos_cliente)
+        Ticket.objects.bulk_create(tickets, batch_size=5000)
+        Pago.objects.bulk_create(pagos, batch_size=5000)
+
+        conteo['clientes'] += len(lote)
+        conteo['tickets'] += len(tickets)
+        conteo['pagos'] += len(pagos)
+
+    def generar_cliente(self, rng, indice, tickets_promedio, pagos_promedio):
+        """(Cliente, [Ticket], [Pago]) sin guardar; saldo = inicial + pagos"""
+        nombre = f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}'
+        partes = sin_acentos(nombre).split()
+        registro = self.ahora - timedelta(seconds=rng.randint(3600, 730 * 86400))
+        cliente = Cliente(
+            nombre=nombre,
+            email=f'{partes[0]}.{partes[1]}.{indice}.s{self.seed}@{rng.choice(DOMINIOS)}',
+            telefono=f'+593-9{rng.randint(5, 9)}-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}',
+            fecha_registro=registro,
+            activo=rng.random() > 0.05,
+        )
+        # bulk_create no pasa por Cliente.save
+        cliente.clave_busqueda, cliente.clave_fonetica = search.claves_cliente(
+            cliente.nombre, cliente.email, cliente.telefono
+        )
+        segundos_activo = int((self.ahora - registro).total_seconds())
+
+        tickets = []
+        for _ in range(rng.randint(0, 2 * tickets_promedio)):
+            titulo, descripcion = rng.choice(TITULOS_TICKET)
+            estado = self.elegir(rng, ESTADOS_TICKET)
+            creacion = registro + timedelta(seconds=rng.randint(0, segundos_activo))
+            resolucion = None
+            if estado in ('resuelto', 'cerrado'):
+                resolucion = min(creacion + timedelta(hours=rng.randint(1, 96)), self.ahora)
+            tickets.append(Ticket(
+                titulo=titulo,
+                descripcion=descripcion,
+                estado=estado,
+                prioridad=self.elegir(rng, PRIORIDADES),
+                fecha_creacion=creacion,
+                fecha_resolucion=resolucion,
+            ))
+
+        pagos = []
+        saldo = Decimal(rng.randint(-50000, 200000)) / 100
+        for _ in range(rng.randint(0, 2 * pagos_promedio)):
+            monto = Decimal(rng.randint(500, 100000)) / 100
+            saldo += monto
+            pagos.append(Pago(
+                monto=monto,
+                descripcion=rng.choice(DESCRIPCIONES_PAGO),
+                metodo_pago=self.elegir(rng, METODOS_PAGO),
+                fecha=registro + timedelta(seconds=rng.randint(0, segundos_activo)),
+            ))
+        cliente.saldo = saldo
+        return cliente, tickets, pagos
+
+    @staticmethod
+    def elegir(rng, opciones):
+        return rng.choices([valor for valor, _ in opciones], weights=[peso for _, peso in opciones])[0]
+
     def crear_clientes(self):
         """Crear clientes de prueba"""
         self.stdout.write('👥 Creando clientes...')
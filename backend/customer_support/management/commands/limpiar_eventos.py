@@ -0,0 +1,16 @@
+"""
+Management command para borrar los eventos de /api/events/stream/ más
+viejos que settings.EVENTOS['RETENCION'] (ver eventos.py). Solo se usan
+para ponerse al día al reconectar con Last-Event-ID. Pensado para cron.
+
+Uso: python manage.py limpiar_eventos
+"""
+from django.core.management.base import BaseCommand
+from customer_support import eventos
+
+class Command(BaseCommand):
+    help = '🧹 Borra los eventos de cambios más viejos que la retención'
+
+    def handle(self, *args, **options):
+        total = eventos.limpiar()
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} eventos borrados'))
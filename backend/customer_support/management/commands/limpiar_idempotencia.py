@@ -0,0 +1,16 @@
+"""
+Management command para borrar las claves de idempotencia vencidas
+(settings.IDEMPOTENCIA['TTL'], ver idempotencia.py). Las vencidas ya no
+se usan; borrarlas solo mantiene chica la tabla. Pensado para cron.
+
+Uso: python manage.py limpiar_idempotencia
+"""
+from django.core.management.base import BaseCommand
+from customer_support import idempotencia
+
+class Command(BaseCommand):
+    help = '🧹 Borra las claves de idempotencia vencidas'
+
+    def handle(self, *args, **options):
+        total = idempotencia.limpiar()
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} claves de idempotencia vencidas borradas'))
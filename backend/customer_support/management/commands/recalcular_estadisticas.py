@@ -0,0 +1,23 @@
+"""
+Management command para recalcular los contadores del dashboard
+Útil después de cargas masivas (bulk_create, SQL directo) que no
+disparan las señales que los mantienen
+
+Uso: python manage.py recalcular_estadisticas
+"""
+from django.core.management.base import BaseCommand
+from customer_support import estadisticas
+import time
+
+class Command(BaseCommand):
+    help = '📊 Recalcular los contadores de estadísticas del dashboard'
+
+    def handle(self, *args, **options):
+        self.stdout.write('📊 Recalculando contadores de estadísticas...')
+        inicio = time.perf_counter()
+        total = estadisticas.recalcular()
+        duracion = time.perf_counter() - inicio
+
+        self.stdout.write(
+            self.style.SUCCESS(f'   ✅ {total} contadores recalculados en {duracion:.2f}s')
+        )
@@ -0,0 +1,44 @@
+"""
+Management command para reconstruir los índices de búsqueda FTS5
+Útil después de cargas masivas o si el índice queda desincronizado.
+Calcula antes las claves de búsqueda que falten (--claves: todas, por
+ejemplo después de un update() de nombres)
+
+Uso: python manage.py reconstruir_indice_busqueda
+"""
+from django.core.management.base import BaseCommand, CommandError
+from customer_support import search
+from customer_support.models import Cliente, Ticket
+import time
+
+class Command(BaseCommand):
+    help = '🔎 Reconstruir los índices de búsqueda de clientes y tickets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--claves',
+            action='store_true',
+            help='Recalcular las claves de búsqueda de todos los clientes',
+        )
+
+    def handle(self, *args, **options):
+        if not search.fts_disponible():
+            raise CommandError(
+                'Los índices FTS5 no existen. Ejecuta "python manage.py migrate" '
+                '(requiere SQLite >= 3.34 con FTS5)'
+            )
+
+        self.stdout.write('🔎 Reconstruyendo índices de búsqueda...')
+        inicio = time.perf_counter()
+        if options['claves']:
+            claves = search.completar_claves(todas=True)
+            self.stdout.write(f'   🔤 Claves de búsqueda de {claves} clientes recalculadas')
+        search.reconstruir_indices()
+        duracion = time.perf_counter() - inicio
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'   ✅ {Cliente.objects.count()} clientes y {Ticket.objects.count()} '
+                f'tickets indexados en {duracion:.2f}s'
+            )
+        )
@@ -0,0 +1,384 @@
+"""
+Métricas por endpoint en formato Prometheus (GET /api/metrics/)
+
+MetricasMiddleware registra por vista (nombre de la URL resuelta):
+- requests por método y código de respuesta
+- histograma de latencia
+- queries a la base de datos y tiempo en la base
+- bytes de respuesta (las respuestas streaming no se cuentan)
+
+Otros módulos suman contadores propios con registro.incrementar() (ej.
+aciertos de la caché de AI tools, cache_tools.py); se declaran en
+CONTADORES con su texto de ayuda.
+
+Las queries se cuentan con un execute_wrapper instalado una vez en cada
+conexión (señal connection_created) que suma en los contadores del
+request actual (un ContextVar): funciona igual en vistas sync, async y
+en los hilos de sync_to_async, y fuera de un request no hace nada.
+
+Cada proceso acumula en memoria. Con settings.METRICAS['DIRECTORIO'] (el
+default de settings.py) un hilo de fondo guarda cada INTERVALO segundos
+los contadores del proceso en <DIRECTORIO>/<pid>.json, o solo actualiza
+su fecha si no cambiaron (latido), y /api/metrics/ suma los de todos los
+workers. Los archivos sin latido en CADUCIDAD segundos son de procesos que
+terminaron: se borran al iniciar el hilo y al exponer, así no se siguen
+sumando ni los hereda un proceso nuevo con el mismo pid (Prometheus ve la
+baja del total como un reinicio del contador). Sin DIRECTORIO cada
+scrape ve solo el worker que responde.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+import atexit
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CONFIG_DEFAULT = {
+    'ACTIVO': True,
+    'DIRECTORIO': '',
+    'INTERVALO': 5.0,
+    'CADUCIDAD': 60.0,
+    'BUCKETS': [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0],
+}
+
+PREFIJO = 'ai_assistant'
+SIN_RUTA = 'sin_ruta'
+
+# Contadores con etiquetas libres: nombre -> ayuda
+CONTADORES = {
+    'cache_tools_total': 'Consultas a la caché de AI tools por herramienta y resultado',
+    'limites_rechazos_total': 'Requests rechazados por límite de tasa (429) o sobrecarga (503)',
+}
+
+def config():
+    """Configuración efectiva de métricas (settings.METRICAS sobre los defaults)"""
+    return {**CONFIG_DEFAULT, **getattr(settings, 'METRICAS', {})}
+
+# ============= CONTADOR DE QUERIES =============
+
+# [queries, segundos en la base] del request en curso
+_peticion_actual = ContextVar('metricas_peticion', default=None)
+
+def contar_query(execute, sql, params, many, context):
+    actual = _peticion_actual.get()
+    if actual is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        actual[0] += 1
+        actual[1] += time.perf_counter() - inicio
+
+def instalar_contador(connection, **kwargs):
+    if contar_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(contar_query)
+
+def conectar():
+    """Instala el contador en las conexiones actuales y en las que se abran"""
+    connection_created.connect(instalar_contador, dispatch_uid='metricas_contar_query')
+    for connection in connections.all(initialized_only=True):
+        instalar_contador(connection)
+
+# ============= REGISTRO POR PROCESO =============
+
+class RegistroMetricas:
+    """Contadores por vista del proceso actual"""
+
+    def __init__(self):
+        self._vistas = {}
+        self._contadores = {}
+        self._lock = threading.Lock()
+        self._lock_hilo = threading.Lock()
+        self._hilo = None
+        self._cambios = False
+
+    def registrar(self, vista, metodo, codigo, duracion, queries, tiempo_db, tamano):
+        buckets = config()['BUCKETS']
+        with self._lock:
+            datos = self._vistas.get(vista)
+            if datos is None:
+                datos = self._vistas[vista] = {
+                    'peticiones': {},
+                    'buckets': [0] * len(buckets),
+                    'cantidad': 0,
+                    'suma': 0.0,
+                    'queries': 0,
+                    'tiempo_db': 0.0,
+                    'bytes': 0,
+                }
+            clave = f'{metodo} {codigo}'
+            datos['peticiones'][clave] = datos['peticiones'].get(clave, 0) + 1
+            for i, limite in enumerate(buckets):
+                if duracion <= limite:
+                    datos['buckets'][i] += 1
+                    break
+            datos['cantidad'] += 1
+            datos['suma'] += duracion
+            datos['queries'] += queries
+            datos['tiempo_db'] += tiempo_db
+            datos['bytes'] += tamano
+            self._cambios = True
+
+        if config()['DIRECTORIO']:
+            self._asegurar_hilo()
+
+    def incrementar(self, nombre, cantidad=1, **etiquetas):
+        """Suma `cantidad` al contador `nombre` (declarado en CONTADORES) con esas etiquetas"""
+        clave = json.dumps(etiquetas, sort_keys=True)
+        with self._lock:
+            valores = self._contadores.setdefault(nombre, {})
+            valores[clave] = valores.get(clave, 0) + cantidad
+            self._cambios = True
+
+        if config()['DIRECTORIO']:
+            self._asegurar_hilo()
+
+    def estado(self):
+        """Copia serializable de los contadores"""
+        with self._lock:
+            return {
+                'buckets': config()['BUCKETS'],
+                'vistas': json.loads(json.dumps(self._vistas)),
+                'contadores': json.loads(json.dumps(self._contadores)),
+            }
+
+    def reiniciar(self):
+        with self._lock:
+            self._vistas = {}
+            self._contadores = {}
+
+    def guardar(self):
+        """Escribe los contadores del proceso en <DIRECTORIO>/<pid>.json"""
+        directorio = config()['DIRECTORIO']
+        if not directorio:
+            return
+        with self._lock:
+            self._cambios = False
+        estado = self.estado()
+        try:
+            os.makedirs(directorio, exist_ok=True)
+            fd, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+            with os.fdopen(fd, 'w') as archivo:
+                json.dump(estado, archivo)
+            os.replace(temporal, os.path.join(directorio, f'{os.getpid()}.json'))
+        except OSError as e:
+            logger.error(f"Error guardando métricas en {directorio}: {e}")
+
+    def _asegurar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock_hilo:
+            # El hilo no sobrevive a un fork (ej. gunicorn --preload): se recrea
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._ejecutar, name='metricas', daemon=True)
+                self._hilo.start()
+
+    def latido(self):
+        """Marca el archivo del proceso como vigente aunque no haya cambios"""
+        directorio = config()['DIRECTORIO']
+        if not directorio:
+            return
+        try:
+            os.utime(os.path.join(directorio, f'{os.getpid()}.json'))
+        except FileNotFoundError:
+            self.guardar()
+        except OSError as e:
+            logger.error(f"Error actualizando métricas en {directorio}: {e}")
+
+    def _ejecutar(self):
+        if config()['DIRECTORIO']:
+            vigentes(config()['DIRECTORIO'])
+        while True:
+            time.sleep(config()['INTERVALO'])
+            if self._cambios:
+                self.guardar()
+            else:
+                self.latido()
+
+    def al_salir(self):
+        """Guardar lo acumulado si el proceso publicaba en DIRECTORIO (hilo iniciado)"""
+        if self._hilo is not None:
+            self.guardar()
+
+registro = RegistroMetricas()
+
+# Guardar lo acumulado cuando el worker termina
+atexit.register(registro.al_salir)
+
+# ============= AGREGACIÓN Y EXPOSICIÓN =============
+
+def combinar(estados):
+    """Suma los contadores de varios procesos (con los mismos buckets)"""
+    total = {'buckets': config()['BUCKETS'], 'vistas': {}, 'contadores': {}}
+    for estado in estados:
+        if estado.get('buckets') != total['buckets']:
+            continue
+        for nombre, valores in estado.get('contadores', {}).items():
+            destino = total['contadores'].setdefault(nombre, {})
+            for clave, cantidad in valores.items():
+                destino[clave] = destino.get(clave, 0) + cantidad
+        for vista, datos in estado['vistas'].items():
+            destino = total['vistas'].get(vista)
+            if destino is None:
+                total['vistas'][vista] = json.loads(json.dumps(datos))
+                continue
+            for clave, cantidad in datos['peticiones'].items():
+                destino['peticiones'][clave] = destino['peticiones'].get(clave, 0) + cantidad
+            destino['buckets'] = [a + b for a, b in zip(destino['buckets'], datos['buckets'])]
+            for campo in ('cantidad', 'suma', 'queries', 'tiempo_db', 'bytes'):
+                destino[campo] += datos[campo]
+    return total
+
+def vigentes(directorio):
+    """
+    Archivos de métricas de los workers vivos. Borra los que no tienen
+    latido en CADUCIDAD segundos (y temporales abandonados)
+    """
+    limite = time.time() - config()['CADUCIDAD']
+    rutas = []
+    for ruta in glob.glob(os.path.join(directorio, '*.json')) + glob.glob(os.path.join(directorio, '*.tmp')):
+        try:
+            if os.path.getmtime(ruta) < limite:
+                os.remove(ruta)
+                continue
+        except OSError:
+            continue  # Otro proceso ya lo borró
+        if ruta.endswith('.json'):
+            rutas.append(ruta)
+    return rutas
+
+def estado_global():
+    """Contadores de todos los workers (o solo de este proceso sin DIRECTORIO)"""
+    directorio = config()['DIRECTORIO']
+    if not directorio:
+        return registro.estado()
+
+    registro.guardar()
+    estados = []
+    for ruta in vigentes(directorio):
+        try:
+            with open(ruta) as archivo:
+                estados.append(json.load(archivo))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Métricas ilegibles en {ruta}: {e}")
+    return combinar(estados)
+
+def _etiquetas(**valores):
+    def escapar(valor):
+        return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{clave}="{escapar(valor)}"' for clave, valor in valores.items()) + '}'
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+def exposicion(estado):
+    """Texto en formato de exposición de Prometheus (versión 0.0.4)"""
+    lineas = []
+
+    def metrica(nombre, tipo, ayuda, muestras):
+        lineas.append(f'# HELP {PREFIJO}_{nombre} {ayuda}')
+        lineas.append(f'# TYPE {PREFIJO}_{nombre} {tipo}')
+        for sufijo, etiquetas, valor in muestras:
+            lineas.append(f'{PREFIJO}_{nombre}{sufijo}{_etiquetas(**etiquetas)} {_numero(valor)}')
+
+    vistas = sorted(estado['vistas'].items())
+    metrica('http_requests_total', 'counter', 'Requests atendidos por vista, método y código', [
+        ('', {'vista': vista, 'metodo': clave.split()[0], 'codigo': clave.split()[1]}, cantidad)
+        for vista, datos in vistas
+        for clave, cantidad in sorted(datos['peticiones'].items())
+    ])
+
+    muestras = []
+    for vista, datos in vistas:
+        acumulado = 0
+        for limite, cantidad in zip(estado['buckets'], datos['buckets']):
+            acumulado += cantidad
+            muestras.append(('_bucket', {'vista': vista, 'le': _numero(float(limite))}, acumulado))
+        muestras.append(('_bucket', {'vista': vista, 'le': '+Inf'}, datos['cantidad']))
+        muestras.append(('_sum', {'vista': vista}, datos['suma']))
+        muestras.append(('_count', {'vista': vista}, datos['cantidad']))
+    metrica('http_request_duration_seconds', 'histogram', 'Latencia de los requests por vista', muestras)
+
+    metrica('db_queries_total', 'counter', 'Queries a la base de datos por vista', [
+        ('', {'vista': vista}, datos['queries']) for vista, datos in vistas
+    ])
+    metrica('db_query_duration_seconds_total', 'counter', 'Segundos en la base de datos por vista', [
+        ('', {'vista': vista}, datos['tiempo_db']) for vista, datos in vistas
+    ])
+    metrica('http_response_bytes_total', 'counter', 'Bytes de respuesta por vista (sin streaming)', [
+        ('', {'vista': vista}, datos['bytes']) for vista, datos in vistas
+    ])
+
+    for nombre, valores in sorted(estado.get('contadores', {}).items()):
+        if nombre in CONTADORES:
+            metrica(nombre, 'counter', CONTADORES[nombre], [
+                ('', json.loads(clave), cantidad) for clave, cantidad in sorted(valores.items())
+            ])
+    return '\n'.join(lineas) + '\n'
+
+# ============= MIDDLEWARE =============
+
+class MetricasMiddleware:
+    """Registra cada request en `registro` (sync y async)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not config()['ACTIVO']:
+            return self.get_response(request)
+
+        contadores = [0, 0.0]
+        token = _peticion_actual.set(contadores)
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _peticion_actual.reset(token)
+        self.registrar(request, response, time.perf_counter() - inicio, contadores)
+        return response
+
+    async def __acall__(self, request):
+        if not config()['ACTIVO']:
+            return await self.get_response(request)
+
+        contadores = [0, 0.0]
+        token = _peticion_actual.set(contadores)
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _peticion_actual.reset(token)
+        self.registrar(request, response, time.perf_counter() - inicio, contadores)
+        return response
+
+    @staticmethod
+    def registrar(request, response, duracion, contadores):
+        match = getattr(request, 'resolver_match', None)
+        registro.registrar(
+            vista=match.view_name if match else SIN_RUTA,
+            metodo=request.method,
+            codigo=response.status_code,
+            duracion=duracion,
+            queries=contadores[0],
+            tiempo_db=contadores[1],
+            tamano=0 if response.streaming else len(response.content),
+        )
@@ -0,0 +1,114 @@
+# Índices de texto completo (SQLite FTS5 + trigram) para búsqueda de clientes y tickets
+
+from django.db import migrations
+
+SQL_CREAR = [
+    # ---- Clientes: nombre, email, telefono ----
+    """
+    CREATE VIRTUAL TABLE customer_support_cliente_fts USING fts5(
+        nombre, email, telefono,
+        content='customer_support_cliente', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER customer_support_cliente_fts_ai AFTER INSERT ON customer_support_cliente BEGIN
+        INSERT INTO customer_support_cliente_fts(rowid, nombre, email, telefono)
+        VALUES (new.id, new.nombre, new.email, new.telefono);
+    END
+    """,
+    """
+    CREATE TRIGGER customer_support_cliente_fts_ad AFTER DELETE ON customer_support_cliente BEGIN
+        INSERT INTO customer_support_cliente_fts(customer_support_cliente_fts, rowid, nombre, email, telefono)
+        VALUES ('delete', old.id, old.nombre, old.email, old.telefono);
+    END
+    """,
+    # Solo reindexar si cambian columnas indexadas (no en cada cambio de saldo)
+    """
+    CREATE TRIGGER customer_support_cliente_fts_au AFTER UPDATE ON customer_support_cliente
+    WHEN old.nombre IS NOT new.nombre OR old.email IS NOT new.email OR old.telefono IS NOT new.telefono
+    BEGIN
+        INSERT INTO customer_support_cliente_fts(customer_support_cliente_fts, rowid, nombre, email, telefono)
+        VALUES ('delete', old.id, old.nombre, old.email, old.telefono);
+        INSERT INTO customer_support_cliente_fts(rowid, nombre, email, telefono)
+        VALUES (new.id, new.nombre, new.email, new.telefono);
+    END
+    """,
+    # ---- Tickets: titulo, descripcion ----
+    """
+    CREATE VIRTUAL TABLE customer_support_ticket_fts USING fts5(
+        titulo, descripcion,
+        content='customer_support_ticket', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER customer_support_ticket_fts_ai AFTER INSERT ON customer_support_ticket BEGIN
+        INSERT INTO customer_support_ticket_fts(rowid, titulo, descripcion)
+        VALUES (new.id, new.titulo, new.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER customer_support_ticket_fts_ad AFTER DELETE ON customer_support_ticket BEGIN
+        INSERT INTO customer_support_ticket_fts(customer_support_ticket_fts, rowid, titulo, descripcion)
+        VALUES ('delete', old.id, old.titulo, old.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER customer_support_ticket_fts_au AFTER UPDATE ON customer_support_ticket
+    WHEN old.titulo IS NOT new.titulo OR old.descripcion IS NOT new.descripcion
+    BEGIN
+        INSERT INTO customer_support_ticket_fts(customer_support_ticket_fts, rowid, titulo, descripcion)
+        VALUES ('delete', old.id, old.titulo, old.descripcion);
+        INSERT INTO customer_support_ticket_fts(rowid, titulo, descripcion)
+        VALUES (new.id, new.titulo, new.descripcion);
+    END
+    """,
+    # Indexar los datos existentes
+    "INSERT INTO customer_support_cliente_fts(customer_support_cliente_fts) VALUES('rebuild')",
+    "INSERT INTO customer_support_ticket_fts(customer_support_ticket_fts) VALUES('rebuild')",
+]
+
+SQL_ELIMINAR = [
+    'DROP TRIGGER IF EXISTS customer_support_cliente_fts_ai',
+    'DROP TRIGGER IF EXISTS customer_support_cliente_fts_ad',
+    'DROP TRIGGER IF EXISTS customer_support_cliente_fts_au',
+    'DROP TABLE IF EXISTS customer_support_cliente_fts',
+    'DROP TRIGGER IF EXISTS customer_support_ticket_fts_ai',
+    'DROP TRIGGER IF EXISTS customer_support_ticket_fts_ad',
+    'DROP TRIGGER IF EXISTS customer_support_ticket_fts_au',
+    'DROP TABLE IF EXISTS customer_support_ticket_fts',
+]
+
+
+def soporta_fts5_trigram(connection):
+    """FTS5 con tokenizer trigram requiere SQLite >= 3.34"""
+    if connection.vendor != 'sqlite':
+        return False
+    import sqlite3
+    return sqlite3.sqlite_version_info >= (3, 34, 0)
+
+
+def crear_indices(apps, schema_editor):
+    if not soporta_fts5_trigram(schema_editor.connection):
+        return
+    for sql in SQL_CREAR:
+        schema_editor.execute(sql)
+
+
+def eliminar_indices(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in SQL_ELIMINAR:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_support', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indices, eliminar_indices),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:20
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def calcular_contadores(apps, schema_editor):
+    """
+    Contadores iniciales con las claves de estadisticas.py a la fecha de
+    esta migración (copiado: no debe cambiar si ese módulo cambia)
+    """
+    Cliente = apps.get_model('customer_support', 'Cliente')
+    Ticket = apps.get_model('customer_support', 'Ticket')
+    Pago = apps.get_model('customer_support', 'Pago')
+    ContadorEstadistica = apps.get_model('customer_support', 'ContadorEstadistica')
+    zona = timezone.get_default_timezone()
+
+    valores = {}
+    activos = Cliente.objects.filter(activo=True)
+    valores['clientes_activos'] = (activos.count(), 0)
+    valores['clientes_saldo_positivo'] = (activos.filter(saldo__gt=0).count(), 0)
+    for fila in activos.annotate(d=TruncDate('fecha_registro', tzinfo=zona)).values('d').annotate(n=Count('id')):
+        valores[f'clientes_registrados:{fila["d"].isoformat()}'] = (fila['n'], 0)
+
+    valores['tickets'] = (Ticket.objects.count(), 0)
+    for fila in Ticket.objects.values('estado').annotate(n=Count('id')):
+        valores[f'tickets_estado:{fila["estado"]}'] = (fila['n'], 0)
+    resueltos = Ticket.objects.filter(estado='resuelto', fecha_resolucion__isnull=False)
+    for fila in resueltos.annotate(d=TruncDate('fecha_resolucion', tzinfo=zona)).values('d').annotate(n=Count('id')):
+        valores[f'tickets_resueltos:{fila["d"].isoformat()}'] = (fila['n'], 0)
+
+    por_dia = Pago.objects.annotate(d=TruncDate('fecha', tzinfo=zona)).values('d')
+    for fila in por_dia.annotate(n=Count('id'), total=Sum('monto')):
+        valores[f'pagos:{fila["d"].isoformat()}'] = (fila['n'], fila['total'] or 0)
+
+    ContadorEstadistica.objects.bulk_create(
+        [
+            ContadorEstadistica(clave=clave, cantidad=cantidad, monto=monto)
+            for clave, (cantidad, monto) in valores.items()
+            if cantidad
+        ],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_support', '0002_indices_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorEstadistica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(help_text='Contador, con sufijo :AAAA-MM-DD si es diario (America/Guayaquil)', max_length=60, unique=True)),
+                ('cantidad', models.BigIntegerField(default=0, help_text='Número de registros')),
+                ('monto', models.DecimalField(decimal_places=2, default=0, help_text='Suma de montos (solo contadores de pagos)', max_digits=16)),
+            ],
+            options={
+                'verbose_name': 'Contador de Estadística',
+                'verbose_name_plural': 'Contadores de Estadísticas',
+            },
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
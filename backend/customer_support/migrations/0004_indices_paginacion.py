@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_support', '0003_contadores_estadisticas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['nombre', 'id'], name='cliente_nombre_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['fecha', 'id'], name='pago_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['cliente', 'fecha', 'id'], name='pago_cliente_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['fecha_creacion', 'id'], name='ticket_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['estado', 'fecha_creacion', 'id'], name='ticket_estado_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_support', '0004_indices_paginacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['nombre', 'id'], name='cliente_activo_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialaccion',
+            index=models.Index(fields=['cliente', '-fecha'], name='historial_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historialaccion',
+            index=models.Index(fields=['tipo', '-fecha'], name='historial_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['cliente', 'estado'], name='ticket_cliente_estado_idx'),
+        ),
+    ]
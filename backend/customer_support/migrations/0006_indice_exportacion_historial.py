@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-17 00:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_support', '0005_indices_consultas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historialaccion',
+            index=models.Index(fields=['fecha', 'id'], name='historial_fecha_id_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_support', '0006_indice_exportacion_historial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(help_text='Idempotency-Key (o tool_call_id) enviada por el cliente', max_length=255, unique=True)),
+                ('tool', models.CharField(max_length=50)),
+                ('huella', models.CharField(help_text='SHA-256 del body: la misma clave con otro body es un error', max_length=64)),
+                ('estado', models.CharField(choices=[('en_proceso', 'En proceso'), ('completada', 'Completada')], default='en_proceso', max_length=20)),
+                ('codigo', models.PositiveSmallIntegerField(blank=True, help_text='Status HTTP de la respuesta', null=True)),
+                ('respuesta', models.JSONField(blank=True, null=True)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('expira', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Clave de Idempotencia',
+                'verbose_name_plural': 'Claves de Idempotencia',
+            },
+        ),
+    ]
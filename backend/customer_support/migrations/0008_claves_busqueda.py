@@ -0,0 +1,150 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:12
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Columnas nulas sin default: SQLite las agrega con ALTER TABLE, sin
+# recrear la tabla (lo que borraría los triggers FTS de 0002)
+
+SQL_CREAR = [
+    """
+    CREATE VIRTUAL TABLE customer_support_cliente_claves_fts USING fts5(
+        clave_busqueda, clave_fonetica,
+        content='customer_support_cliente', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER customer_support_cliente_claves_fts_ai AFTER INSERT ON customer_support_cliente BEGIN
+        INSERT INTO customer_support_cliente_claves_fts(rowid, clave_busqueda, clave_fonetica)
+        VALUES (new.id, new.clave_busqueda, new.clave_fonetica);
+    END
+    """,
+    """
+    CREATE TRIGGER customer_support_cliente_claves_fts_ad AFTER DELETE ON customer_support_cliente BEGIN
+        INSERT INTO customer_support_cliente_claves_fts(customer_support_cliente_claves_fts, rowid, clave_busqueda, clave_fonetica)
+        VALUES ('delete', old.id, old.clave_busqueda, old.clave_fonetica);
+    END
+    """,
+    """
+    CREATE TRIGGER customer_support_cliente_claves_fts_au AFTER UPDATE ON customer_support_cliente
+    WHEN old.clave_busqueda IS NOT new.clave_busqueda OR old.clave_fonetica IS NOT new.clave_fonetica
+    BEGIN
+        INSERT INTO customer_support_cliente_claves_fts(customer_support_cliente_claves_fts, rowid, clave_busqueda, clave_fonetica)
+        VALUES ('delete', old.id, old.clave_busqueda, old.clave_fonetica);
+        INSERT INTO customer_support_cliente_claves_fts(rowid, clave_busqueda, clave_fonetica)
+        VALUES (new.id, new.clave_busqueda, new.clave_fonetica);
+    END
+    """,
+    "INSERT INTO customer_support_cliente_claves_fts(customer_support_cliente_claves_fts) VALUES('rebuild')",
+]
+
+SQL_ELIMINAR = [
+    'DROP TRIGGER IF EXISTS customer_support_cliente_claves_fts_ai',
+    'DROP TRIGGER IF EXISTS customer_support_cliente_claves_fts_ad',
+    'DROP TRIGGER IF EXISTS customer_support_cliente_claves_fts_au',
+    'DROP TABLE IF EXISTS customer_support_cliente_claves_fts',
+]
+
+
+# Normalización y reglas fonéticas de search.py a la fecha de esta
+# migración (copiadas: si cambian, recalcular con
+# `python manage.py reconstruir_indice_busqueda --claves`)
+REGLAS_FONETICAS = [
+    (re.compile(r'[^a-z0-9]'), ''),
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'ch'), 'x'),
+    (re.compile(r'll'), 'y'),
+    (re.compile(r'qu'), 'k'),
+    (re.compile(r'g(?=[ei])'), 'j'),
+    (re.compile(r'gu(?=[ei])'), 'g'),
+    (re.compile(r'c(?=[ei])|z'), 's'),
+    (re.compile(r'[cq]'), 'k'),
+    (re.compile(r'v'), 'b'),
+    (re.compile(r'w'), 'u'),
+    (re.compile(r'h'), ''),
+    (re.compile(r'y$'), 'i'),
+    (re.compile(r'nb'), 'mb'),
+    (re.compile(r'(.)\1+'), r'\1'),
+]
+
+
+def normalizar(texto):
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.lower().split())
+
+
+def fonetica(texto):
+    palabras = []
+    for palabra in normalizar(texto).split():
+        for patron, reemplazo in REGLAS_FONETICAS:
+            palabra = patron.sub(reemplazo, palabra)
+        if palabra:
+            palabras.append(palabra)
+    return ' '.join(palabras)
+
+
+def calcular_claves(apps, schema_editor):
+    Cliente = apps.get_model('customer_support', 'Cliente')
+    connection = schema_editor.connection
+    tabla = connection.ops.quote_name(Cliente._meta.db_table)
+    sql = f'UPDATE {tabla} SET clave_busqueda = %s, clave_fonetica = %s WHERE id = %s'
+    clientes = Cliente.objects.using(connection.alias).order_by('id').values_list('id', 'nombre', 'email', 'telefono')
+    desde = 0
+    while True:
+        filas = list(clientes.filter(id__gt=desde)[:2000])
+        if not filas:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                (normalizar(' '.join(filter(None, (nombre, email, telefono)))), fonetica(nombre), cliente_id)
+                for cliente_id, nombre, email, telefono in filas
+            ])
+        desde = filas[-1][0]
+
+
+def soporta_fts5_trigram(connection):
+    """FTS5 con tokenizer trigram requiere SQLite >= 3.34"""
+    if connection.vendor != 'sqlite':
+        return False
+    import sqlite3
+    return sqlite3.sqlite_version_info >= (3, 34, 0)
+
+
+def crear_indice(apps, schema_editor):
+    if not soporta_fts5_trigram(schema_editor.connection):
+        return
+    for sql in SQL_CREAR:
+        schema_editor.execute(sql)
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in SQL_ELIMINAR:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_support', '0007_claves_idempotencia'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='clave_busqueda',
+            field=models.CharField(blank=True, editable=False, help_text='Nombre, email y teléfono sin acentos ni mayúsculas', max_length=400, null=True),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='clave_fonetica',
+            field=models.CharField(blank=True, editable=False, help_text='Nombre en clave fonética', max_length=200, null=True),
+        ),
+        migrations.RunPython(calcular_claves, migrations.RunPython.noop),
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
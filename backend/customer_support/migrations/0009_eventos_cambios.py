@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:18
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_support', '0008_claves_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoCambio',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('ticket_creado', 'Ticket creado'), ('ticket_estado', 'Cambio de estado de ticket'), ('pago_registrado', 'Pago registrado'), ('saldo_actualizado', 'Saldo actualizado')], max_length=20)),
+                ('cliente_id', models.BigIntegerField(help_text='Cliente afectado')),
+                ('datos', models.JSONField(blank=True, default=dict)),
+                ('fecha', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Evento de Cambio',
+                'verbose_name_plural': 'Eventos de Cambios',
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-17 01:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer_support', '0009_eventos_cambios'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['fecha_registro', 'id'], name='cliente_fecha_id_idx'),
+        ),
+    ]
@@ -5,10 +5,25 @@ Modelos de datos para el sistema de soporte al cliente con AI Tools
 - Pago: Registro de pagos realizados
 - Historial: Log de todas las acciones para auditoría
 """
-from django.db import models
+from decimal import Decimal
+from django.db import connections, models, router, transaction
+from django.db.models import F
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+from .search import claves_cliente
+
+# Campos de Cliente de los que salen las claves de búsqueda
+CAMPOS_BUSQUEDA = {'nombre', 'email', 'telefono'}
+
+def soporta_update_returning(connection):
+    """UPDATE ... RETURNING: PostgreSQL y SQLite >= 3.35 (no MySQL/MariaDB ni Oracle)"""
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 35, 0)
+    return False
+
 class Cliente(models.Model):
     """
     Modelo para almacenar información de clientes
@@ -42,9 +57,36 @@ class Cliente(models.Model):
         default=True,
         help_text="Cliente activo en el sistema"
     )
+    # Claves de búsqueda (ver search.py), calculadas en save()
+    clave_busqueda = models.CharField(
+        max_length=400,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Nombre, email y teléfono sin acentos ni mayúsculas"
+    )
+    clave_fonetica = models.CharField(
+        max_length=200,
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Nombre en clave fonética"
+    )
     
     class Meta:
         ordering = ['nombre']
+        indexes = [
+            # Paginación por cursor de /api/clientes/ (ver paginacion.py)
+            models.Index(fields=['nombre', 'id'], name='cliente_nombre_id_idx'),
+            # Exportación por lotes (fecha_registro, id) (ver exportacion.py)
+            models.Index(fields=['fecha_registro', 'id'], name='cliente_fecha_id_idx'),
+            # Listados y tools solo ven clientes activos
+            models.Index(
+                fields=['nombre', 'id'],
+                condition=models.Q(activo=True),
+                name='cliente_activo_nombre_idx'
+            ),
+        ]
         verbose_name = "Cliente"
         verbose_name_plural = "Clientes"
     
@@ -56,6 +98,60 @@ class Cliente(models.Model):
         """Retorna el saldo formateado en moneda"""
         return f"${self.saldo:,.2f}"
 
+    def save(self, *args, **kwargs):
+        """Recalcula las claves de búsqueda antes de guardar"""
+        self.clave_busqueda, self.clave_fonetica = claves_cliente(self.nombre, self.email, self.telefono)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and CAMPOS_BUSQUEDA & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'clave_busqueda', 'clave_fonetica'}
+        super().save(*args, **kwargs)
+
+    def sumar_saldo(self, monto):
+        """
+        Suma `monto` al saldo con un UPDATE atómico (saldo = saldo + monto),
+        sin leer ni reescribir el resto de columnas: pagos simultáneos del
+        mismo cliente no se pisan. Retorna el saldo nuevo y lo deja en la
+        instancia (con UPDATE ... RETURNING cuando la base lo soporta).
+        Lanza Cliente.DoesNotExist si el cliente ya no existe.
+        """
+        from . import estadisticas, eventos
+
+        monto = Decimal(str(monto))
+        db = self._state.db or router.db_for_write(Cliente, instance=self)
+        connection = connections[db]
+        with transaction.atomic(using=db):
+            if soporta_update_returning(connection):
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'UPDATE {connection.ops.quote_name(self._meta.db_table)} '
+                        f'SET saldo = saldo + %s WHERE id = %s RETURNING saldo, activo',
+                        [str(monto), self.pk]
+                    )
+                    fila = cursor.fetchone()
+            else:
+                clientes = Cliente.objects.using(db).filter(pk=self.pk)
+                fila = None
+                if clientes.update(saldo=F('saldo') + monto):
+                    fila = clientes.values_list('saldo', 'activo').get()
+            if fila is None:
+                raise Cliente.DoesNotExist(f'Cliente {self.pk} no existe')
+            saldo, activo = fila
+
+            saldo = Decimal(str(saldo)).quantize(Decimal('0.01'))
+            # El UPDATE no pasa por post_save: ajustar el contador de saldo positivo
+            estadisticas.registrar_cambio(
+                'Cliente',
+                (activo, saldo - monto, self.fecha_registro),
+                (activo, saldo, self.fecha_registro)
+            )
+            eventos.publicar('saldo_actualizado', self.pk, eventos.datos_saldo(saldo - monto, saldo))
+
+        self.saldo = saldo
+        self.activo = bool(activo)
+        if getattr(self, '_estado_estadisticas', None) not in (None, 'desconocido'):
+            self._estado_estadisticas = estadisticas.estado_de(self)
+        return saldo
+
 class Ticket(models.Model):
     """
     Modelo para tickets de soporte
@@ -128,6 +224,13 @@ class Ticket(models.Model):
     
     class Meta:
         ordering = ['-fecha_creacion']
+        indexes = [
+            # Paginación por cursor de /api/tickets/, con y sin ?estado=
+            models.Index(fields=['fecha_creacion', 'id'], name='ticket_fecha_id_idx'),
+            models.Index(fields=['estado', 'fecha_creacion', 'id'], name='ticket_estado_fecha_id_idx'),
+            # Tickets de un cliente por estado (consultar saldo, contexto del cliente)
+            models.Index(fields=['cliente', 'estado'], name='ticket_cliente_estado_idx'),
+        ]
         verbose_name = "Ticket"
         verbose_name_plural = "Tickets"
     
@@ -190,6 +293,11 @@ class Pago(models.Model):
     
     class Meta:
         ordering = ['-fecha']
+        indexes = [
+            # Paginación por cursor de /api/pagos/, con y sin ?cliente=
+            models.Index(fields=['fecha', 'id'], name='pago_fecha_id_idx'),
+            models.Index(fields=['cliente', 'fecha', 'id'], name='pago_cliente_fecha_id_idx'),
+        ]
         verbose_name = "Pago"
         verbose_name_plural = "Pagos"
     
@@ -202,11 +310,11 @@ class Pago(models.Model):
         automáticamente cuando se registra un pago
         """
         is_new = self.pk is None
-        super().save(*args, **kwargs)
-        
-        if is_new:  # Solo si es un pago nuevo
-            self.cliente.saldo += self.monto
-            self.cliente.save()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            
+            if is_new:  # Solo si es un pago nuevo
+                self.cliente.sumar_saldo(self.monto)
 
 class HistorialAccion(models.Model):
     """
@@ -262,8 +370,103 @@ class HistorialAccion(models.Model):
     
     class Meta:
         ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['cliente', '-fecha'], name='historial_cliente_fecha_idx'),
+            models.Index(fields=['tipo', '-fecha'], name='historial_tipo_fecha_idx'),
+            # Exportación por rango de fechas (ver exportacion.py)
+            models.Index(fields=['fecha', 'id'], name='historial_fecha_id_idx'),
+        ]
         verbose_name = "Historial de Acción"
         verbose_name_plural = "Historial de Acciones"
     
     def __str__(self):
-        return f"{self.tipo} - {self.descripcion[:50]} ({self.fecha.strftime('%d/%m/%Y %H:%M')})"
\ No newline at end of file
+        return f"{self.tipo} - {self.descripcion[:50]} ({self.fecha.strftime('%d/%m/%Y %H:%M')})"
+
+class ContadorEstadistica(models.Model):
+    """
+    Contadores del dashboard mantenidos de forma incremental
+    Se actualizan al guardar/eliminar Cliente, Ticket y Pago (ver
+    estadisticas.py) y se reconstruyen con `recalcular_estadisticas`
+    """
+    clave = models.CharField(
+        max_length=60,
+        unique=True,
+        help_text="Contador, con sufijo :AAAA-MM-DD si es diario (America/Guayaquil)"
+    )
+    cantidad = models.BigIntegerField(
+        default=0,
+        help_text="Número de registros"
+    )
+    monto = models.DecimalField(
+        max_digits=16,
+        decimal_places=2,
+        default=0,
+        help_text="Suma de montos (solo contadores de pagos)"
+    )
+    
+    class Meta:
+        verbose_name = "Contador de Estadística"
+        verbose_name_plural = "Contadores de Estadísticas"
+    
+    def __str__(self):
+        return f"{self.clave}: {self.cantidad}"
+
+class ClaveIdempotencia(models.Model):
+    """
+    Respuesta de una tool de escritura guardada por Idempotency-Key
+    Un reintento con la misma clave recibe la respuesta original sin
+    volver a crear el pago o el ticket (ver idempotencia.py)
+    """
+    ESTADO_CHOICES = [
+        ('en_proceso', 'En proceso'),
+        ('completada', 'Completada'),
+    ]
+    
+    clave = models.CharField(
+        max_length=255,
+        unique=True,
+        help_text="Idempotency-Key (o tool_call_id) enviada por el cliente"
+    )
+    tool = models.CharField(max_length=50)
+    huella = models.CharField(
+        max_length=64,
+        help_text="SHA-256 del body: la misma clave con otro body es un error"
+    )
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='en_proceso')
+    codigo = models.PositiveSmallIntegerField(null=True, blank=True, help_text="Status HTTP de la respuesta")
+    respuesta = models.JSONField(null=True, blank=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+    expira = models.DateTimeField(db_index=True)
+    
+    class Meta:
+        verbose_name = "Clave de Idempotencia"
+        verbose_name_plural = "Claves de Idempotencia"
+    
+    def __str__(self):
+        return f"{self.tool} {self.clave} ({self.estado})"
+
+class EventoCambio(models.Model):
+    """
+    Cambio de un ticket, pago o saldo para /api/events/stream/ (SSE)
+    Se guarda en la misma transacción que el cambio; el id es el id del
+    evento que el navegador reenvía en Last-Event-ID (ver eventos.py)
+    """
+    TIPO_CHOICES = [
+        ('ticket_creado', 'Ticket creado'),
+        ('ticket_estado', 'Cambio de estado de ticket'),
+        ('pago_registrado', 'Pago registrado'),
+        ('saldo_actualizado', 'Saldo actualizado'),
+    ]
+    
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    # Sin FK: el evento se conserva aunque se borre el cliente
+    cliente_id = models.BigIntegerField(help_text="Cliente afectado")
+    datos = models.JSONField(default=dict, blank=True)
+    fecha = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        verbose_name = "Evento de Cambio"
+        verbose_name_plural = "Eventos de Cambios"
+    
+    def __str__(self):
+        return f"#{self.id} {self.tipo} (cliente {self.cliente_id})"
@@ -0,0 +1,99 @@
+"""
+Paginación de los ViewSets (/api/clientes/, /api/tickets/, /api/pagos/)
+
+Por defecto se mantiene PageNumberPagination (?page=N, con "count").
+Con ?paginacion=cursor se usa paginación por cursor (keyset): cada página
+filtra por la última fila de la anterior, ej. (fecha, id) < (f, i), en
+lugar de usar OFFSET y COUNT(*), así la página N cuesta lo mismo que la 1.
+La respuesta trae "next" con el cursor de la siguiente página.
+
+Cada ViewSet declara `orden_cursor`: dos campos, el segundo único (id),
+con el mismo sentido, ej. ('-fecha', '-id'). Necesitan un índice sobre
+esos campos (ver Meta.indexes de los modelos).
+"""
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+import json
+
+class PaginacionSeleccionable(PageNumberPagination):
+    """PageNumberPagination, o keyset si el request pide ?paginacion=cursor"""
+
+    modo_query_param = 'paginacion'
+    cursor_query_param = 'cursor'
+
+    def usa_cursor(self, request):
+        return (
+            request.query_params.get(self.modo_query_param) == 'cursor'
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor = None
+        if view is None or not getattr(view, 'orden_cursor', None) or not self.usa_cursor(request):
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.orden = view.orden_cursor
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.orden)
+
+        valor = request.query_params.get(self.cursor_query_param)
+        if valor:
+            queryset = queryset.filter(self.filtro_despues_de(queryset.model, valor))
+
+        filas = list(queryset[:page_size + 1])
+        self.cursor = {'hay_siguiente': len(filas) > page_size}
+        filas = filas[:page_size]
+        if filas:
+            self.cursor['ultima'] = filas[-1]
+        return filas
+
+    def get_paginated_response(self, data):
+        if self.cursor is None:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if self.cursor is None:
+            return super().get_next_link()
+        if not self.cursor['hay_siguiente']:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.codificar(self.cursor['ultima']))
+
+    # ----- Cursor: posición (valor, id) de la última fila, en base64 -----
+
+    def campos(self):
+        return [campo.lstrip('-') for campo in self.orden]
+
+    def codificar(self, fila):
+        campo, campo_id = self.campos()
+        valor = fila._meta.get_field(campo).value_to_string(fila)
+        datos = json.dumps([valor, getattr(fila, campo_id)], separators=(',', ':'))
+        return urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+    def filtro_despues_de(self, modelo, cursor):
+        """Q de las filas posteriores al cursor según orden_cursor"""
+        campo, campo_id = self.campos()
+        try:
+            relleno = '=' * (-len(cursor) % 4)
+            valor, ultimo_id = json.loads(urlsafe_b64decode(cursor + relleno))
+            valor = modelo._meta.get_field(campo).to_python(valor)
+            ultimo_id = int(ultimo_id)
+        except (ValueError, TypeError, ValidationError):
+            raise NotFound('Cursor inválido')
+
+        # campo <= valor acota el rango del índice; el OR desempata por id
+        op = 'lt' if self.orden[0].startswith('-') else 'gt'
+        return Q(**{f'{campo}__{op}e': valor}) & (
+            Q(**{f'{campo}__{op}': valor}) | Q(**{f'{campo_id}__{op}': ultimo_id})
+        )
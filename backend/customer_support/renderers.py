@@ -0,0 +1,116 @@
+"""
+Renderers y parsers rápidos para el API (settings.REST_FRAMEWORK)
+
+- JSON con orjson (si está instalado; si no, el JSONRenderer/JSONParser
+  de DRF). Las fechas, Decimal, UUID, lazy strings, etc. pasan por el
+  encoder de DRF, así que el JSON es el mismo que el del JSONRenderer
+  estándar (ej. datetimes con milisegundos y "Z", Decimal como número).
+- MessagePack (application/msgpack), con los mismos tipos, si el paquete
+  msgpack está instalado; se pide con "Accept: application/msgpack".
+
+NegociacionContenido descarta los renderers cuyo paquete no está
+instalado y usa BrowsableAPIRenderer solo si el cliente pide text/html
+explícitamente (un navegador), nunca por un "Accept: */*".
+
+Medición: python manage.py benchmark_renderers
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
+from rest_framework.utils import encoders
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - dependencia opcional
+    msgpack = None
+
+_encoder = encoders.JSONEncoder()
+
+def convertir(obj):
+    """Tipos que orjson/msgpack no serializan, igual que el encoder de DRF"""
+    return _encoder.default(obj)
+
+# Fechas por `convertir` (formato de DRF) y claves no-str como json.dumps
+OPCIONES_ORJSON = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+def json_bytes(data):
+    """`data` como JSON (UTF-8) con el mismo formato que el JSONRenderer de DRF"""
+    if orjson is not None:
+        return orjson.dumps(data, default=convertir, option=OPCIONES_ORJSON)
+    return JSONRenderer().render(data)
+
+def json_cargar(contenido):
+    """json.loads con orjson si está instalado (mismo JSONDecodeError)"""
+    if orjson is not None:
+        return orjson.loads(contenido)
+    return json.loads(contenido)
+
+# ============= JSON =============
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer de DRF con orjson; con ?indent o sin orjson usa el original"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=convertir, option=OPCIONES_ORJSON)
+
+class ORJSONParser(JSONParser):
+    """JSONParser de DRF con orjson (solo UTF-8, como exige el RFC 8259)"""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return json_cargar(stream.read())
+        except json.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+# ============= MESSAGEPACK =============
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    disponible = msgpack is not None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=convertir, use_bin_type=True)
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+    disponible = msgpack is not None
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.UnpackException) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
+
+# ============= NEGOCIACIÓN =============
+
+class NegociacionContenido(DefaultContentNegotiation):
+    """Sin renderers/parsers no instalados; API navegable solo para navegadores"""
+
+    def select_parser(self, request, parsers):
+        parsers = [parser for parser in parsers if getattr(parser, 'disponible', True)]
+        return super().select_parser(request, parsers)
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        renderers = [renderer for renderer in renderers if getattr(renderer, 'disponible', True)]
+        formato = format_suffix or request.query_params.get(self.settings.URL_FORMAT_OVERRIDE)
+        if not formato and 'text/html' not in request.META.get('HTTP_ACCEPT', ''):
+            renderers = [r for r in renderers if not isinstance(r, BrowsableAPIRenderer)] or renderers
+        return super().select_renderer(request, renderers, format_suffix)
@@ -0,0 +1,139 @@
+"""
+Retención de HistorialAccion: las acciones más antiguas que
+settings.RETENCION_HISTORIAL['DIAS'] se mueven a archivos comprimidos por
+día y se borran de la tabla, que queda chica (admin y date_hierarchy).
+Usado por `archivar_historial` y por la exportación de historial con
+?incluir_archivo=1.
+
+Formato: <DIRECTORIO>/AAAA/MM/AAAA-MM-DD.ndjson.gz (día en
+America/Guayaquil), un objeto JSON por acción con las columnas de la
+exportación de historial. Cada corrida agrega un miembro gzip al archivo
+del día (gzip lee los miembros concatenados como un solo flujo).
+
+Las filas se leen por keyset en lotes (exportacion.filas), se escriben
+(con fsync) y recién después se borran de la base en lotes de
+LOTE_BORRADO, cada uno en su propia transacción corta. Si el proceso se
+corta entre la escritura y el borrado, la siguiente corrida vuelve a
+archivar esas filas; al leer se descartan los ids repetidos.
+"""
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from itertools import groupby, islice
+import gzip
+import json
+import os
+
+from . import exportacion
+from .models import HistorialAccion
+
+CONFIG_DEFAULT = {
+    'DIAS': 90,
+    'DIRECTORIO': os.path.join(settings.BASE_DIR, 'archivo', 'historial'),
+}
+
+LOTE_ARCHIVO = 5000
+LOTE_BORRADO = 500
+
+def config():
+    """Configuración efectiva de retención (settings.RETENCION_HISTORIAL sobre los defaults)"""
+    return {**CONFIG_DEFAULT, **getattr(settings, 'RETENCION_HISTORIAL', {})}
+
+def columnas():
+    return [nombre for nombre, _ in exportacion.RECURSOS['historial'][2]]
+
+def ruta_del_dia(directorio, dia):
+    return os.path.join(directorio, f'{dia:%Y}', f'{dia:%m}', f'{dia.isoformat()}.ndjson.gz')
+
+def _dia_local(valor):
+    return timezone.localtime(valor, timezone.get_default_timezone()).date()
+
+# ============= ARCHIVAR =============
+
+def _escribir(directorio, dia, filas, encoder):
+    ruta = ruta_del_dia(directorio, dia)
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    datos = ''.join(encoder.encode(fila) + '\n' for fila in filas).encode('utf-8')
+    with open(ruta, 'ab') as archivo:
+        archivo.write(gzip.compress(datos))
+        archivo.flush()
+        os.fsync(archivo.fileno())
+
+def _borrar(ids):
+    tabla = connection.ops.quote_name(HistorialAccion._meta.db_table)
+    for i in range(0, len(ids), LOTE_BORRADO):
+        lote = ids[i:i + LOTE_BORRADO]
+        # DELETE directo: HistorialAccion no tiene señales ni FKs entrantes
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {tabla} WHERE id IN ({", ".join(["%s"] * len(lote))})', lote)
+
+def archivar(dias=None, directorio=None, simular=False, progreso=None):
+    """
+    Mueve al archivo las acciones anteriores al inicio del día de hace
+    `dias` días (hora local). Retorna (filas archivadas, fecha de corte)
+    """
+    conf = config()
+    dias = conf['DIAS'] if dias is None else dias
+    directorio = directorio or conf['DIRECTORIO']
+    corte = timezone.localdate(timezone=timezone.get_default_timezone()) - timedelta(days=dias)
+
+    nombres, tuplas = exportacion.filas('historial', hasta=corte - timedelta(days=1))
+    if simular:
+        return sum(1 for _ in tuplas), corte
+
+    i_fecha, i_id = nombres.index('fecha'), nombres.index('id')
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    total = 0
+    while True:
+        lote = list(islice(tuplas, LOTE_ARCHIVO))
+        if not lote:
+            break
+        for dia, filas in groupby(lote, key=lambda tupla: _dia_local(tupla[i_fecha])):
+            _escribir(directorio, dia, [
+                {**dict(zip(nombres, tupla)), 'fecha': tupla[i_fecha].isoformat()}
+                for tupla in filas
+            ], encoder)
+        _borrar([tupla[i_id] for tupla in lote])
+        total += len(lote)
+        if progreso:
+            progreso(total)
+    return total, corte
+
+# ============= LEER =============
+
+def dias_archivados(directorio=None):
+    """Días con archivo, en orden"""
+    directorio = directorio or config()['DIRECTORIO']
+    dias = []
+    for _, _, archivos in os.walk(directorio):
+        for nombre in archivos:
+            if nombre.endswith('.ndjson.gz'):
+                dias.append(datetime.strptime(nombre[:10], '%Y-%m-%d').date())
+    return sorted(dias)
+
+def leer(desde=None, hasta=None, cliente_id=None, tipo=None, directorio=None):
+    """
+    Tuplas archivadas (columnas de la exportación de historial) en orden
+    (fecha, id), filtradas por días locales (inclusive), cliente y tipo.
+    Se carga un día a la vez
+    """
+    directorio = directorio or config()['DIRECTORIO']
+    nombres = columnas()
+    i_fecha, i_id = nombres.index('fecha'), nombres.index('id')
+    for dia in dias_archivados(directorio):
+        if (desde and dia < desde) or (hasta and dia > hasta):
+            continue
+        por_id = {}
+        with gzip.open(ruta_del_dia(directorio, dia), 'rt', encoding='utf-8') as archivo:
+            for linea in archivo:
+                fila = json.loads(linea)
+                if cliente_id and fila['cliente'] != cliente_id:
+                    continue
+                if tipo and fila['tipo'] != tipo:
+                    continue
+                fila['fecha'] = datetime.fromisoformat(fila['fecha'])
+                por_id[fila['id']] = tuple(fila[nombre] for nombre in nombres)
+
+        yield from sorted(por_id.values(), key=lambda tupla: (tupla[i_fecha], tupla[i_id]))
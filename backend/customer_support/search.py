@@ -0,0 +1,293 @@
+"""
+Búsqueda de texto completo sobre SQLite FTS5 (tokenizer trigram)
+- Índices: customer_support_cliente_fts (nombre, email, telefono)
+           customer_support_ticket_fts (titulo, descripcion)
+           customer_support_cliente_claves_fts (clave_busqueda, clave_fonetica)
+- Los índices se mantienen sincronizados con triggers de SQLite
+  (ver migraciones 0002_indices_busqueda y 0008_claves_busqueda) y se
+  reconstruyen con `python manage.py reconstruir_indice_busqueda`
+- Si la base de datos no soporta FTS5 se usa la búsqueda icontains
+
+Claves de búsqueda de Cliente (se calculan en Cliente.save):
+- clave_busqueda: nombre, email y teléfono sin acentos ni mayúsculas
+  ("María García" -> "maria garcia")
+- clave_fonetica: el nombre escrito como suena en español, para que
+  "Garsia", "Baldez" o "Hernandes" encuentren a "García", "Valdez" y
+  "Hernández"
+buscar_ids_tolerante (buscar_cliente) busca primero por esas claves y,
+si no hay resultados, por trigramas en común (errores de tipeo); los
+candidatos que da el índice se ordenan por parecido con lo buscado.
+"""
+from difflib import SequenceMatcher
+from django.db import connections
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+import re
+import unicodedata
+
+TABLA_CLIENTE_FTS = 'customer_support_cliente_fts'
+TABLA_TICKET_FTS = 'customer_support_ticket_fts'
+TABLA_CLAVES_FTS = 'customer_support_cliente_claves_fts'
+
+# Candidatos del índice que se comparan con la búsqueda
+CANDIDATOS = 50
+CANDIDATOS_APROXIMADOS = 200
+# Parecido mínimo (0 a 1) de un candidato que solo comparte trigramas
+SIMILITUD_MINIMA = 0.75
+
+# Reglas en orden; se aplican a cada palabra ya normalizada
+REGLAS_FONETICAS = [
+    (re.compile(r'[^a-z0-9]'), ''),
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'ch'), 'x'),
+    (re.compile(r'll'), 'y'),
+    (re.compile(r'qu'), 'k'),
+    (re.compile(r'g(?=[ei])'), 'j'),       # gente -> jente
+    (re.compile(r'gu(?=[ei])'), 'g'),      # guerra -> gerra
+    (re.compile(r'c(?=[ei])|z'), 's'),     # garcia, gonzalez -> garsia, gonsales
+    (re.compile(r'[cq]'), 'k'),
+    (re.compile(r'v'), 'b'),
+    (re.compile(r'w'), 'u'),
+    (re.compile(r'h'), ''),
+    (re.compile(r'y$'), 'i'),
+    (re.compile(r'nb'), 'mb'),
+    (re.compile(r'(.)\1+'), r'\1'),       # letras repetidas
+]
+
+# El tokenizer trigram necesita al menos 3 caracteres por término
+MIN_LONGITUD_TERMINO = 3
+
+_disponibilidad = {}
+
+def fts_disponible(using='default'):
+    """True si la base de datos tiene los índices FTS5 creados"""
+    connection = connections[using]
+    clave = (using, str(connection.settings_dict['NAME']))
+    if clave not in _disponibilidad:
+        _disponibilidad[clave] = (
+            connection.vendor == 'sqlite'
+            and {TABLA_CLIENTE_FTS, TABLA_CLAVES_FTS} <= set(connection.introspection.table_names())
+        )
+    return _disponibilidad[clave]
+
+def expresion_match(query):
+    """
+    Convierte el texto del usuario en una expresión MATCH segura:
+    cada palabra como frase entre comillas, unidas con AND.
+    Retorna None si ningún término es indexable por trigramas.
+    """
+    terminos = [
+        '"' + termino.replace('"', '""') + '"'
+        for termino in query.split()
+        if len(termino) >= MIN_LONGITUD_TERMINO
+    ]
+    return ' AND '.join(terminos) if terminos else None
+
+def usar_fts(query, using='default'):
+    """Expresión MATCH para la query, o None si hay que usar icontains"""
+    if not fts_disponible(using):
+        return None
+    return expresion_match(query)
+
+def normalizar(texto):
+    """Minúsculas, sin acentos ni espacios repetidos: 'María  GARCÍA' -> 'maria garcia'"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_acentos = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_acentos.lower().split())
+
+def fonetica(texto):
+    """Clave fonética de cada palabra: 'Hernández Vásquez' -> 'ernandes baskes'"""
+    palabras = []
+    for palabra in normalizar(texto).split():
+        for patron, reemplazo in REGLAS_FONETICAS:
+            palabra = patron.sub(reemplazo, palabra)
+        if palabra:
+            palabras.append(palabra)
+    return ' '.join(palabras)
+
+def claves_cliente(nombre, email, telefono):
+    """(clave_busqueda, clave_fonetica) de un cliente"""
+    return normalizar(' '.join(filter(None, (nombre, email, telefono)))), fonetica(nombre)
+
+def _indexables(palabras):
+    return [palabra for palabra in palabras if len(palabra) >= MIN_LONGITUD_TERMINO]
+
+def _frase(texto):
+    return '"' + texto.replace('"', '""') + '"'
+
+def _todas(columna, palabras):
+    """MATCH de `columna` que contiene todas las palabras"""
+    return f'{columna} : (' + ' AND '.join(map(_frase, palabras)) + ')'
+
+def _algun_trigrama(columna, palabras):
+    """MATCH de `columna` con algún trigrama de las palabras"""
+    trigramas = sorted({palabra[i:i + 3] for palabra in palabras for i in range(len(palabra) - 2)})
+    return f'{columna} : (' + ' OR '.join(map(_frase, trigramas)) + ')'
+
+def _ratio(buscada, palabra, memoria):
+    """Parecido de dos palabras (0 a 1); los apellidos se repiten mucho entre candidatos"""
+    clave = (buscada, palabra)
+    if clave not in memoria:
+        memoria[clave] = SequenceMatcher(None, buscada, palabra).ratio()
+    return memoria[clave]
+
+def _parecido_palabra(buscada, palabras, memoria):
+    """1 si es una de las palabras, algo menos si es el comienzo o parte de una, si no el parecido"""
+    if buscada in palabras:
+        return 1.0
+    if any(palabra.startswith(buscada) for palabra in palabras):
+        return 0.95
+    if any(buscada in palabra for palabra in palabras):
+        return 0.9
+    return max((
+        _ratio(buscada, palabra, memoria) for palabra in palabras
+        # Con largos muy distintos el parecido no llega al mínimo (ej. el email)
+        if 2 * min(len(buscada), len(palabra)) / (len(buscada) + len(palabra)) >= SIMILITUD_MINIMA
+    ), default=0.0)
+
+def _parecido(buscadas, palabras, memoria):
+    """Promedio, por palabra buscada, de su parecido con la más cercana del cliente"""
+    if not buscadas:
+        return 0.0
+    return sum(_parecido_palabra(buscada, palabras, memoria) for buscada in buscadas) / len(buscadas)
+
+def _candidatos(expresion, limite, solo_activos, using, excluir=()):
+    sql = (
+        f'SELECT c.id, c.clave_busqueda, c.clave_fonetica FROM {TABLA_CLAVES_FTS} f '
+        f'JOIN customer_support_cliente c ON c.id = f.rowid '
+        f'WHERE {TABLA_CLAVES_FTS} MATCH %s'
+    )
+    if solo_activos:
+        sql += ' AND c.activo = 1'
+    sql += ' ORDER BY f.rank LIMIT %s'
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [expresion, limite])
+        return [fila for fila in cursor.fetchall() if fila[0] not in excluir]
+
+def buscar_ids_tolerante(query, limite=10, solo_activos=True, using='default'):
+    """
+    IDs de clientes para `query` sin importar acentos ni mayúsculas y
+    tolerando errores de ortografía o tipeo, del más parecido al menos.
+    Siempre consulta el índice, de lo más barato a lo más caro:
+    1. clientes con todas las palabras (sin acentos)
+    2. si faltan, con todas las palabras en clave fonética
+    3. si no hubo ninguno, los que comparten trigramas fonéticos y se
+       parecen al menos SIMILITUD_MINIMA
+    """
+    palabras = _indexables(normalizar(query).split())
+    foneticas = _indexables(fonetica(query).split())
+    if not palabras:
+        return []
+
+    filas = _candidatos(_todas('clave_busqueda', palabras), CANDIDATOS, solo_activos, using)
+    if len(filas) < limite and foneticas:
+        filas += _candidatos(
+            _todas('clave_fonetica', foneticas), CANDIDATOS, solo_activos, using,
+            excluir={fila[0] for fila in filas}
+        )
+    minimo = 0.0
+    if not filas:
+        filas = _candidatos(
+            _algun_trigrama('clave_fonetica', foneticas or palabras), CANDIDATOS_APROXIMADOS, solo_activos, using
+        )
+        minimo = SIMILITUD_MINIMA
+
+    puntajes, memoria = [], {}
+    for orden, (cliente_id, clave, clave_fonetica) in enumerate(filas):
+        puntaje = max(
+            _parecido(palabras, (clave or '').split(), memoria),
+            _parecido(foneticas, (clave_fonetica or '').split(), memoria)
+        )
+        if puntaje >= minimo:
+            # A igual parecido, el orden del índice (bm25)
+            puntajes.append((-puntaje, orden, cliente_id))
+    return [cliente_id for _, _, cliente_id in sorted(puntajes)[:limite]]
+
+def buscar_ids_clientes(expresion, limite=10, solo_activos=True, using='default'):
+    """IDs de clientes que coinciden con la expresión, ordenados por relevancia (bm25)"""
+    sql = (
+        f'SELECT c.id FROM {TABLA_CLIENTE_FTS} f '
+        f'JOIN customer_support_cliente c ON c.id = f.rowid '
+        f'WHERE {TABLA_CLIENTE_FTS} MATCH %s'
+    )
+    if solo_activos:
+        sql += ' AND c.activo = 1'
+    sql += ' ORDER BY f.rank LIMIT %s'
+
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, [expresion, limite])
+        return [fila[0] for fila in cursor.fetchall()]
+
+def filtrar_clientes(queryset, expresion):
+    """Filtra un queryset de Cliente con el índice y anota su relevancia"""
+    return queryset.filter(
+        pk__in=RawSQL(f'SELECT rowid FROM {TABLA_CLIENTE_FTS} WHERE {TABLA_CLIENTE_FTS} MATCH %s', [expresion])
+    ).annotate(
+        relevancia=RawSQL(
+            f'SELECT rank FROM {TABLA_CLIENTE_FTS} '
+            f'WHERE {TABLA_CLIENTE_FTS} MATCH %s AND rowid = customer_support_cliente.id',
+            [expresion]
+        )
+    )
+
+def filtrar_tickets(queryset, expresion):
+    """
+    Filtra un queryset de Ticket por título/descripción o por
+    nombre/email del cliente, y anota la relevancia del ticket
+    """
+    return queryset.filter(
+        RawSQL(
+            f'(customer_support_ticket.id IN (SELECT rowid FROM {TABLA_TICKET_FTS} WHERE {TABLA_TICKET_FTS} MATCH %s) '
+            f'OR customer_support_ticket.cliente_id IN (SELECT rowid FROM {TABLA_CLIENTE_FTS} WHERE {TABLA_CLIENTE_FTS} MATCH %s))',
+            [expresion, expresion],
+            output_field=BooleanField()
+        )
+    ).annotate(
+        relevancia=RawSQL(
+            f'COALESCE((SELECT rank FROM {TABLA_TICKET_FTS} '
+            f'WHERE {TABLA_TICKET_FTS} MATCH %s AND rowid = customer_support_ticket.id), 0)',
+            [expresion]
+        )
+    )
+
+def completar_claves(todas=False, lote=2000, using='default'):
+    """
+    Calcula las claves de búsqueda de los clientes que no las tienen
+    (bulk_create, INSERT directos) o, con todas=True, de todos.
+    Retorna cuántos clientes se actualizaron
+    """
+    from .models import Cliente
+    return guardar_claves(Cliente.objects.using(using), todas, lote)
+
+def guardar_claves(clientes, todas=False, lote=2000):
+    """
+    completar_claves sobre el queryset `clientes`. UPDATE por id con executemany:
+    bulk_update arma un CASE por fila y con miles de filas es mucho más lento
+    """
+    connection = connections[clientes.db]
+    tabla = connection.ops.quote_name(clientes.model._meta.db_table)
+    sql = f'UPDATE {tabla} SET clave_busqueda = %s, clave_fonetica = %s WHERE id = %s'
+    clientes = clientes.order_by('id').values_list('id', 'nombre', 'email', 'telefono')
+    if not todas:
+        clientes = clientes.filter(clave_busqueda__isnull=True)
+    total, desde = 0, 0
+    while True:
+        filas = list(clientes.filter(id__gt=desde)[:lote])
+        if not filas:
+            return total
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                (*claves_cliente(nombre, email, telefono), cliente_id)
+                for cliente_id, nombre, email, telefono in filas
+            ])
+        total += len(filas)
+        desde = filas[-1][0]
+
+def reconstruir_indices(using='default'):
+    """Completa las claves de búsqueda y reconstruye los índices desde las tablas de contenido"""
+    completar_claves(using=using)
+    with connections[using].cursor() as cursor:
+        for tabla in (TABLA_CLIENTE_FTS, TABLA_TICKET_FTS, TABLA_CLAVES_FTS):
+            cursor.execute(f"INSERT INTO {tabla}({tabla}) VALUES('rebuild')")
+            cursor.execute(f"INSERT INTO {tabla}({tabla}) VALUES('optimize')")
@@ -4,6 +4,9 @@ Incluye validaciones personalizadas y campos calculados para AI Tools
 """
 from rest_framework import serializers
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from datetime import timezone as dt_timezone
+from decimal import Decimal
 from .models import Cliente, Ticket, Pago, HistorialAccion
 
 class ClienteSerializer(serializers.ModelSerializer):
@@ -25,11 +28,28 @@ class ClienteSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'fecha_registro']
     
     def get_total_tickets(self, obj):
-        """Cuenta total de tickets del cliente"""
+        """Cuenta total de tickets del cliente (anotada por ClienteViewSet)"""
+        if hasattr(obj, 'total_tickets'):
+            return obj.total_tickets
         return obj.tickets.count()
     
     def get_ultimo_pago(self, obj):
-        """Información del último pago"""
+        """Información del último pago (anotada por ClienteViewSet)"""
+        if hasattr(obj, 'ultimo_pago_datos'):
+            datos = obj.ultimo_pago_datos
+            if datos is None:
+                return None
+            # El objeto JSON trae monto como número y fecha como texto:
+            # se devuelven con los mismos tipos que el modelo
+            fecha = parse_datetime(datos['fecha'])
+            if timezone.is_naive(fecha):
+                fecha = timezone.make_aware(fecha, dt_timezone.utc)
+            return {
+                'monto': Decimal(str(datos['monto'])).quantize(Decimal('0.01')),
+                'fecha': fecha,
+                'descripcion': datos['descripcion']
+            }
+        
         ultimo = obj.pagos.first()
         if ultimo:
             return {
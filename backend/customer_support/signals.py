@@ -0,0 +1,91 @@
+"""
+Señales de los modelos de soporte
+- Mantienen los contadores del dashboard (estadisticas.py) al guardar
+  o eliminar Cliente, Ticket y Pago
+- Publican los eventos de /api/events/stream/ (eventos.py): tickets
+  creados o con otro estado, pagos registrados y cambios de saldo
+Se conectan en CustomerSupportConfig.ready()
+"""
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from . import estadisticas, eventos
+from .models import Cliente, Ticket, Pago
+
+MODELOS_CON_CONTADORES = (Cliente, Ticket, Pago)
+
+def _campos_cargados(instance):
+    campos, _ = estadisticas.APORTES[instance.__class__.__name__]
+    return not instance.get_deferred_fields().intersection(campos)
+
+@receiver(post_init)
+def guardar_estado_inicial(sender, instance, **kwargs):
+    """Recordar los valores con los que se cargó el registro (sin consultas)"""
+    if sender not in MODELOS_CON_CONTADORES:
+        return
+    # Corre antes de que from_db marque la instancia como existente:
+    # en instancias nuevas el snapshot se ignora (post_save con created)
+    if _campos_cargados(instance):
+        instance._estado_estadisticas = estadisticas.estado_de(instance)
+    else:
+        instance._estado_estadisticas = 'desconocido'
+
+@receiver(pre_save)
+def completar_estado_inicial(sender, instance, **kwargs):
+    """Si el registro se cargó con campos diferidos, leer sus valores previos"""
+    if sender not in MODELOS_CON_CONTADORES:
+        return
+    if getattr(instance, '_estado_estadisticas', None) == 'desconocido':
+        campos, _ = estadisticas.APORTES[sender.__name__]
+        instance._estado_estadisticas = (
+            sender._base_manager.filter(pk=instance.pk).values_list(*campos).first()
+        )
+
+@receiver(post_save)
+def publicar_eventos(sender, instance, created, raw=False, **kwargs):
+    """Corre antes que actualizar_contadores: _estado_estadisticas aún tiene los valores previos"""
+    if sender not in MODELOS_CON_CONTADORES or raw:
+        return
+    anterior = None if created else getattr(instance, '_estado_estadisticas', None)
+    if anterior == 'desconocido':
+        anterior = None
+    if sender is Ticket:
+        if created:
+            eventos.publicar('ticket_creado', instance.cliente_id, {
+                'ticket_id': instance.id,
+                'titulo': instance.titulo,
+                'estado': instance.estado,
+                'prioridad': instance.prioridad,
+            })
+        elif anterior and anterior[0] != instance.estado:
+            eventos.publicar('ticket_estado', instance.cliente_id, eventos.datos_ticket_estado(
+                instance.id, anterior[0], instance.estado, instance.fecha_resolucion
+            ))
+    elif sender is Pago:
+        if created:
+            eventos.publicar('pago_registrado', instance.cliente_id, {
+                'pago_id': instance.id,
+                'monto': float(instance.monto),
+                'metodo_pago': instance.metodo_pago,
+            })
+    elif anterior and anterior[1] != instance.saldo:
+        # Edición directa del saldo; los pagos lo publican en Cliente.sumar_saldo
+        eventos.publicar('saldo_actualizado', instance.id, eventos.datos_saldo(anterior[1], instance.saldo))
+
+@receiver(post_save)
+def actualizar_contadores(sender, instance, created, raw=False, **kwargs):
+    if sender not in MODELOS_CON_CONTADORES or raw:
+        return
+    anterior = None if created else getattr(instance, '_estado_estadisticas', None)
+    nuevo = estadisticas.estado_de(instance)
+    estadisticas.registrar_cambio(sender.__name__, anterior, nuevo)
+    instance._estado_estadisticas = nuevo
+
+@receiver(post_delete)
+def descontar_contadores(sender, instance, **kwargs):
+    if sender not in MODELOS_CON_CONTADORES:
+        return
+    anterior = getattr(instance, '_estado_estadisticas', None)
+    if anterior == 'desconocido' or anterior is None:
+        anterior = estadisticas.estado_de(instance)
+    estadisticas.registrar_cambio(sender.__name__, anterior, None)
@@ -0,0 +1,264 @@
+"""
+Snapshots binarios de las tablas de customer_support (guardar_snapshot /
+cargar_snapshot), para clonar producción en staging sin dumpdata/loaddata
+
+Formato (un directorio):
+- manifest.json: versión, migración aplicada, tablas, columnas y filas
+- <tabla>.snap: cabecera (CABECERA + versión del formato) y lotes de
+  LOTE_FILAS filas guardados por columnas; cada lote es
+  [4 bytes de largo][zlib(JSON [filas, [columna, ...]])]
+
+Los valores son JSON (con orjson si está instalado): el snapshot se puede
+cargar con cualquier versión de Python, y un archivo manipulado o
+corrupto solo puede dar un error de carga (zlib detecta lotes corruptos
+por su checksum y se revisa la forma de cada lote antes del INSERT).
+
+Se copian los valores tal como están en la base (sin pasar por el ORM).
+Al cargar se usan INSERT masivos dentro de una transacción, sin revisar
+FKs fila por fila (se validan al final), y en SQLite/PostgreSQL los
+índices secundarios y triggers (FTS5) se quitan durante la carga y se
+vuelven a crear al terminar. Después se reconstruyen el índice de
+búsqueda y los contadores del dashboard.
+"""
+from contextlib import contextmanager
+from datetime import date, datetime, time
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.migrations.recorder import MigrationRecorder
+import json
+import os
+import struct
+import uuid
+import zlib
+
+from . import estadisticas, renderers, search
+from .models import Cliente, Ticket, Pago, HistorialAccion
+
+VERSION = 3
+LOTE_FILAS = 50000
+CABECERA = b'CSSNAP' + struct.pack('<B', VERSION)
+
+# En orden de dependencias (FKs)
+MODELOS = [Cliente, Ticket, Pago, HistorialAccion]
+
+class SnapshotError(Exception):
+    pass
+
+def _columnas(modelo):
+    return [campo.column for campo in modelo._meta.concrete_fields]
+
+def _ultima_migracion():
+    return (
+        MigrationRecorder.Migration.objects
+        .filter(app='customer_support').order_by('-id')
+        .values_list('name', flat=True).first()
+    )
+
+# ============= GUARDAR =============
+
+# Valores que no son tipos JSON (PostgreSQL; SQLite ya da str/int/float)
+NO_JSON = (datetime, date, time, Decimal, uuid.UUID, dict, list)
+
+def _valor_portable(valor):
+    """
+    Tipos que JSON no tiene, como texto. Fechas con str() (separador
+    espacio), el mismo formato en que Django las guarda en SQLite
+    """
+    if isinstance(valor, (datetime, date, time, Decimal, uuid.UUID)):
+        return str(valor)
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor)
+    return valor
+
+def _empaquetar(filas):
+    columnas = [list(columna) for columna in zip(*filas)]
+    for i, columna in enumerate(columnas):
+        if any(isinstance(valor, NO_JSON) for valor in columna):
+            columnas[i] = [_valor_portable(valor) for valor in columna]
+    return renderers.json_bytes([len(filas), columnas])
+
+def guardar(directorio, nivel=1, progreso=None):
+    """
+    Escribe el snapshot de MODELOS en `directorio` (una lectura consistente
+    dentro de una transacción). Retorna {tabla: filas}
+    """
+    os.makedirs(directorio, exist_ok=True)
+    manifest = {
+        'version': VERSION,
+        'vendor': connection.vendor,
+        'migracion': _ultima_migracion(),
+        'tablas': [],
+    }
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for modelo in MODELOS:
+            tabla = modelo._meta.db_table
+            columnas = _columnas(modelo)
+            cursor.execute(
+                f'SELECT {", ".join(map(connection.ops.quote_name, columnas))} '
+                f'FROM {connection.ops.quote_name(tabla)} ORDER BY 1'
+            )
+            total = 0
+            with open(os.path.join(directorio, f'{tabla}.snap'), 'wb') as archivo:
+                archivo.write(CABECERA)
+                while True:
+                    filas = cursor.fetchmany(LOTE_FILAS)
+                    if not filas:
+                        break
+                    datos = zlib.compress(_empaquetar(filas), nivel)
+                    archivo.write(struct.pack('<I', len(datos)))
+                    archivo.write(datos)
+                    total += len(filas)
+                    if progreso:
+                        progreso(tabla, total)
+
+            manifest['tablas'].append({'tabla': tabla, 'columnas': columnas, 'filas': total})
+
+    with open(os.path.join(directorio, 'manifest.json'), 'w') as archivo:
+        json.dump(manifest, archivo, indent=2)
+    return {item['tabla']: item['filas'] for item in manifest['tablas']}
+
+# ============= CARGAR =============
+
+def leer_manifest(directorio):
+    try:
+        with open(os.path.join(directorio, 'manifest.json')) as archivo:
+            manifest = json.load(archivo)
+    except FileNotFoundError:
+        raise SnapshotError(f'No hay manifest.json en {directorio}')
+    if manifest.get('version') != VERSION:
+        raise SnapshotError(f'Versión de snapshot no soportada: {manifest.get("version")}')
+
+    for item, modelo in zip(manifest['tablas'], MODELOS):
+        if item['tabla'] != modelo._meta.db_table or item['columnas'] != _columnas(modelo):
+            raise SnapshotError(
+                f'El esquema de {item["tabla"]} no coincide con el del snapshot '
+                f'(migración del snapshot: {manifest["migracion"]}, '
+                f'actual: {_ultima_migracion()})'
+            )
+    return manifest
+
+def _lotes(ruta, columnas):
+    """(filas, [columna, ...]) de cada lote, validados contra las `columnas` del manifest"""
+    nombre = os.path.basename(ruta)
+    with open(ruta, 'rb') as archivo:
+        if archivo.read(len(CABECERA)) != CABECERA:
+            raise SnapshotError(f'{nombre} no es un snapshot de la versión {VERSION}')
+        while True:
+            cabecera = archivo.read(4)
+            if not cabecera:
+                return
+            try:
+                (largo,) = struct.unpack('<I', cabecera)
+                filas, valores = renderers.json_cargar(zlib.decompress(archivo.read(largo)))
+            except (struct.error, zlib.error, ValueError, TypeError):
+                raise SnapshotError(f'{nombre} está corrupto')
+            if len(valores) != len(columnas) or any(len(columna) != filas for columna in valores):
+                raise SnapshotError(f'{nombre} está corrupto')
+            yield filas, valores
+
+def _objetos_diferibles(cursor, tabla):
+    """
+    (nombre, tipo, sql) de índices secundarios y triggers de la tabla que
+    pueden quitarse durante la carga y recrearse después
+    """
+    if connection.vendor == 'sqlite':
+        cursor.execute(
+            "SELECT name, type, sql FROM sqlite_master "
+            "WHERE tbl_name = %s AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+            [tabla]
+        )
+        return cursor.fetchall()
+    if connection.vendor == 'postgresql':
+        cursor.execute(
+            "SELECT indexname, 'index', indexdef FROM pg_indexes i "
+            "WHERE tablename = %s AND NOT EXISTS "
+            "(SELECT 1 FROM pg_constraint c WHERE c.conname = i.indexname)",
+            [tabla]
+        )
+        return cursor.fetchall()
+    return []
+
+@contextmanager
+def indices_diferidos(cursor, modelos):
+    """
+    Quita índices secundarios y triggers de las tablas de `modelos` y los
+    vuelve a crear al salir. Usar dentro de una transacción: si algo falla
+    el rollback los restaura. Los triggers FTS no se ejecutan mientras
+    tanto (reconstruir el índice de búsqueda después)
+    """
+    diferidos = []
+    for modelo in modelos:
+        for nombre, tipo, sql in _objetos_diferibles(cursor, modelo._meta.db_table):
+            cursor.execute(f'DROP {tipo.upper()} {connection.ops.quote_name(nombre)}')
+            diferidos.append(sql)
+    yield
+    for sql in diferidos:
+        cursor.execute(sql)
+
+def _columnas_usuario(modelo):
+    """Posición de las columnas FK a auth.User del modelo"""
+    columnas = _columnas(modelo)
+    return [
+        columnas.index(campo.column)
+        for campo in modelo._meta.concrete_fields
+        if campo.is_relation and campo.related_model is User
+    ]
+
+def cargar(directorio, reemplazar=False, progreso=None):
+    """
+    Carga un snapshot en la base actual. Con reemplazar=True borra antes
+    los datos existentes; si no, las tablas deben estar vacías.
+    Las FKs a usuarios que no existen en esta base quedan en NULL.
+    Retorna {tabla: filas, 'usuarios_anulados': n}
+    """
+    manifest = leer_manifest(directorio)
+    quote = connection.ops.quote_name
+    resultado = {'usuarios_anulados': 0}
+    usuarios = set(User.objects.values_list('id', flat=True))
+
+    with connection.constraint_checks_disabled(), transaction.atomic(), connection.cursor() as cursor:
+        if not reemplazar:
+            for modelo in MODELOS:
+                cursor.execute(f'SELECT 1 FROM {quote(modelo._meta.db_table)} LIMIT 1')
+                if cursor.fetchone():
+                    raise SnapshotError(f'{modelo._meta.db_table} no está vacía (usa --reemplazar)')
+
+        # Sin índices ni triggers durante el borrado y la carga
+        with indices_diferidos(cursor, MODELOS):
+            if reemplazar:
+                for modelo in reversed(MODELOS):
+                    cursor.execute(f'DELETE FROM {quote(modelo._meta.db_table)}')
+
+            for item, modelo in zip(manifest['tablas'], MODELOS):
+                columnas_usuario = _columnas_usuario(modelo)
+                sql = (
+                    f'INSERT INTO {quote(item["tabla"])} ({", ".join(map(quote, item["columnas"]))}) '
+                    f'VALUES ({", ".join(["%s"] * len(item["columnas"]))})'
+                )
+                total = 0
+                for filas, columnas in _lotes(os.path.join(directorio, f'{item["tabla"]}.snap'), item['columnas']):
+                    for i in columnas_usuario:
+                        anulados = [valor if valor is None or valor in usuarios else None for valor in columnas[i]]
+                        resultado['usuarios_anulados'] += sum(
+                            1 for antes, despues in zip(columnas[i], anulados) if antes != despues
+                        )
+                        columnas[i] = anulados
+                    cursor.executemany(sql, list(zip(*columnas)))
+                    total += filas
+                    if progreso:
+                        progreso(item['tabla'], total)
+                resultado[item['tabla']] = total
+
+        for sql in connection.ops.sequence_reset_sql(no_style(), MODELOS):
+            cursor.execute(sql)
+        connection.check_constraints(table_names=[modelo._meta.db_table for modelo in MODELOS])
+
+        # Los INSERT directos no pasan por triggers ni señales
+        if search.fts_disponible():
+            search.reconstruir_indices()
+        estadisticas.recalcular()
+
+    return resultado
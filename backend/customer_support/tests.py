@@ -1 +1,1809 @@
-from django.test import TestCase
+"""
+Tests para el API de soporte al cliente
+"""
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from . import auditoria, estadisticas
+from .models import Cliente, Ticket, Pago, HistorialAccion, ContadorEstadistica
+
+# Los límites de tasa (limites.py) guardan sus buckets en la caché
+# compartida, que sobrevive entre corridas: desactivados salvo en LimitesTests
+sin_limites = override_settings(LIMITES={'ACTIVO': False})
+
+# La auditoría buffered guarda lo pendiente al terminar el proceso (atexit),
+# después de destruir la base de tests: sync salvo en AuditoriaTests
+auditoria_sync = override_settings(AUDITORIA={'MODO': 'sync'})
+
+# Las métricas de los tests no se mezclan con las del servidor de desarrollo
+metricas_locales = override_settings(METRICAS={'DIRECTORIO': ''})
+
+def setUpModule():
+    sin_limites.enable()
+    auditoria_sync.enable()
+    metricas_locales.enable()
+
+def tearDownModule():
+    metricas_locales.disable()
+    auditoria_sync.disable()
+    sin_limites.disable()
+
+
+class BatchToolsTests(APITestCase):
+    """Endpoint batch: varias tool calls en un solo request"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(
+            nombre='María García López',
+            email='maria.garcia@email.com',
+            saldo=Decimal('100.00')
+        )
+        self.url = reverse('customer_support:batch_tools')
+
+    def test_ejecuta_llamadas_en_orden(self):
+        response = self.client.post(self.url, {
+            'calls': [
+                {'tool': 'buscar_cliente', 'args': {'q': 'María'}},
+                {'tool': 'consultar_saldo', 'args': {'cliente_id': self.cliente.id}},
+                {'tool': 'crear_ticket', 'args': {
+                    'cliente': self.cliente.id,
+                    'titulo': 'Problema con factura',
+                    'descripcion': 'No puedo acceder a mi factura'
+                }},
+            ]
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['success'])
+        self.assertEqual(
+            [r['tool'] for r in response.data['resultados']],
+            ['buscar_cliente', 'consultar_saldo', 'crear_ticket']
+        )
+        self.assertEqual(response.data['resultados'][0]['resultado']['total'], 1)
+        self.assertEqual(response.data['resultados'][2]['status'], 201)
+        self.assertIn('tiempo_ms', response.data['resultados'][1])
+        self.assertEqual(Ticket.objects.count(), 1)
+
+    def test_sin_atomic_continua_tras_un_error(self):
+        response = self.client.post(self.url, {
+            'calls': [
+                {'tool': 'registrar_pago', 'args': {'cliente': self.cliente.id, 'monto': -5}},
+                {'tool': 'registrar_pago', 'args': {'cliente': self.cliente.id, 'monto': 50}},
+            ]
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['success'])
+        self.assertEqual(response.data['ejecutadas'], 2)
+        self.cliente.refresh_from_db()
+        self.assertEqual(self.cliente.saldo, Decimal('150.00'))
+
+    def test_atomic_revierte_todo_si_una_llamada_falla(self):
+        response = self.client.post(self.url, {
+            'atomic': True,
+            'calls': [
+                {'tool': 'registrar_pago', 'args': {'cliente': self.cliente.id, 'monto': 50}},
+                {'tool': 'registrar_pago', 'args': {'cliente': self.cliente.id, 'monto': 0}},
+                {'tool': 'buscar_cliente', 'args': {'q': 'María'}},
+            ]
+        }, format='json')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.data['revertido'])
+        self.assertEqual(response.data['ejecutadas'], 2)
+        self.assertEqual(Pago.objects.count(), 0)
+        self.assertEqual(HistorialAccion.objects.count(), 0)
+        self.cliente.refresh_from_db()
+        self.assertEqual(self.cliente.saldo, Decimal('100.00'))
+
+    def test_rechaza_tools_desconocidas_sin_ejecutar_nada(self):
+        response = self.client.post(self.url, {
+            'calls': [
+                {'tool': 'registrar_pago', 'args': {'cliente': self.cliente.id, 'monto': 50}},
+                {'tool': 'borrar_todo', 'args': {}},
+            ]
+        }, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['detalles'][0]['indice'], 1)
+        self.assertEqual(Pago.objects.count(), 0)
+
+    def test_atomic_solo_acepta_booleanos(self):
+        for valor in ('false', '0', 1, None):
+            with self.subTest(atomic=valor):
+                response = self.client.post(self.url, {
+                    'atomic': valor,
+                    'calls': [{'tool': 'registrar_pago', 'args': {'cliente': self.cliente.id, 'monto': 50}}]
+                }, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(Pago.objects.count(), 0)
+
+
+class IndiceBusquedaTests(APITestCase):
+    """Índice FTS5 de clientes y tickets"""
+
+    def setUp(self):
+        self.maria = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com')
+        self.juan = Cliente.objects.create(nombre='Juan Carlos Pérez', email='juan.perez@empresa.com')
+        self.url = reverse('customer_support:buscar_cliente_tool')
+
+    def buscar(self, q):
+        return self.client.get(self.url, {'q': q}).data
+
+    def test_el_indice_sigue_altas_cambios_y_bajas(self):
+        # López: García también está en el email, que sin acentos coincide
+        self.assertEqual(self.buscar('López')['total'], 1)
+
+        self.maria.nombre = 'María Fernández'
+        self.maria.save()
+        self.assertEqual(self.buscar('López')['clientes'], [])
+        self.assertEqual(self.buscar('Fernández')['total'], 1)
+
+        self.maria.delete()
+        self.assertEqual(self.buscar('Fernández')['clientes'], [])
+
+    def test_busca_subcadenas_de_email_y_excluye_inactivos(self):
+        self.assertEqual(self.buscar('empresa.com')['clientes'][0]['id'], self.juan.id)
+
+        Cliente.objects.filter(pk=self.juan.pk).update(activo=False)
+        self.assertEqual(self.buscar('empresa.com')['clientes'], [])
+
+    def test_ordena_por_relevancia(self):
+        Cliente.objects.create(nombre='Carlos Mendoza', email='carlos@yahoo.com')
+        clientes = self.buscar('Carlos')['clientes']
+        self.assertEqual(clientes[0]['nombre'], 'Carlos Mendoza')
+
+    def test_terminos_cortos_usan_icontains(self):
+        self.assertEqual(self.buscar('Ju')['clientes'][0]['id'], self.juan.id)
+
+    def test_sin_acentos_y_con_errores_de_ortografia(self):
+        Cliente.objects.create(nombre='Ana Hernández Vásquez', email='ana@correo.com')
+        casos = [
+            ('maria garcia', 'María García López'),
+            ('MARIA GARCÍA', 'María García López'),
+            ('Maria Garsia', 'María García López'),      # clave fonética
+            ('hernandes baskez', 'Ana Hernández Vásquez'),
+            ('mraia garcia', 'María García López'),      # error de tipeo
+        ]
+        for q, nombre in casos:
+            with self.subTest(q=q):
+                self.assertEqual(self.buscar(q)['clientes'][0]['nombre'], nombre)
+        self.assertEqual(self.buscar('Zambrano Quiñónez')['clientes'], [])
+
+    def test_claves_de_busqueda(self):
+        from . import search
+        self.assertEqual(self.maria.clave_busqueda, 'maria garcia lopez maria.garcia@email.com')
+        self.assertEqual(self.maria.clave_fonetica, 'maria garsia lopes')
+        self.assertEqual(search.fonetica('Guillermo Chávez Quiroz'), 'giyermo xabes kiros')
+
+        # update_fields con el nombre también guarda las claves
+        self.maria.nombre = 'María Fernández'
+        self.maria.save(update_fields=['nombre'])
+        self.assertEqual(Cliente.objects.get(pk=self.maria.pk).clave_fonetica, 'maria fernandes')
+
+        # bulk_create / INSERT directos: las completa reconstruir_indice_busqueda
+        Cliente.objects.bulk_create([Cliente(nombre='Éric Núñez', email='eric@correo.com')])
+        self.assertEqual(self.buscar('eric nunez')['clientes'], [])
+        call_command('reconstruir_indice_busqueda', stdout=StringIO())
+        self.assertEqual(self.buscar('eric nunez')['total'], 1)
+
+    def test_admin_busca_tickets_por_texto_y_por_cliente(self):
+        from django.contrib.auth.models import User
+        User.objects.create_superuser('admin', 'admin@example.com', 'clave-segura-123')
+        self.client.login(username='admin', password='clave-segura-123')
+        factura = Ticket.objects.create(cliente=self.juan, titulo='Problema con factura', descripcion='-')
+        otro = Ticket.objects.create(cliente=self.maria, titulo='Cambio de datos', descripcion='-')
+
+        response = self.client.get('/admin/customer_support/ticket/', {'q': 'factura'})
+        self.assertEqual(list(response.context['cl'].result_list), [factura])
+
+        response = self.client.get('/admin/customer_support/ticket/', {'q': 'García'})
+        self.assertEqual(list(response.context['cl'].result_list), [otro])
+
+
+class AsyncToolsTests(TestCase):
+    """Versiones async de las AI tools: mismo contrato que las síncronas"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(
+            nombre='María García López',
+            email='maria.garcia@email.com',
+            saldo=Decimal('100.00')
+        )
+
+    async def test_buscar_y_consultar_saldo(self):
+        response = await self.async_client.get('/api/async/tools/buscar-cliente/', {'q': 'García'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['clientes'][0]['id'], self.cliente.id)
+
+        response = await self.async_client.get(f'/api/async/tools/cliente/{self.cliente.id}/saldo/')
+        self.assertEqual(response.json()['cliente']['saldo'], 100.0)
+        self.assertEqual(await HistorialAccion.objects.acount(), 2)
+
+        response = await self.async_client.get('/api/async/tools/cliente/999/saldo/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_crear_ticket_y_registrar_pago(self):
+        response = await self.async_client.post('/api/async/tools/crear-ticket/', {
+            'cliente': self.cliente.id,
+            'titulo': 'Problema con factura',
+            'descripcion': 'No puedo acceder a mi factura',
+            'prioridad': 'urgentisima'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['ticket']['prioridad'], 'Media')
+
+        response = await self.async_client.post('/api/async/tools/registrar-pago/', {
+            'cliente': self.cliente.id,
+            'monto': 50.25
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['saldos']['actual'], 150.25)
+
+        response = await self.async_client.post('/api/async/tools/registrar-pago/', {
+            'cliente': self.cliente.id,
+            'monto': -1
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_estadisticas_coinciden_con_la_version_sincrona(self):
+        await Ticket.objects.acreate(cliente=self.cliente, titulo='x', descripcion='y')
+        async_stats = (await self.async_client.get('/api/async/dashboard/estadisticas/')).json()
+        sync_stats = (await self.async_client.get('/api/dashboard/estadisticas/')).json()
+        for seccion in ('clientes', 'tickets', 'pagos_hoy'):
+            self.assertEqual(async_stats['estadisticas'][seccion], sync_stats['estadisticas'][seccion])
+
+
+class AuditoriaTests(APITestCase):
+    """Modos sync, buffered y sampled de la auditoría"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com')
+        self.url = reverse('customer_support:buscar_cliente_tool')
+        self.addCleanup(auditoria.buffer.vaciar)
+
+    def test_sync_escribe_dentro_del_request(self):
+        self.client.get(self.url, {'q': 'María'})
+        self.assertEqual(HistorialAccion.objects.count(), 1)
+
+    @override_settings(AUDITORIA={'MODO': 'buffered', 'BUFFER_INTERVALO': 3600})
+    def test_buffered_encola_al_confirmar_y_guarda_en_lote(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(self.url, {'q': 'María'})
+            self.client.get(f'/api/tools/cliente/{self.cliente.id}/saldo/')
+        self.assertEqual(HistorialAccion.objects.count(), 0)
+        self.assertEqual(auditoria.buffer.pendientes, 2)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(auditoria.buffer.vaciar(), 2)
+        self.assertEqual(HistorialAccion.objects.filter(cliente=self.cliente).count(), 1)
+
+    @override_settings(AUDITORIA={'MODO': 'buffered', 'BUFFER_INTERVALO': 3600})
+    def test_buffered_no_guarda_acciones_de_transacciones_revertidas(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('customer_support:batch_tools'), {
+                'atomic': True,
+                'calls': [
+                    {'tool': 'buscar_cliente', 'args': {'q': 'María'}},
+                    {'tool': 'registrar_pago', 'args': {'cliente': self.cliente.id, 'monto': 0}},
+                ]
+            }, format='json')
+        self.assertEqual(auditoria.buffer.pendientes, 0)
+
+    @override_settings(AUDITORIA={'MODO': 'sampled', 'BUFFER_INTERVALO': 3600, 'MUESTREO': {'consulta': 0.0}})
+    def test_sampled_descarta_los_tipos_muestreados(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            auditoria.registrar('consulta', 'AI Tool: Búsqueda de cliente "x"')
+            auditoria.registrar('pago', 'AI Tool: Pago registrado', cliente=self.cliente)
+        self.assertEqual(auditoria.buffer.vaciar(), 1)
+        self.assertEqual(HistorialAccion.objects.get().tipo, 'pago')
+
+class EstadisticasTests(APITestCase):
+    """Los contadores incrementales deben coincidir con los COUNT(*) directos"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(
+            nombre='María García López',
+            email='maria.garcia@email.com',
+            saldo=Decimal('50.00')
+        )
+        self.otro = Cliente.objects.create(
+            nombre='Carlos Ruiz',
+            email='carlos.ruiz@email.com'
+        )
+        self.ticket = Ticket.objects.create(
+            cliente=self.cliente, titulo='Sin internet', descripcion='No hay señal'
+        )
+
+    def conteo_directo(self):
+        hoy = timezone.localdate()
+        activos = Cliente.objects.filter(activo=True)
+        pagos_hoy = Pago.objects.filter(fecha__date=hoy)
+        return {
+            'clientes': {
+                'total': activos.count(),
+                'con_saldo_positivo': activos.filter(saldo__gt=0).count(),
+                'registrados_hoy': activos.filter(fecha_registro__date=hoy).count(),
+            },
+            'tickets': {
+                'total': Ticket.objects.count(),
+                'abiertos': Ticket.objects.filter(estado='abierto').count(),
+                'en_proceso': Ticket.objects.filter(estado='en_proceso').count(),
+                'resueltos_hoy': Ticket.objects.filter(estado='resuelto', fecha_resolucion__date=hoy).count(),
+                'pendientes': Ticket.objects.filter(estado__in=['abierto', 'en_proceso', 'pendiente']).count(),
+            },
+            'pagos_hoy': {
+                'total_transacciones': pagos_hoy.count(),
+                'monto_total': float(sum(p.monto for p in pagos_hoy)),
+            },
+        }
+
+    def assertContadoresCorrectos(self):
+        self.assertEqual(estadisticas.obtener_estadisticas(), self.conteo_directo())
+
+    def test_dashboard_usa_una_sola_consulta(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('customer_support:estadisticas_dashboard'))
+        self.assertEqual(response.data['estadisticas']['clientes']['total'], 2)
+        self.assertEqual(response.data['estadisticas']['tickets']['abiertos'], 1)
+
+    def test_contadores_siguen_cambios_de_estado_pagos_y_eliminaciones(self):
+        self.client.post(reverse('customer_support:registrar_pago_tool'), {
+            'cliente': self.otro.id, 'monto': '25.50', 'metodo_pago': 'efectivo'
+        }, format='json')
+        self.assertContadoresCorrectos()
+
+        self.ticket.estado = 'resuelto'
+        self.ticket.save()
+        self.assertContadoresCorrectos()
+
+        # Instancia cargada con campos diferidos
+        cliente = Cliente.objects.only('id', 'nombre').get(pk=self.otro.pk)
+        cliente.activo = False
+        cliente.save()
+        self.assertContadoresCorrectos()
+
+        self.cliente.delete()
+        self.assertContadoresCorrectos()
+
+    def test_acciones_masivas_del_admin_actualizan_contadores(self):
+        from django.contrib.admin import helpers
+        from django.contrib.auth.models import User
+        User.objects.create_superuser('admin', 'admin@example.com', 'clave-segura-123')
+        self.client.login(username='admin', password='clave-segura-123')
+        otro = Ticket.objects.create(cliente=self.otro, titulo='Factura', descripcion='Cobro doble')
+
+        def accion(modelo, nombre, ids):
+            self.client.post(f'/admin/customer_support/{modelo}/', {
+                'action': nombre, helpers.ACTION_CHECKBOX_NAME: ids
+            })
+            self.assertContadoresCorrectos()
+
+        accion('ticket', 'marcar_como_en_proceso', [self.ticket.id])
+        accion('ticket', 'marcar_como_resuelto', [self.ticket.id, otro.id])
+        accion('cliente', 'desactivar_clientes', [self.cliente.id, self.otro.id])
+        accion('cliente', 'activar_clientes', [self.cliente.id])
+
+        stats = estadisticas.obtener_estadisticas()
+        self.assertEqual(stats['tickets']['resueltos_hoy'], 2)
+        self.assertEqual(stats['clientes']['total'], 1)
+
+    def test_recalcular_estadisticas_reconstruye_contadores(self):
+        ContadorEstadistica.objects.all().delete()
+        Pago.objects.bulk_create([Pago(cliente=self.cliente, monto=Decimal('10.00'))])
+
+        call_command('recalcular_estadisticas', stdout=StringIO())
+        self.assertContadoresCorrectos()
+
+class SaldoAtomicoTests(APITestCase):
+    """Los pagos suman al saldo con UPDATE atómico, sin pisar otros pagos"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(
+            nombre='María García López',
+            email='maria.garcia@email.com',
+            saldo=Decimal('-10.00')
+        )
+
+    def test_instancias_desactualizadas_no_pierden_pagos(self):
+        primera = Cliente.objects.get(pk=self.cliente.pk)
+        segunda = Cliente.objects.get(pk=self.cliente.pk)
+
+        Pago.objects.create(cliente=primera, monto=Decimal('4.00'))
+        Pago.objects.create(cliente=segunda, monto=Decimal('6.50'))
+
+        self.assertEqual(segunda.saldo, Decimal('0.50'))
+        self.cliente.refresh_from_db()
+        self.assertEqual(self.cliente.saldo, Decimal('0.50'))
+
+    def test_registrar_pago_retorna_saldo_y_actualiza_contadores(self):
+        response = self.client.post(reverse('customer_support:registrar_pago_tool'), {
+            'cliente': self.cliente.id, 'monto': '25.50'
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['saldos']['anterior'], -10.0)
+        self.assertEqual(response.data['saldos']['actual'], 15.5)
+        self.assertEqual(estadisticas.obtener_estadisticas()['clientes']['con_saldo_positivo'], 1)
+
+    def test_cliente_eliminado_y_base_sin_returning(self):
+        from unittest import mock
+        from . import models
+        for returning in (True, False):
+            with self.subTest(returning=returning), \
+                 mock.patch.object(models, 'soporta_update_returning', return_value=returning):
+                cliente = Cliente.objects.create(nombre='Juan Pérez', email=f'juan{returning}@email.com')
+                self.assertEqual(cliente.sumar_saldo('5.00'), Decimal('5.00'))
+                Cliente.objects.filter(pk=cliente.pk).delete()
+                with self.assertRaises(Cliente.DoesNotExist):
+                    cliente.sumar_saldo('5.00')
+
+class ListadosSinNMasUnoTests(APITestCase):
+    """Las páginas de /api/clientes/, /api/tickets/ y /api/pagos/ usan un número fijo de consultas"""
+
+    def setUp(self):
+        for i in range(25):
+            cliente = Cliente.objects.create(nombre=f'Cliente {i:02d}', email=f'cliente{i}@email.com')
+            Ticket.objects.create(cliente=cliente, titulo=f'Ticket {i}', descripcion='-')
+            Ticket.objects.create(cliente=cliente, titulo=f'Otro ticket {i}', descripcion='-')
+            Pago.objects.create(cliente=cliente, monto=Decimal('10.00'), descripcion='Primero')
+            Pago.objects.create(cliente=cliente, monto=Decimal(f'{i}.50'), descripcion='Último')
+        Cliente.objects.create(nombre='Cliente sin pagos', email='sin.pagos@email.com')
+
+    def test_paginas_usan_consultas_constantes(self):
+        # COUNT(*) de la paginación + la página
+        for url in ('/api/clientes/', '/api/tickets/', '/api/pagos/'):
+            with self.subTest(url=url), self.assertNumQueries(2):
+                response = self.client.get(url)
+            self.assertEqual(len(response.data['results']), 20)
+
+    def test_anotaciones_coinciden_con_el_serializer_sin_anotar(self):
+        from .serializers import ClienteSerializer
+        response = self.client.get('/api/clientes/', {'page': 2})
+        esperados = {
+            cliente.id: ClienteSerializer(cliente).data
+            for cliente in Cliente.objects.all()
+        }
+
+        for fila in response.data['results']:
+            self.assertEqual(fila, esperados[fila['id']])
+        self.assertIsNone(response.data['results'][-1]['ultimo_pago'])
+        self.assertEqual(response.data['results'][0]['total_tickets'], 2)
+
+class AdminChangelistTests(TestCase):
+    """Los changelists del admin usan las mismas consultas con 1 o con muchas filas"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'clave-segura-123')
+        self.client.force_login(self.admin)
+
+    def crear_filas(self, cantidad, inicio=0):
+        for i in range(inicio, inicio + cantidad):
+            cliente = Cliente.objects.create(nombre=f'Cliente {i}', email=f'cliente{i}@email.com')
+            Ticket.objects.create(cliente=cliente, titulo='Factura', descripcion='-', asignado_a=self.admin)
+            Pago.objects.create(cliente=cliente, monto=Decimal('10.00'), procesado_por=self.admin)
+            HistorialAccion.objects.create(tipo='consulta', descripcion='-', cliente=cliente, usuario=self.admin)
+
+    def consultas(self, url, params=None):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as contexto:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return len(contexto)
+
+    def test_consultas_no_dependen_de_las_filas(self):
+        urls = [
+            ('/admin/customer_support/cliente/', None),
+            ('/admin/customer_support/cliente/', {'q': 'Cliente'}),
+            ('/admin/customer_support/ticket/', None),
+            ('/admin/customer_support/pago/', None),
+            ('/admin/customer_support/historialaccion/', None),
+        ]
+        self.crear_filas(1)
+        con_una = [self.consultas(url, params) for url, params in urls]
+        self.crear_filas(19, inicio=1)
+        con_veinte = [self.consultas(url, params) for url, params in urls]
+
+        self.assertEqual(con_veinte, con_una)
+
+    def test_badge_de_tickets_usa_anotaciones(self):
+        self.crear_filas(1)
+        Ticket.objects.create(cliente=Cliente.objects.get(), titulo='Otro', descripcion='-', estado='resuelto')
+        response = self.client.get('/admin/customer_support/cliente/')
+        self.assertContains(response, '2 total (1 abiertos)')
+
+    def test_links_a_clientes_con_un_solo_reverse(self):
+        from unittest import mock
+        from django.urls import reverse
+        from . import admin as admin_soporte
+        self.crear_filas(3)
+        admin_soporte._url_cambio_cliente.cache_clear()
+        with mock.patch.object(admin_soporte, 'reverse', wraps=reverse) as espia:
+            response = self.client.get('/admin/customer_support/ticket/')
+        self.assertEqual(espia.call_count, 1)
+        for cliente in Cliente.objects.all():
+            self.assertContains(response, f'<a href="/admin/customer_support/cliente/{cliente.pk}/change/">{cliente.nombre}</a>')
+
+class PaginacionCursorTests(APITestCase):
+    """?paginacion=cursor recorre los listados por keyset, sin COUNT ni OFFSET"""
+
+    def setUp(self):
+        ahora = timezone.now()
+        for i in range(45):
+            # Nombres y fechas repetidos: el desempate es por id
+            cliente = Cliente.objects.create(nombre=f'Cliente {i % 7}', email=f'cliente{i}@email.com')
+            Pago.objects.create(cliente=cliente, monto=Decimal('1.00'), fecha=ahora)
+            Ticket.objects.create(cliente=cliente, titulo=f'Ticket {i}', descripcion='-')
+
+    def recorrer(self, url):
+        ids, consultas = [], []
+        response = self.client.get(url, {'paginacion': 'cursor'})
+        while True:
+            self.assertNotIn('count', response.data)
+            ids.extend(fila['id'] for fila in response.data['results'])
+            if not response.data['next']:
+                return ids, consultas
+            with self.assertNumQueries(1):
+                response = self.client.get(response.data['next'])
+            consultas.append(1)
+
+    def test_recorre_todas_las_filas_en_orden_y_sin_repetir(self):
+        casos = [
+            ('/api/clientes/', Cliente.objects.order_by('nombre', 'id')),
+            ('/api/tickets/', Ticket.objects.order_by('-fecha_creacion', '-id')),
+            ('/api/pagos/', Pago.objects.order_by('-fecha', '-id')),
+        ]
+        for url, esperado in casos:
+            with self.subTest(url=url):
+                ids, paginas = self.recorrer(url)
+                self.assertEqual(ids, list(esperado.values_list('id', flat=True)))
+                self.assertEqual(len(paginas), 2)
+
+    def test_paginacion_por_numero_sigue_siendo_la_default(self):
+        response = self.client.get('/api/pagos/', {'page': 3})
+        self.assertEqual(response.data['count'], 45)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_cursor_invalido(self):
+        response = self.client.get('/api/pagos/', {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+class PlanesDeConsultaTests(APITestCase):
+    """Ninguna consulta de las tools ni de los ViewSets recorre una tabla completa"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com')
+        otro = Cliente.objects.create(nombre='Juan Pérez', email='juan.perez@email.com', activo=False)
+        for cliente in (self.cliente, otro):
+            Ticket.objects.create(cliente=cliente, titulo='Problema con factura', descripcion='-')
+            Pago.objects.create(cliente=cliente, monto=Decimal('10.00'))
+
+    def consultas_select(self, llamadas):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as contexto:
+            for llamada in llamadas:
+                response = llamada()
+                self.assertLess(response.status_code, 400)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+        return [q['sql'] for q in contexto.captured_queries if q['sql'].lstrip().upper().startswith('SELECT')]
+
+    def test_ninguna_consulta_hace_full_scan(self):
+        import re
+        from django.db import connection
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN es específico de SQLite')
+
+        cliente_id = self.cliente.id
+        get, post = self.client.get, self.client.post
+        # Nota: búsquedas de menos de 3 caracteres usan icontains (sin índice) a propósito
+        llamadas = [
+            lambda: get('/api/tools/buscar-cliente/', {'q': 'García'}),
+            lambda: get(f'/api/tools/cliente/{cliente_id}/saldo/'),
+            lambda: post('/api/tools/crear-ticket/', {
+                'cliente': cliente_id, 'titulo': 'Sin señal', 'descripcion': '-'
+            }, format='json'),
+            lambda: post('/api/tools/registrar-pago/', {'cliente': cliente_id, 'monto': '5.00'}, format='json'),
+            lambda: get('/api/dashboard/estadisticas/'),
+            lambda: get('/api/clientes/'),
+            lambda: get('/api/clientes/', {'paginacion': 'cursor'}),
+            lambda: get(f'/api/clientes/{cliente_id}/'),
+            lambda: get('/api/tickets/'),
+            lambda: get('/api/tickets/', {'estado': 'abierto', 'paginacion': 'cursor'}),
+            lambda: get('/api/pagos/'),
+            lambda: get('/api/pagos/', {'cliente': cliente_id}),
+            lambda: get('/api/pagos/', {'cliente': cliente_id, 'paginacion': 'cursor'}),
+            lambda: get('/api/export/clientes/'),
+            lambda: get('/api/export/tickets/'),
+            lambda: get('/api/export/pagos/'),
+        ]
+
+        full_scans = []
+        with connection.cursor() as cursor:
+            for sql in self.consultas_select(llamadas):
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                for fila in cursor.fetchall():
+                    if re.fullmatch(r'SCAN (?!sqlite_|subquery)\w+', fila[-1]):
+                        full_scans.append(f'{fila[-1]}: {sql}')
+
+        self.assertEqual(full_scans, [])
+
+class ExportacionTests(TestCase):
+    """GET /api/export/<recurso>/ envía las filas por streaming"""
+
+    def setUp(self):
+        self.maria = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com')
+        self.juan = Cliente.objects.create(nombre='Juan Pérez', email='juan.perez@email.com')
+        ayer = timezone.now() - timezone.timedelta(days=1)
+        self.viejo = Pago.objects.create(cliente=self.maria, monto=Decimal('10.00'), fecha=ayer - timezone.timedelta(days=30))
+        self.pago = Pago.objects.create(cliente=self.maria, monto=Decimal('25.50'), descripcion='Factura, "marzo"', fecha=ayer)
+        Pago.objects.create(cliente=self.juan, monto=Decimal('5.00'), fecha=ayer)
+
+    def leer(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_ndjson_con_filtros_de_cliente_y_fecha(self):
+        import json
+        desde = timezone.localdate() - timezone.timedelta(days=2)
+        response = self.client.get('/api/export/pagos/', {'cliente': self.maria.id, 'desde': desde.isoformat()})
+
+        filas = [json.loads(linea) for linea in self.leer(response).splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([fila['id'] for fila in filas], [self.pago.id])
+        self.assertEqual(filas[0]['cliente_nombre'], 'María García López')
+        self.assertEqual(filas[0]['monto'], '25.50')
+
+    def test_csv_en_orden_de_fecha(self):
+        import csv
+        response = self.client.get('/api/export/pagos/', {'formato': 'csv'})
+
+        filas = list(csv.DictReader(self.leer(response).splitlines()))
+        self.assertEqual(len(filas), 3)
+        self.assertEqual(filas[0]['id'], str(self.viejo.id))
+        self.assertEqual(filas[1]['descripcion'], 'Factura, "marzo"')
+
+    def test_recorre_varios_lotes_sin_repetir_filas(self):
+        from unittest import mock
+        from . import exportacion
+        with mock.patch.object(exportacion, 'CHUNK_SIZE', 2):
+            contenido = self.leer(self.client.get('/api/export/pagos/'))
+        self.assertEqual(len(contenido.splitlines()), 3)
+
+    def test_exporta_historial_y_clientes(self):
+        HistorialAccion.objects.create(tipo='pago', descripcion='-', cliente=self.maria, metadata={'monto': 1})
+        for recurso in ('historial', 'clientes', 'tickets'):
+            with self.subTest(recurso=recurso):
+                self.leer(self.client.get(f'/api/export/{recurso}/', {'formato': 'csv'}))
+
+    def test_errores_de_parametros(self):
+        self.assertEqual(self.client.get('/api/export/usuarios/').status_code, 404)
+        self.assertEqual(self.client.get('/api/export/pagos/', {'formato': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/export/pagos/', {'desde': '31/01/2025'}).status_code, 400)
+
+    async def test_bajo_asgi_usa_un_iterador_async(self):
+        response = await self.async_client.get('/api/export/pagos/')
+        self.assertTrue(response.is_async)
+        contenido = b''.join([bloque async for bloque in response.streaming_content])
+        self.assertEqual(len(contenido.decode('utf-8').splitlines()), 3)
+
+class SnapshotTests(TestCase):
+    """guardar_snapshot / cargar_snapshot restauran los datos tal cual"""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.contrib.auth.models import User
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+        self.usuario = User.objects.create_user('agente')
+        self.maria = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com')
+        Ticket.objects.create(cliente=self.maria, titulo='Problema con factura', descripcion='-', asignado_a=self.usuario)
+        Pago.objects.create(cliente=self.maria, monto=Decimal('25.50'), procesado_por=self.usuario)
+        HistorialAccion.objects.create(tipo='pago', descripcion='-', cliente=self.maria, metadata={'monto': 25.5})
+
+    def contenido(self):
+        return [
+            list(modelo.objects.order_by('id').values())
+            for modelo in (Cliente, Ticket, Pago, HistorialAccion)
+        ]
+
+    def test_guardar_y_cargar_restaura_todo(self):
+        antes = self.contenido()
+        call_command('guardar_snapshot', self.directorio, stdout=StringIO())
+        Cliente.objects.create(nombre='Cliente extra', email='extra@email.com')
+
+        call_command('cargar_snapshot', self.directorio, '--reemplazar', stdout=StringIO())
+
+        self.assertEqual(self.contenido(), antes)
+        self.assertEqual(estadisticas.obtener_estadisticas()['clientes']['total'], 1)
+        self.assertEqual(self.client.get('/api/tools/buscar-cliente/', {'q': 'García'}).data['total'], 1)
+
+    def test_no_carga_sobre_tablas_con_datos(self):
+        from django.core.management.base import CommandError
+        call_command('guardar_snapshot', self.directorio, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('cargar_snapshot', self.directorio, stdout=StringIO())
+
+    def test_anula_usuarios_que_no_existen(self):
+        from . import snapshot
+        snapshot.guardar(self.directorio)
+        self.usuario.delete()
+
+        resultado = snapshot.cargar(self.directorio, reemplazar=True)
+        self.assertEqual(resultado['usuarios_anulados'], 2)
+        self.assertIsNone(Pago.objects.get().procesado_por_id)
+
+    def test_rechaza_archivos_corruptos(self):
+        import os
+        import struct
+        import zlib
+        from . import snapshot
+        snapshot.guardar(self.directorio)
+        antes = self.contenido()
+        ruta_pagos = os.path.join(self.directorio, f'{Pago._meta.db_table}.snap')
+        with open(ruta_pagos, 'rb') as archivo:
+            pagos = archivo.read()
+
+        # Otra cabecera, lote truncado y lote válido con columnas de menos
+        lote = zlib.compress(b'[1, [[1], [2]]]')
+        for contenido in (b'XXXXXXX' + pagos[7:], pagos[:-10], snapshot.CABECERA + struct.pack('<I', len(lote)) + lote):
+            with open(ruta_pagos, 'wb') as archivo:
+                archivo.write(contenido)
+            with self.subTest(largo=len(contenido)), self.assertRaises(snapshot.SnapshotError):
+                snapshot.cargar(self.directorio, reemplazar=True)
+        self.assertEqual(self.contenido(), antes)
+
+class GeneradorDatosPruebaTests(TestCase):
+    """crear_datos_prueba --clientes genera datos reproducibles y consistentes"""
+
+    def generar(self, seed=7):
+        call_command(
+            'crear_datos_prueba', '--limpiar', '--clientes', '30', '--tickets-por-cliente', '2',
+            '--pagos-por-cliente', '3', '--seed', str(seed), '--fecha-base', '2025-06-30',
+            '--lote', '8', stdout=StringIO()
+        )
+        return [
+            list(Cliente.objects.order_by('id').values_list('nombre', 'email', 'saldo', 'fecha_registro')),
+            list(Ticket.objects.order_by('id').values_list('titulo', 'estado', 'prioridad', 'fecha_creacion')),
+            list(Pago.objects.order_by('id').values_list('monto', 'metodo_pago', 'fecha')),
+        ]
+
+    def test_misma_seed_mismos_datos(self):
+        primera = self.generar()
+        self.assertEqual(len(primera[0]), 30)
+        self.assertEqual(self.generar(), primera)
+        self.assertNotEqual(self.generar(seed=8), primera)
+
+    def test_rechaza_cantidades_no_positivas(self):
+        from django.core.management.base import CommandError
+        cliente = Cliente.objects.create(nombre='Existente', email='existente@email.com')
+        for opcion in ('--clientes', '--tickets-por-cliente', '--pagos-por-cliente', '--lote'):
+            for valor in ('0', '-3', 'x'):
+                with self.subTest(opcion=opcion, valor=valor), self.assertRaises(CommandError):
+                    call_command('crear_datos_prueba', '--limpiar', '--clientes', '5', opcion, valor, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('crear_datos_prueba', limpiar=True, clientes=5, lote=0, stdout=StringIO())
+        # Falla antes de --limpiar
+        self.assertTrue(Cliente.objects.filter(pk=cliente.pk).exists())
+
+    def test_contadores_indices_y_busqueda_quedan_al_dia(self):
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger') ORDER BY name")
+            objetos = cursor.fetchall()
+
+        self.generar()
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('index', 'trigger') ORDER BY name")
+            self.assertEqual(cursor.fetchall(), objetos)
+        stats = estadisticas.obtener_estadisticas()
+        estadisticas.recalcular()
+        self.assertEqual(estadisticas.obtener_estadisticas(), stats)
+        self.assertEqual(stats['tickets']['total'], Ticket.objects.count())
+
+        cliente = Cliente.objects.filter(activo=True).first()
+        respuesta = self.client.get('/api/tools/buscar-cliente/', {'q': cliente.nombre})
+        self.assertIn(cliente.id, [c['id'] for c in respuesta.data['clientes']])
+
+class BenchmarkApiTests(TransactionTestCase):
+    """benchmark_api reporta latencias y queries de cada endpoint en JSON"""
+    # Los requests corren en hilos con su propia conexión: sin transacción del
+    # test. Auditoría sync para que el buffer no se vacíe después (atexit)
+    # sobre la base real
+
+    def test_reporte_json(self):
+        import json
+        import os
+        import tempfile
+        maria = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com', saldo=10)
+        salida = os.path.join(tempfile.mkdtemp(), 'bench.json')
+        self.addCleanup(os.remove, salida)
+
+        call_command(
+            'benchmark_api', '--peticiones', '5', '--calentamiento', '1', '--concurrencia', '1',
+            '--salida', salida, '--sin-cache', stdout=StringIO()
+        )
+
+        with open(salida) as archivo:
+            reporte = json.load(archivo)
+        resultados = {r['endpoint']: r for r in reporte['resultados']}
+        self.assertEqual(set(resultados), {'buscar-cliente', 'saldo', 'crear-ticket', 'registrar-pago', 'dashboard'})
+        for resultado in resultados.values():
+            self.assertEqual(resultado['errores'], 0)
+            self.assertGreater(resultado['queries_por_request'], 0)
+            self.assertLessEqual(resultado['p50_ms'], resultado['p99_ms'])
+        self.assertEqual(Ticket.objects.filter(cliente=maria).count(), 6)
+
+        salida_texto = StringIO()
+        call_command(
+            'benchmark_api', '--peticiones', '2', '--calentamiento', '0', '--concurrencia', '1',
+            '--endpoints', 'saldo', '--comparar', salida, stdout=salida_texto
+        )
+        self.assertIn('vs base', salida_texto.getvalue())
+
+class MetricasTests(TestCase):
+    """/api/metrics/ expone requests, latencia y queries por vista"""
+
+    def setUp(self):
+        from . import metricas
+        self.metricas = metricas
+        metricas.registro.reiniciar()
+        self.addCleanup(metricas.registro.reiniciar)
+        self.cliente = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com', saldo=10)
+
+    def muestras(self):
+        response = self.client.get('/api/metrics/')
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return dict(
+            linea.rsplit(' ', 1)
+            for linea in response.content.decode().splitlines()
+            if linea and not linea.startswith('#')
+        )
+
+    async def test_cuenta_requests_y_queries_sync_y_async(self):
+        await self.async_client.get(f'/api/tools/cliente/{self.cliente.id}/saldo/')
+        await self.async_client.get(f'/api/tools/cliente/{self.cliente.id}/saldo/')
+        await self.async_client.get(f'/api/async/tools/cliente/{self.cliente.id}/saldo/')
+        await self.async_client.get('/api/no-existe/')
+
+        from asgiref.sync import sync_to_async
+        muestras = await sync_to_async(self.muestras)()
+        sync = 'vista="customer_support:consultar_saldo_tool"'
+        asinc = 'vista="customer_support:consultar_saldo_tool_async"'
+        self.assertEqual(muestras[f'ai_assistant_http_requests_total{{{sync},metodo="GET",codigo="200"}}'], '2')
+        self.assertEqual(muestras[f'ai_assistant_http_request_duration_seconds_count{{{sync}}}'], '2')
+        self.assertEqual(muestras[f'ai_assistant_http_request_duration_seconds_bucket{{{sync},le="+Inf"}}'], '2')
+        self.assertGreater(int(muestras[f'ai_assistant_db_queries_total{{{sync}}}']), 0)
+        self.assertGreater(int(muestras[f'ai_assistant_db_queries_total{{{asinc}}}']), 0)
+        self.assertGreater(int(muestras[f'ai_assistant_http_response_bytes_total{{{sync}}}']), 0)
+        self.assertIn('ai_assistant_http_requests_total{vista="sin_ruta",metodo="GET",codigo="404"}', muestras)
+
+    def test_suma_los_contadores_de_otros_workers(self):
+        import json
+        import os
+        import shutil
+        import tempfile
+        from unittest import mock
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        # Sin hilo de fondo: seguiría escribiendo después del test
+        hilo = mock.patch.object(self.metricas.registro, '_asegurar_hilo')
+        hilo.start()
+        self.addCleanup(hilo.stop)
+        self.client.get(f'/api/tools/cliente/{self.cliente.id}/saldo/')
+        otro = self.metricas.registro.estado()
+        with open(os.path.join(directorio, '1.json'), 'w') as archivo:
+            json.dump(otro, archivo)
+
+        with override_settings(METRICAS={'DIRECTORIO': directorio}):
+            muestras = self.muestras()
+
+        vista = 'vista="customer_support:consultar_saldo_tool"'
+        self.assertEqual(muestras[f'ai_assistant_http_requests_total{{{vista},metodo="GET",codigo="200"}}'], '2')
+        self.assertTrue(os.path.exists(os.path.join(directorio, f'{os.getpid()}.json')))
+
+        # Un worker sin latido en CADUCIDAD segundos ya terminó: no se suma y se borra
+        vencido = os.path.join(directorio, '1.json')
+        os.utime(vencido, (0, 0))
+        with override_settings(METRICAS={'DIRECTORIO': directorio, 'CADUCIDAD': 60}):
+            muestras = self.muestras()
+        self.assertEqual(muestras[f'ai_assistant_http_requests_total{{{vista},metodo="GET",codigo="200"}}'], '1')
+        self.assertFalse(os.path.exists(vencido))
+
+class RetencionHistorialTests(TestCase):
+    """archivar_historial mueve las acciones antiguas a archivos .ndjson.gz por día"""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from datetime import timedelta
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+        ajustes = override_settings(RETENCION_HISTORIAL={'DIAS': 30, 'DIRECTORIO': self.directorio})
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.maria = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com')
+        ahora = timezone.now()
+        self.antiguas = [
+            HistorialAccion.objects.create(
+                tipo='consulta', descripcion=f'antigua {i}', cliente=self.maria if i % 2 else None,
+                metadata={'i': i}, fecha=ahora - timedelta(days=40 + i % 3, minutes=i)
+            )
+            for i in range(12)
+        ]
+        self.reciente = HistorialAccion.objects.create(tipo='pago', descripcion='reciente', fecha=ahora)
+
+    def exportar(self, **params):
+        import json
+        response = self.client.get('/api/export/historial/', params)
+        ids = {accion.id for accion in self.antiguas}
+        filas = [json.loads(linea) for linea in b''.join(response.streaming_content).decode().splitlines()]
+        return [fila for fila in filas if fila['id'] in ids]
+
+    def test_archiva_borra_y_se_puede_leer(self):
+        import os
+        from . import retencion
+        antes = self.exportar()
+
+        salida = StringIO()
+        call_command('archivar_historial', stdout=salida)
+
+        self.assertIn('12 acciones', salida.getvalue())
+        self.assertEqual(list(HistorialAccion.objects.filter(descripcion__startswith='antigua')), [])
+        self.assertTrue(HistorialAccion.objects.filter(pk=self.reciente.pk).exists())
+        self.assertEqual(len(retencion.dias_archivados()), 3)
+        dia = retencion.dias_archivados()[0]
+        self.assertTrue(os.path.exists(os.path.join(self.directorio, f'{dia:%Y}', f'{dia:%m}', f'{dia}.ndjson.gz')))
+
+        # Lectura: mismo contenido y orden que antes de archivar
+        self.assertEqual(self.exportar(), [])
+        self.assertEqual(self.exportar(incluir_archivo='1'), antes)
+        self.assertEqual(len(list(retencion.leer(cliente_id=self.maria.id))), 6)
+
+    def test_filas_repetidas_en_el_archivo_se_leen_una_vez(self):
+        from unittest import mock
+        from . import retencion
+        # Corte entre la escritura y el borrado: la siguiente corrida las vuelve a archivar
+        with mock.patch.object(retencion, '_borrar'):
+            retencion.archivar()
+        retencion.archivar()
+
+        self.assertEqual(len(list(retencion.leer())), 12)
+
+    def test_simular_no_cambia_nada(self):
+        call_command('archivar_historial', '--simular', stdout=StringIO())
+        self.assertEqual(HistorialAccion.objects.filter(descripcion__startswith='antigua').count(), 12)
+
+class RenderersTests(APITestCase):
+    """ORJSONRenderer produce el mismo JSON que el JSONRenderer de DRF"""
+
+    def setUp(self):
+        self.maria = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com', saldo=Decimal('150.75'))
+        Pago.objects.create(cliente=self.maria, monto=Decimal('25.50'), descripcion='Pago “mensual”')
+        Ticket.objects.create(cliente=self.maria, titulo='Factura', descripcion='ñandú')
+
+    def test_mismo_json_que_drf(self):
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import ORJSONRenderer, json_bytes
+        for url in ('/api/clientes/', '/api/pagos/', '/api/tickets/', f'/api/clientes/{self.maria.id}/'):
+            response = self.client.get(url)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertEqual(ORJSONRenderer().render(response.data), JSONRenderer().render(response.data))
+
+        data = {'monto': Decimal('10.10'), 'fecha': timezone.now(), 'dia': timezone.localdate(), 1: None}
+        self.assertEqual(json_bytes(data), JSONRenderer().render(data))
+
+    def test_parser_y_errores(self):
+        response = self.client.post(
+            '/api/tools/crear-ticket/',
+            data='{"cliente": %d, "titulo": "Problema", "descripcion": "Sin acceso"}' % self.maria.id,
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/api/tools/crear-ticket/', data='{malo', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON parse error', response.json()['detail'])
+        # Anidamiento profundo: error de parseo, no un worker caído (orjson >= 3.9.15)
+        response = self.client.post('/api/tools/crear-ticket/', data='[' * 100000, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_navegable_solo_para_navegadores(self):
+        self.assertEqual(self.client.get('/api/clientes/', HTTP_ACCEPT='*/*')['Content-Type'], 'application/json')
+        response = self.client.get('/api/clientes/', HTTP_ACCEPT='text/html,application/xhtml+xml,*/*;q=0.8')
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+    def test_messagepack(self):
+        from . import renderers
+        response = self.client.get('/api/pagos/', HTTP_ACCEPT='application/msgpack')
+        if not renderers.MessagePackRenderer.disponible:
+            self.assertEqual(response.status_code, 406)
+            return
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        datos = renderers.msgpack.unpackb(response.content)
+        self.assertEqual(datos['results'][0]['monto'], '25.50')
+
+class PerfilSQLiteTests(TestCase):
+    """Con el perfil de producción (WAL) lecturas y escrituras no se bloquean"""
+
+    def conexion(self, ruta, **opciones):
+        from django.db import connections
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        ajustes = dict(connections['default'].settings_dict, NAME=ruta)
+        ajustes['OPTIONS'] = {**ajustes['OPTIONS'], **opciones}
+        conexion = DatabaseWrapper(ajustes, alias=f'perfil_{id(ajustes)}')
+        self.addCleanup(conexion.close)
+        return conexion
+
+    def escribir_durante_una_lectura(self, **opciones):
+        """Un lector con una transacción abierta y un escritor en otra conexión"""
+        import os
+        import shutil
+        import tempfile
+        import time
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        ruta = os.path.join(directorio, 'perfil.sqlite3')
+
+        lector, escritor = self.conexion(ruta, **opciones), self.conexion(ruta, **opciones)
+        with escritor.cursor() as cursor:
+            cursor.execute('CREATE TABLE pagos (monto)')
+            cursor.execute('INSERT INTO pagos VALUES (1)')
+
+        with lector.cursor() as lectura:
+            lectura.execute('BEGIN')
+            lectura.execute('SELECT COUNT(*) FROM pagos')
+            self.assertEqual(lectura.fetchone(), (1,))
+
+            inicio = time.perf_counter()
+            with escritor.cursor() as cursor:
+                cursor.execute('INSERT INTO pagos VALUES (2)')
+            duracion = time.perf_counter() - inicio
+
+            # El lector sigue viendo su snapshot hasta terminar la transacción
+            lectura.execute('SELECT COUNT(*) FROM pagos')
+            self.assertEqual(lectura.fetchone(), (1,))
+            lectura.execute('COMMIT')
+            lectura.execute('SELECT COUNT(*) FROM pagos')
+            self.assertEqual(lectura.fetchone(), (2,))
+            lectura.execute('PRAGMA journal_mode')
+            return lectura.fetchone()[0], duracion
+
+    def test_perfil_de_produccion_aplica_los_pragmas(self):
+        from django.conf import settings
+        self.assertTrue(settings.SQLITE_PRODUCCION)
+        modo, duracion = self.escribir_durante_una_lectura()
+        self.assertEqual(modo, 'wal')
+        self.assertLess(duracion, 1)
+
+    def test_sin_wal_la_escritura_espera_a_los_lectores(self):
+        from django.db import OperationalError
+        with self.assertRaisesMessage(OperationalError, 'database is locked'):
+            self.escribir_durante_una_lectura(init_command='PRAGMA journal_mode=DELETE', timeout=0.2)
+
+CACHES_PRUEBA = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'tools': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tools-tests'},
+}
+
+@override_settings(CACHES=CACHES_PRUEBA)
+class CacheToolsTests(TransactionTestCase):
+    """Caché compartida de buscar-cliente, saldo y dashboard"""
+    # Sin transacción del test: la invalidación corre en on_commit y dentro
+    # de una transacción la caché no se usa
+
+    def setUp(self):
+        from django.core.cache import caches
+        from . import cache_tools, metricas
+        self.cache_tools = cache_tools
+        caches['tools'].clear()
+        metricas.registro.reiniciar()
+        self.addCleanup(metricas.registro.reiniciar)
+        self.maria = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com', saldo=100)
+        self.juan = Cliente.objects.create(nombre='Juan García Pérez', email='juan.garcia@email.com', saldo=50)
+
+    def contador(self, herramienta, resultado):
+        from . import metricas
+        valores = metricas.registro.estado()['contadores'].get('cache_tools_total', {})
+        return valores.get(f'{{"herramienta": "{herramienta}", "resultado": "{resultado}"}}', 0)
+
+    def test_saldo_cacheado_e_invalidado_por_pagos_y_tickets(self):
+        url = f'/api/tools/cliente/{self.maria.id}/saldo/'
+        self.assertEqual(self.client.get(url).data['cliente']['saldo'], 100.0)
+        with self.assertNumQueries(1):  # solo el INSERT de auditoría
+            self.assertEqual(self.client.get(url).data['cliente']['saldo'], 100.0)
+        self.assertEqual(self.contador('consultar_saldo', 'hit'), 1)
+
+        Pago.objects.create(cliente=self.maria, monto=Decimal('25.00'), metodo_pago='efectivo')
+        response = self.client.get(url)
+        self.assertEqual(response.data['cliente']['saldo'], 125.0)
+        self.assertEqual(response.data['resumen']['total_pagos'], 1)
+
+        Ticket.objects.create(cliente=self.maria, titulo='Factura', descripcion='No llegó')
+        self.assertEqual(self.client.get(url).data['resumen']['total_tickets'], 1)
+
+        # La versión async comparte las entradas
+        from asgiref.sync import async_to_sync
+        response = async_to_sync(self.async_client.get)(f'/api/async/tools/cliente/{self.maria.id}/saldo/')
+        self.assertEqual(response.json()['resumen']['total_tickets'], 1)
+        self.assertEqual(self.contador('consultar_saldo', 'hit'), 2)
+        self.assertEqual(HistorialAccion.objects.filter(cliente=self.maria, tipo='consulta').count(), 5)
+
+        self.maria.activo = False
+        self.maria.save()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_busqueda_invalida_solo_el_cliente_afectado(self):
+        url = '/api/tools/buscar-cliente/'
+        self.assertEqual(self.client.get(url, {'q': 'García'}).data['total'], 2)
+        with self.assertNumQueries(1):
+            self.client.get(url, {'q': 'GARCIA'})  # sin mayúsculas ni acentos: misma entrada
+
+        Pago.objects.create(cliente=self.juan, monto=Decimal('10.00'), metodo_pago='efectivo')
+        clientes = {c['id']: c for c in self.client.get(url, {'q': 'García'}).data['clientes']}
+        self.assertEqual(clientes[self.juan.id]['saldo'], '60.00')
+        # La búsqueda y María siguen en caché; Juan se vuelve a leer
+        self.assertEqual(self.contador('buscar_cliente', 'hit'), 2)
+        self.assertEqual(self.contador('cliente', 'hit'), 3)
+        self.assertEqual(self.contador('cliente', 'miss'), 3)
+
+        Cliente.objects.create(nombre='Ana García', email='ana@email.com')
+        self.assertEqual(self.client.get(url, {'q': 'García'}).data['total'], 3)
+
+    def test_dashboard_y_update_masivo(self):
+        url = '/api/dashboard/estadisticas/'
+        self.assertEqual(self.client.get(url).data['estadisticas']['tickets']['total'], 0)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        Ticket.objects.create(cliente=self.maria, titulo='Factura', descripcion='No llegó')
+        self.assertEqual(self.client.get(url).data['estadisticas']['tickets']['total'], 1)
+
+        saldo = f'/api/tools/cliente/{self.juan.id}/saldo/'
+        self.client.get(saldo)
+        from django.db import transaction
+        with transaction.atomic():
+            clientes = Cliente.objects.filter(pk=self.juan.pk)
+            estadisticas.registrar_update(clientes, activo=False)
+            clientes.update(activo=False)
+        self.assertEqual(self.client.get(saldo).status_code, 404)
+
+    def test_contexto_cacheado_e_invalidado(self):
+        url = f'/api/tools/contexto-cliente/?id={self.maria.id}'
+        self.assertEqual(self.client.get(url).data['resumen']['total_pagos'], 0)
+        with self.assertNumQueries(1):  # solo el INSERT de auditoría (consulta)
+            self.client.get(url)
+
+        Pago.objects.create(cliente=self.maria, monto=Decimal('25.00'), metodo_pago='efectivo')
+        self.assertIn('Últimos pagos (1 de 1)', self.client.get(url).data['texto'])
+
+        # Una acción que no es consulta aparece en la actividad reciente
+        auditoria.registrar('actualizacion', 'Email actualizado', cliente=self.maria.id)
+        actividad = self.client.get(url).data['actividad_reciente']
+        self.assertEqual([a['descripcion'] for a in actividad], ['Email actualizado'])
+
+        # ?q= comparte los ids de buscar-cliente
+        self.client.get('/api/tools/buscar-cliente/', {'q': 'María'})
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/tools/contexto-cliente/', {'q': 'María'})
+        self.assertEqual(response.data['cliente']['id'], self.maria.id)
+
+    def test_single_flight(self):
+        import threading
+        import time
+        llamadas = []
+
+        def calcular():
+            llamadas.append(1)
+            time.sleep(0.2)
+            return {'valor': 42}
+
+        resultados = []
+        hilos = [
+            threading.Thread(target=lambda: resultados.append(
+                self.cache_tools.obtener('prueba', 'lenta', [], calcular)
+            ))
+            for _ in range(5)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(resultados, [{'valor': 42}] * 5)
+        self.assertEqual(self.contador('prueba', 'colapsada'), 4)
+
+        response = self.client.get('/api/metrics/')
+        self.assertIn(
+            'ai_assistant_cache_tools_total{herramienta="prueba",resultado="colapsada"} 4',
+            response.content.decode()
+        )
+
+    def test_cache_archivos_revisa_el_limite_cada_n_escrituras(self):
+        import os
+        import shutil
+        import tempfile
+        from .cache_archivos import CacheArchivos
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        cache = CacheArchivos(directorio, {'OPTIONS': {'MAX_ENTRIES': 5, 'CULL_FREQUENCY': 2, 'CULL_CADA': 10}})
+
+        for i in range(9):
+            cache.set(f'clave:{i}', i)
+        self.assertEqual(len(os.listdir(directorio)), 9)
+        cache.set('clave:9', 9)  # décima escritura: recién aquí recorta
+        self.assertLess(len(os.listdir(directorio)), 10)
+        self.assertEqual(cache.get('clave:9'), 9)
+
+class IdempotenciaTests(TestCase):
+    """Idempotency-Key en crear-ticket y registrar-pago"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com', saldo=100)
+        self.pago = {'cliente': self.cliente.id, 'monto': '25.00', 'metodo_pago': 'efectivo'}
+
+    def post(self, url, datos, clave=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': clave} if clave else {}
+        return self.client.post(url, datos, content_type='application/json', **headers)
+
+    def test_reintento_devuelve_la_respuesta_original(self):
+        primera = self.post('/api/tools/registrar-pago/', self.pago, clave='pago-1')
+        self.assertEqual(primera.status_code, 201)
+        with self.assertNumQueries(1):  # solo la lectura de la clave
+            segunda = self.post('/api/tools/registrar-pago/', self.pago, clave='pago-1')
+        self.assertEqual(segunda.status_code, 201)
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(Pago.objects.count(), 1)
+        self.cliente.refresh_from_db()
+        self.assertEqual(self.cliente.saldo, Decimal('125.00'))
+
+        # Sin clave, u otra clave: pagos nuevos
+        self.post('/api/tools/registrar-pago/', self.pago)
+        self.post('/api/tools/registrar-pago/', self.pago, clave='pago-2')
+        self.assertEqual(Pago.objects.count(), 3)
+
+    def test_misma_clave_con_otros_datos_o_tool(self):
+        self.post('/api/tools/registrar-pago/', self.pago, clave='clave-1')
+        response = self.post('/api/tools/registrar-pago/', {**self.pago, 'monto': '30.00'}, clave='clave-1')
+        self.assertEqual(response.status_code, 422)
+        response = self.post('/api/tools/crear-ticket/', {
+            'cliente': self.cliente.id, 'titulo': 'Factura', 'descripcion': 'No llegó'
+        }, clave='clave-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Ticket.objects.count(), 0)
+
+    def test_tool_call_id_en_el_body_y_errores_guardados(self):
+        ticket = {'cliente': self.cliente.id, 'titulo': 'Factura', 'descripcion': 'No llegó'}
+        for _ in range(2):
+            response = self.post('/api/tools/crear-ticket/', {**ticket, 'tool_call_id': 'call_1'})
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(Ticket.objects.count(), 1)
+
+        # Un 4xx también se repite tal cual (el mismo body da el mismo error)
+        for _ in range(2):
+            response = self.post('/api/tools/registrar-pago/', {**self.pago, 'monto': '-5'}, clave='neg')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+
+    def test_batch(self):
+        llamada = {'tool': 'registrar_pago', 'args': self.pago, 'idempotency_key': 'batch-1'}
+        for _ in range(2):
+            response = self.client.post(
+                '/api/tools/batch/', {'calls': [llamada]}, content_type='application/json'
+            )
+            self.assertEqual(response.json()['resultados'][0]['status'], 201)
+        self.assertEqual(Pago.objects.count(), 1)
+
+    async def test_async(self):
+        ticket = {'cliente': self.cliente.id, 'titulo': 'Factura', 'descripcion': 'No llegó'}
+        respuestas = [
+            await self.async_client.post(
+                '/api/async/tools/crear-ticket/', ticket, content_type='application/json',
+                headers={'Idempotency-Key': 'async-1'}
+            )
+            for _ in range(2)
+        ]
+        self.assertEqual([r.status_code for r in respuestas], [201, 201])
+        self.assertEqual(respuestas[1]['Idempotent-Replayed'], 'true')
+        self.assertEqual(respuestas[0].json(), respuestas[1].json())
+        self.assertEqual(await Ticket.objects.acount(), 1)
+
+    def test_limpiar_claves_vencidas(self):
+        from datetime import timedelta
+        from .models import ClaveIdempotencia
+        self.post('/api/tools/registrar-pago/', self.pago, clave='vieja')
+        ClaveIdempotencia.objects.update(expira=timezone.now() - timedelta(seconds=1))
+
+        # Vencida: se vuelve a ejecutar
+        response = self.post('/api/tools/registrar-pago/', self.pago, clave='vieja')
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Pago.objects.count(), 2)
+
+        ClaveIdempotencia.objects.update(expira=timezone.now() - timedelta(seconds=1))
+        salida = StringIO()
+        call_command('limpiar_idempotencia', stdout=salida)
+        self.assertIn('1 claves', salida.getvalue())
+        self.assertFalse(ClaveIdempotencia.objects.exists())
+
+@override_settings(IDEMPOTENCIA={'ESPERA': 0.5, 'ABANDONO': 60})
+class IdempotenciaEnProcesoTests(TestCase):
+    """Un duplicado que llega mientras el primero se ejecuta espera su respuesta"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com', saldo=100)
+        self.pago = {'cliente': self.cliente.id, 'monto': '10.00'}
+
+    def en_proceso(self, clave, hace=0):
+        from datetime import timedelta
+        from . import idempotencia
+        from .models import ClaveIdempotencia
+        return ClaveIdempotencia.objects.create(
+            clave=clave, tool='registrar_pago', huella=idempotencia.huella_de(self.pago),
+            expira=timezone.now() + timedelta(days=1)
+        ), timezone.now() - timedelta(seconds=hace)
+
+    async def test_espera_al_primero(self):
+        import asyncio
+        from asgiref.sync import sync_to_async
+        from .models import ClaveIdempotencia
+        await sync_to_async(self.en_proceso)('dup-1')
+
+        async def terminar_primero():
+            await asyncio.sleep(0.05)
+            await ClaveIdempotencia.objects.filter(clave='dup-1').aupdate(
+                estado='completada', codigo=201, respuesta={'success': True, 'pago': {'id': 99}}
+            )
+
+        tarea = asyncio.create_task(terminar_primero())
+        response = await self.async_client.post(
+            '/api/async/tools/registrar-pago/', self.pago, content_type='application/json',
+            headers={'Idempotency-Key': 'dup-1'}
+        )
+        await tarea
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['pago']['id'], 99)
+        self.assertEqual(await Pago.objects.acount(), 0)
+
+    def test_409_si_el_primero_no_termina(self):
+        self.en_proceso('dup-2')
+        response = self.client.post(
+            '/api/tools/registrar-pago/', self.pago, content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY='dup-2'
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(Pago.objects.count(), 0)
+
+    def test_clave_abandonada_se_reusa(self):
+        from .models import ClaveIdempotencia
+        registro, hace_rato = self.en_proceso('dup-3', hace=120)
+        ClaveIdempotencia.objects.filter(id=registro.id).update(fecha=hace_rato)
+        response = self.client.post(
+            '/api/tools/registrar-pago/', self.pago, content_type='application/json',
+            HTTP_IDEMPOTENCY_KEY='dup-3'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Pago.objects.count(), 1)
+        self.assertEqual(ClaveIdempotencia.objects.get(clave='dup-3').estado, 'completada')
+
+class ContextoClienteTests(TestCase):
+    """Contexto completo de un cliente para el prompt del LLM"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(
+            nombre='María García López', email='maria.garcia@email.com', telefono='0991234567', saldo=100
+        )
+        Cliente.objects.create(nombre='María Pérez', email='maria.perez@email.com')
+        for titulo, estado in [('Factura', 'abierto'), ('Acceso', 'pendiente'), ('Clave', 'resuelto')]:
+            Ticket.objects.create(cliente=self.cliente, titulo=titulo, descripcion='...', estado=estado)
+        for monto in ('10.00', '20.00', '30.00'):
+            Pago.objects.create(cliente=self.cliente, monto=Decimal(monto), metodo_pago='efectivo')
+        HistorialAccion.objects.create(tipo='pago', descripcion='Pago registrado', cliente=self.cliente)
+        HistorialAccion.objects.create(tipo='consulta', descripcion='Consulta de saldo', cliente=self.cliente)
+
+    def test_contexto_por_id_en_consultas_fijas(self):
+        # 4 lecturas + el INSERT de auditoría (modo sync)
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/tools/contexto-cliente/', {'id': self.cliente.id, 'pagos': 2})
+        datos = response.json()
+        self.assertEqual(datos['cliente']['saldo'], 160.0)
+        self.assertEqual([t['titulo'] for t in datos['tickets_abiertos']], ['Acceso', 'Factura'])
+        self.assertEqual([p['monto'] for p in datos['ultimos_pagos']], [30.0, 20.0])
+        self.assertEqual([a['descripcion'] for a in datos['actividad_reciente']], ['Pago registrado'])
+        self.assertEqual(datos['resumen'], {'total_tickets': 3, 'tickets_abiertos': 2, 'total_pagos': 3})
+        self.assertIn('Tickets sin resolver (2 de 3)', datos['texto'])
+        self.assertIn('Últimos pagos (2 de 3): $30.00', datos['texto'])
+
+    def test_por_busqueda_y_formato_texto(self):
+        response = self.client.get('/api/tools/contexto-cliente/', {'q': 'maria.garcia', 'formato': 'texto'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertTrue(response.content.decode().startswith(f'Cliente #{self.cliente.id}: María García López'))
+
+        datos = self.client.get('/api/tools/contexto-cliente/', {'q': 'María'}).json()
+        self.assertEqual(datos['busqueda']['coincidencias'], 2)
+        self.assertIn('Otros 1 clientes coinciden', datos['texto'])
+
+    def test_errores(self):
+        url = '/api/tools/contexto-cliente/'
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {'id': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'id': 99999}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'q': 'Nadie'}).status_code, 404)
+
+    def test_batch_y_async(self):
+        from asgiref.sync import async_to_sync
+        response = self.client.post('/api/tools/batch/', {
+            'calls': [{'tool': 'contexto_cliente', 'args': {'id': self.cliente.id}}]
+        }, content_type='application/json')
+        sincrono = response.json()['resultados'][0]['resultado']
+
+        response = async_to_sync(self.async_client.get)(
+            '/api/async/tools/contexto-cliente/', {'id': self.cliente.id}
+        )
+        self.assertEqual(response.json(), sincrono)
+
+@override_settings(EVENTOS={'INTERVALO': 0.01, 'HEARTBEAT': 0.05})
+class EventosTests(TestCase):
+    """Eventos de tickets y pagos en /api/events/stream/ (SSE)"""
+
+    def setUp(self):
+        self.maria = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com', saldo=100)
+        self.juan = Cliente.objects.create(nombre='Juan Pérez', email='juan.perez@email.com')
+
+    def eventos(self):
+        from .models import EventoCambio
+        return list(EventoCambio.objects.order_by('id').values_list('tipo', 'cliente_id', 'datos'))
+
+    def frames(self, contenido):
+        """[(id, tipo, data)] de los eventos SSE con data"""
+        import json
+        frames = []
+        for bloque in contenido.decode().split('\n\n'):
+            campos = dict(linea.split(': ', 1) for linea in bloque.splitlines() if not linea.startswith(':'))
+            if 'data' in campos:
+                frames.append((int(campos['id']), campos['event'], json.loads(campos['data'])))
+        return frames
+
+    def test_publica_tickets_pagos_y_saldos(self):
+        from django.db import transaction
+        ticket = Ticket.objects.create(cliente=self.maria, titulo='Factura', descripcion='-')
+        self.client.post(f'/api/tickets/{ticket.id}/cambiar_estado/', {'estado': 'resuelto'}, format='json')
+        self.client.post('/api/tools/registrar-pago/', {'cliente': self.maria.id, 'monto': '25.50'},
+                         content_type='application/json')
+        self.juan.saldo = Decimal('40.00')
+        self.juan.save()
+        self.juan.save()  # Sin cambios: sin evento
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Ticket.objects.create(cliente=self.juan, titulo='Revertido', descripcion='-')
+            raise RuntimeError
+
+        tipos = [(tipo, cliente) for tipo, cliente, _ in self.eventos()]
+        self.assertEqual(tipos, [
+            ('ticket_creado', self.maria.id),
+            ('ticket_estado', self.maria.id),
+            ('pago_registrado', self.maria.id),
+            ('saldo_actualizado', self.maria.id),
+            ('saldo_actualizado', self.juan.id),
+        ])
+        datos = [datos for _, _, datos in self.eventos()]
+        self.assertEqual(datos[1]['estado_anterior'], 'abierto')
+        self.assertEqual(datos[1]['estado'], 'resuelto')
+        self.assertEqual(datos[3], {'saldo_anterior': 100.0, 'saldo': 125.5})
+        self.assertEqual(datos[4], {'saldo_anterior': 0.0, 'saldo': 40.0})
+
+    def test_wsgi_responde_lo_pendiente_y_cierra(self):
+        from .models import EventoCambio
+        Pago.objects.create(cliente=self.maria, monto=Decimal('10.00'))
+        Ticket.objects.create(cliente=self.juan, titulo='Acceso', descripcion='-')
+        ultimo = EventoCambio.objects.latest('id').id
+
+        response = self.client.get('/api/events/stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertEqual(response.content, b'retry: 3000\n\nid: %d\n\n' % ultimo)
+
+        response = self.client.get('/api/events/stream/', {'cliente': self.maria.id}, HTTP_LAST_EVENT_ID='0')
+        frames = self.frames(response.content)
+        self.assertEqual([tipo for _, tipo, _ in frames], ['pago_registrado', 'saldo_actualizado'])
+        self.assertEqual(frames[0][2]['datos']['monto'], 10.0)
+        # Avanza hasta el último id aunque sea de otro cliente
+        self.assertTrue(response.content.endswith(b'id: %d\n\n' % ultimo))
+
+        response = self.client.get('/api/events/stream/', {'desde': frames[0][0], 'tipo': 'ticket_creado'})
+        self.assertEqual([tipo for _, tipo, _ in self.frames(response.content)], ['ticket_creado'])
+
+    def test_parametros_invalidos(self):
+        url = '/api/events/stream/'
+        self.assertEqual(self.client.get(url, {'cliente': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'tipo': 'cliente_borrado'}).status_code, 400)
+        self.assertEqual(self.client.get(url, HTTP_LAST_EVENT_ID='x').status_code, 400)
+        with override_settings(EVENTOS={'ACTIVO': False}):
+            self.assertEqual(self.client.get(url).status_code, 503)
+            Pago.objects.create(cliente=self.maria, monto=Decimal('10.00'))
+        self.assertEqual(self.eventos(), [])
+
+    async def test_asgi_reenvia_desde_last_event_id_y_sigue_abierto(self):
+        import asyncio
+        from asgiref.sync import sync_to_async
+        from . import eventos
+        from .models import EventoCambio
+        await Pago.objects.acreate(cliente=self.maria, monto=Decimal('10.00'))
+        primero = await EventoCambio.objects.order_by('id').afirst()
+
+        response = await self.async_client.get(
+            '/api/events/stream/', {'cliente': self.maria.id}, headers={'Last-Event-ID': str(primero.id)}
+        )
+        self.assertTrue(response.is_async)
+        flujo = response.streaming_content
+
+        async def siguiente_evento():
+            while True:
+                bloque = await asyncio.wait_for(anext(flujo), 2)
+                if b'data: ' in bloque:
+                    return self.frames(bloque)[0]
+
+        self.assertEqual(await anext(flujo), b'retry: 3000\n\n')
+        # Lo perdido desde Last-Event-ID, leído de la base
+        self.assertEqual((await siguiente_evento())[1], 'saldo_actualizado')
+
+        # Lo nuevo llega por el difusor, filtrado por cliente
+        await sync_to_async(Ticket.objects.create)(cliente=self.juan, titulo='Otro cliente', descripcion='-')
+        await sync_to_async(Ticket.objects.create)(cliente=self.maria, titulo='Factura', descripcion='-')
+        _, tipo, data = await siguiente_evento()
+        self.assertEqual(tipo, 'ticket_creado')
+        self.assertEqual(data['datos']['titulo'], 'Factura')
+
+        # Al desconectarse el cliente, el handler ASGI cancela la tarea que lee el stream
+        lectura = asyncio.create_task(anext(flujo))
+        await asyncio.sleep(0.01)
+        lectura.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await lectura
+        self.assertFalse(eventos.difusor().suscripciones)
+
+    def test_limpiar_eventos(self):
+        from datetime import timedelta
+        from .models import EventoCambio
+        Pago.objects.create(cliente=self.maria, monto=Decimal('10.00'))
+        EventoCambio.objects.filter(tipo='pago_registrado').update(fecha=timezone.now() - timedelta(days=2))
+        salida = StringIO()
+        call_command('limpiar_eventos', stdout=salida)
+        self.assertIn('1 eventos', salida.getvalue())
+        self.assertEqual([tipo for tipo, _, _ in self.eventos()], ['saldo_actualizado'])
+
+LIMITES_PRUEBA = {
+    'ALIAS': 'default',
+    'API_KEYS': ['frontend'],
+    'TASAS': {'buscar_cliente': (3, 0.01), 'registrar_pago': (2, 0.01)},
+    'MAX_EN_VUELO': 10,
+}
+
+@override_settings(CACHES=CACHES_PRUEBA, LIMITES=LIMITES_PRUEBA)
+class LimitesTests(TestCase):
+    """Límites de tasa por tool y cliente, y admisión por prioridad"""
+
+    def setUp(self):
+        from unittest import mock
+        from django.core.cache import caches
+        from . import limites
+        caches['default'].clear()
+        # Reservas y rechazos recordados por el proceso, vacíos en cada test
+        reservas = mock.patch.object(limites, 'reservas', limites.Reservas())
+        reservas.start()
+        self.addCleanup(reservas.stop)
+        self.admision = limites.admision
+        self.cliente = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com', saldo=100)
+
+    def buscar(self, **headers):
+        return self.client.get('/api/tools/buscar-cliente/', {'q': 'María'}, headers=headers).status_code
+
+    def test_token_bucket_por_tool_y_cliente(self):
+        self.assertEqual([self.buscar() for _ in range(3)], [200, 200, 200])
+        response = self.client.get('/api/tools/buscar-cliente/', {'q': 'María'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '100')
+        self.assertEqual(response.json()['herramienta'], 'buscar_cliente')
+
+        # La versión async comparte el bucket; otra tool y otra API key tienen el suyo
+        from asgiref.sync import async_to_sync
+        response = async_to_sync(self.async_client.get)('/api/async/tools/buscar-cliente/', {'q': 'María'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(self.client.get(f'/api/tools/cliente/{self.cliente.id}/saldo/').status_code, 200)
+        self.assertEqual(self.buscar(**{'X-API-Key': 'frontend'}), 200)
+
+    def test_keys_no_registradas_cuentan_por_ip(self):
+        # Rotar keys inventadas desde la misma IP no da buckets nuevos
+        resultados = [self.buscar(**{'X-API-Key': f'aleatoria-{i}'}) for i in range(4)]
+        self.assertEqual(resultados, [200, 200, 200, 429])
+        self.assertEqual(self.buscar(), 429)
+
+    def test_se_recarga_con_el_tiempo(self):
+        from . import limites
+        estado, tomados, espera = limites._descontar(None, 3, 1.0, 3, ahora=100.0)
+        self.assertEqual((estado, tomados, espera), ((0, 100.0), 3, 0))
+        self.assertEqual(limites._descontar(estado, 3, 1.0, 1, ahora=100.5), (None, 0, 0.5))
+        self.assertEqual(limites._descontar(estado, 3, 1.0, 1, ahora=102.0), ((1.0, 102.0), 1, 0))
+        # La reserva se toma solo si hay tokens de sobra
+        self.assertEqual(limites._descontar(None, 3, 1.0, 1, ahora=100.0, reserva=1), ((1, 100.0), 2, 0))
+        self.assertEqual(limites._descontar(estado, 3, 1.0, 1, ahora=101.5, reserva=1), ((0, 101.5), 1.5, 0))
+        # Más que la ráfaga: pasa solo con el bucket lleno
+        self.assertEqual(limites._descontar(None, 3, 1.0, 5, ahora=100.0), ((0, 100.0), 3, 0))
+
+    def test_reserva_local_sin_leer_la_cache(self):
+        from unittest import mock
+        from django.core.cache import caches
+        with override_settings(LIMITES={**LIMITES_PRUEBA, 'TASAS': {'buscar_cliente': (10, 0.01)}, 'RESERVA': 0.5}):
+            with mock.patch.object(caches['default'], 'get', wraps=caches['default'].get) as leer:
+                codigos = [self.buscar() for _ in range(12)]
+        self.assertEqual(codigos, [200] * 10 + [429] * 2)
+        # Reserva de 5: una lectura cada 6 requests; el segundo rechazo ya no lee
+        self.assertEqual(leer.call_count, 3)
+
+    def test_batch_cuenta_cada_llamada(self):
+        llamada = {'tool': 'registrar_pago', 'args': {'cliente': self.cliente.id, 'monto': '1.00'}}
+        response = self.client.post('/api/tools/batch/', {'calls': [llamada, llamada]}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/api/tools/batch/', {'calls': [llamada]}, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(Pago.objects.count(), 2)
+
+    def test_admision_rechaza_primero_dashboard_y_exportaciones(self):
+        def estados():
+            return {
+                'dashboard': self.client.get('/api/dashboard/estadisticas/').status_code,
+                'export': self.client.get('/api/export/pagos/').status_code,
+                'saldo': self.client.get(f'/api/tools/cliente/{self.cliente.id}/saldo/').status_code,
+                'pago': self.client.post('/api/tools/registrar-pago/', {'cliente': self.cliente.id, 'monto': '1.00'},
+                                         content_type='application/json').status_code,
+                'health': self.client.get('/api/health/').status_code,
+            }
+
+        self.addCleanup(setattr, self.admision, 'en_vuelo', self.admision.en_vuelo)
+        # 10 en vuelo como máximo: 'baja' entra por debajo de 5, 'normal' de 8, 'alta' de 10
+        self.admision.en_vuelo = 6
+        self.assertEqual(estados(), {'dashboard': 503, 'export': 503, 'saldo': 200, 'pago': 201, 'health': 200})
+        self.admision.en_vuelo = 8
+        self.assertEqual(estados(), {'dashboard': 503, 'export': 503, 'saldo': 503, 'pago': 201, 'health': 200})
+        self.admision.en_vuelo = 10
+        self.assertEqual(estados()['pago'], 503)
+
+    def test_libera_el_lugar_al_terminar_incluso_streaming(self):
+        antes = self.admision.en_vuelo
+        response = self.client.get('/api/export/pagos/')
+        self.assertEqual(self.admision.en_vuelo, antes + 1)
+        b''.join(response.streaming_content)
+        self.assertEqual(self.admision.en_vuelo, antes)
+
+        self.client.get('/api/dashboard/estadisticas/')
+        self.buscar()
+        from asgiref.sync import async_to_sync
+        async_to_sync(self.async_client.get)('/api/async/dashboard/estadisticas/')
+        self.assertEqual(self.admision.en_vuelo, antes)
+
+
+class CambioEstadoMasivoTests(APITestCase):
+    """POST /api/tickets/bulk-cambiar-estado/ (ver transiciones.py)"""
+
+    url = '/api/tickets/bulk-cambiar-estado/'
+
+    def setUp(self):
+        self.maria = Cliente.objects.create(nombre='María García López', email='maria.garcia@email.com')
+        self.juan = Cliente.objects.create(nombre='Juan Pérez', email='juan.perez@email.com')
+
+    def crear(self, cliente, cantidad, **campos):
+        return [
+            Ticket.objects.create(cliente=cliente, titulo=f'Ticket {i}', descripcion='-', **campos).id
+            for i in range(cantidad)
+        ]
+
+    def consultas(self, datos):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.post(self.url, datos, format='json')
+        self.assertEqual(response.status_code, 200)
+        return len(capturadas)
+
+    def test_actualiza_por_ids_y_cuenta_resultados(self):
+        from .models import EventoCambio
+        abiertos = self.crear(self.maria, 3)
+        cerrado = self.crear(self.juan, 1, estado='cerrado')
+        resuelto = self.crear(self.juan, 1, estado='resuelto', fecha_resolucion=timezone.now())
+
+        response = self.client.post(self.url, {
+            'estado': 'resuelto', 'ids': abiertos + cerrado + resuelto + [999999]
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['encontrados'], 5)
+        self.assertEqual(response.data['actualizados'], 3)
+        self.assertEqual(response.data['sin_cambio'], 1)
+        self.assertEqual(response.data['transicion_invalida'], 1)
+        self.assertEqual(response.data['ids_transicion_invalida'], cerrado)
+        self.assertEqual(response.data['no_encontrados'], 1)
+        self.assertEqual(response.data['por_estado_anterior'], {'abierto': 3})
+        self.assertEqual(Ticket.objects.filter(estado='resuelto', fecha_resolucion__isnull=False).count(), 4)
+        self.assertEqual(Ticket.objects.get(id=cerrado[0]).estado, 'cerrado')
+
+        # Una acción de auditoría y un evento por ticket actualizado
+        self.assertEqual(
+            HistorialAccion.objects.filter(tipo='actualizacion', metadata__masivo=True).count(), 3
+        )
+        eventos = EventoCambio.objects.filter(tipo='ticket_estado')
+        self.assertEqual(eventos.count(), 3)
+        self.assertTrue(all(e.datos['estado_anterior'] == 'abierto' and e.datos['fecha_resolucion'] for e in eventos))
+
+    def test_conserva_fecha_resolucion_y_contadores(self):
+        ayer = timezone.now() - timezone.timedelta(days=1)
+        self.crear(self.maria, 2, estado='en_proceso', fecha_resolucion=ayer)
+        self.crear(self.maria, 2, estado='pendiente')
+
+        response = self.client.post(self.url, {
+            'estado': 'resuelto', 'filtro': {'cliente': self.maria.id, 'estado': ['en_proceso', 'pendiente']}
+        }, format='json')
+
+        self.assertEqual(response.data['actualizados'], 4)
+        self.assertEqual(Ticket.objects.filter(fecha_resolucion=ayer).count(), 2)
+        stats = estadisticas.obtener_estadisticas()
+        self.assertEqual(stats['tickets']['resueltos_hoy'], 2)
+        self.assertEqual(stats['tickets']['en_proceso'], 0)
+        self.assertEqual(stats['tickets']['pendientes'], 0)
+
+    def test_consultas_no_dependen_de_la_cantidad(self):
+        pocos = self.crear(self.maria, 2)
+        muchos = self.crear(self.juan, 40)
+        self.assertEqual(
+            self.consultas({'estado': 'cerrado', 'ids': pocos}),
+            self.consultas({'estado': 'cerrado', 'ids': muchos}),
+        )
+
+    def test_valida_la_solicitud(self):
+        ids = self.crear(self.maria, 1)
+        invalidas = [
+            {'estado': 'archivado', 'ids': ids},
+            {'estado': 'cerrado'},
+            {'estado': 'cerrado', 'ids': ids, 'filtro': {'cliente': self.maria.id}},
+            {'estado': 'cerrado', 'ids': ['1']},
+            {'estado': 'cerrado', 'ids': list(range(501))},
+            {'estado': 'cerrado', 'filtro': {}},
+            {'estado': 'cerrado', 'filtro': {'titulo': 'x'}},
+            {'estado': 'cerrado', 'filtro': {'cliente': 'maria'}},
+        ]
+        for datos in invalidas:
+            with self.subTest(datos=datos):
+                response = self.client.post(self.url, datos, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(Ticket.objects.get(id=ids[0]).estado, 'abierto')
+
+    def test_cambio_individual_valida_la_transicion(self):
+        cerrado = self.crear(self.maria, 1, estado='cerrado')[0]
+        response = self.client.post(f'/api/tickets/{cerrado}/cambiar_estado/', {'estado': 'resuelto'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['estados_validos'], ['abierto'])
+        response = self.client.post(f'/api/tickets/{cerrado}/cambiar_estado/', {'estado': 'abierto'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_filtro_con_demasiados_tickets(self):
+        from unittest import mock
+        from . import transiciones
+        self.crear(self.maria, 4)
+        with mock.patch.object(transiciones, 'MAX_TICKETS', 3):
+            response = self.client.post(self.url, {'estado': 'cerrado', 'filtro': {'estado': 'abierto'}}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Ticket.objects.filter(estado='cerrado').count(), 0)
@@ -0,0 +1,104 @@
+"""
+Cambios de estado masivos de tickets: POST /api/tickets/bulk-cambiar-estado/
+y las acciones del admin
+
+Los tickets afectados se leen una sola vez (id, cliente, estado,
+fecha_resolucion) y se actualizan con un UPDATE por grupo de valores
+nuevos: uno solo, o dos al pasar a 'resuelto' (los que ya tenían
+fecha_resolucion la conservan, como en TicketViewSet.cambiar_estado).
+En la misma transacción se ajustan los contadores del dashboard y la
+caché de AI tools (estadisticas.registrar_filas), y se guardan una
+acción de auditoría y un evento ticket_estado (SSE) por ticket, cada
+grupo con un solo bulk_create.
+"""
+from collections import Counter
+from django.db import transaction
+from django.utils import timezone
+
+from . import auditoria, estadisticas, eventos
+from .models import Ticket
+
+# Estado actual -> estados a los que puede pasar
+TRANSICIONES = {
+    'abierto': {'en_proceso', 'pendiente', 'resuelto', 'cerrado'},
+    'en_proceso': {'abierto', 'pendiente', 'resuelto', 'cerrado'},
+    'pendiente': {'abierto', 'en_proceso', 'resuelto', 'cerrado'},
+    'resuelto': {'abierto', 'cerrado'},     # Reabrir o cerrar
+    'cerrado': {'abierto'},                 # Solo reabrir
+}
+
+ESTADOS = [estado for estado, _ in Ticket.ESTADO_CHOICES]
+
+# Tickets por solicitud en /api/tickets/bulk-cambiar-estado/
+MAX_TICKETS = 500
+
+class DemasiadosTickets(Exception):
+    pass
+
+def transicion_valida(anterior, estado):
+    """True si un ticket en `anterior` puede pasar a `estado` (o ya está en él)"""
+    return estado == anterior or estado in TRANSICIONES[anterior]
+
+def cambiar_estado(queryset, estado, usuario=None, ip=None, maximo=None):
+    """
+    Pasa a `estado` los tickets del queryset cuya transición es válida.
+    Retorna los conteos: encontrados, actualizados, sin_cambio (ya
+    estaban en ese estado), transicion_invalida (con sus ids) y
+    por_estado_anterior. Con `maximo`, lanza DemasiadosTickets (sin
+    cambiar nada) si el queryset tiene más tickets
+    """
+    ahora = timezone.now()
+    with transaction.atomic():
+        # FOR UPDATE en PostgreSQL; en SQLite la transacción ya tiene el lock de escritura
+        filas = (
+            queryset.select_for_update().order_by('id')
+            .values_list('id', 'cliente_id', 'estado', 'fecha_resolucion')
+        )
+        filas = list(filas if maximo is None else filas[:maximo + 1])
+        if maximo is not None and len(filas) > maximo:
+            raise DemasiadosTickets(maximo)
+        validas, invalidas = [], []
+        for fila in filas:
+            if estado in TRANSICIONES[fila[2]]:
+                validas.append(fila)
+            elif fila[2] != estado:
+                invalidas.append(fila[0])
+
+        # Grupo -> valores nuevos (campos de estadisticas.CAMPOS_TICKET)
+        grupos = {}
+        for fila in validas:
+            cambios = {'estado': estado}
+            if estado == 'resuelto' and not fila[3]:
+                cambios['fecha_resolucion'] = ahora
+            grupos.setdefault(tuple(cambios.items()), []).append(fila)
+
+        for cambios, grupo in grupos.items():
+            cambios = dict(cambios)
+            estadisticas.registrar_filas('Ticket', [(e, fecha, cliente) for _, cliente, e, fecha in grupo], cambios)
+            Ticket.objects.filter(id__in=[fila[0] for fila in grupo]).update(fecha_actualizacion=ahora, **cambios)
+
+        if validas:
+            auditoria.registrar_muchos([
+                (
+                    'actualizacion',
+                    f'Ticket #{ticket_id}: {anterior} → {estado}',
+                    cliente_id,
+                    {'ticket_id': ticket_id, 'estado_anterior': anterior, 'estado_nuevo': estado, 'masivo': True},
+                )
+                for ticket_id, cliente_id, anterior, _ in validas
+            ], usuario=usuario, ip=ip)
+            eventos.publicar_muchos([
+                eventos.nuevo('ticket_estado', cliente_id, eventos.datos_ticket_estado(
+                    ticket_id, anterior, estado, fecha or (ahora if estado == 'resuelto' else None)
+                ))
+                for ticket_id, cliente_id, anterior, fecha in validas
+            ])
+
+    return {
+        'encontrados': len(filas),
+        'actualizados': len(validas),
+        'sin_cambio': len(filas) - len(validas) - len(invalidas),
+        'transicion_invalida': len(invalidas),
+        'ids_transicion_invalida': invalidas,
+        'por_estado_anterior': dict(Counter(fila[2] for fila in validas)),
+    }
@@ -4,7 +4,7 @@ Organiza endpoints para AI tools y administración
 """
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import views, async_views
 
 # Router para ViewSets (administración completa)
 router = DefaultRouter()
@@ -25,6 +25,10 @@ urlpatterns = [
          views.consultar_saldo_tool, 
          name='consultar_saldo_tool'),
     
+    path('tools/contexto-cliente/', 
+         views.contexto_cliente_tool, 
+         name='contexto_cliente_tool'),
+    
     path('tools/crear-ticket/', 
          views.crear_ticket_tool, 
          name='crear_ticket_tool'),
@@ -33,6 +37,10 @@ urlpatterns = [
          views.registrar_pago_tool, 
          name='registrar_pago_tool'),
     
+    path('tools/batch/', 
+         views.batch_tools, 
+         name='batch_tools'),
+    
     # ============= 📊 UTILITY ENDPOINTS =============
     path('dashboard/estadisticas/', 
          views.estadisticas_dashboard, 
@@ -42,6 +50,46 @@ urlpatterns = [
          views.health_check, 
          name='health_check'),
     
+    path('metrics/', 
+         views.metricas_prometheus, 
+         name='metricas'),
+    
+    # ============= 📤 EXPORTACIÓN (STREAMING) =============
+    path('export/<str:recurso>/', 
+         views.exportar, 
+         name='exportar'),
+    
+    # ============= ⚡ AI TOOL ENDPOINTS ASYNC (ASGI) =============
+    # Mismas tools con el ORM async, para servir con uvicorn
+    path('async/tools/buscar-cliente/', 
+         async_views.buscar_cliente_tool, 
+         name='buscar_cliente_tool_async'),
+    
+    path('async/tools/cliente/<int:cliente_id>/saldo/', 
+         async_views.consultar_saldo_tool, 
+         name='consultar_saldo_tool_async'),
+    
+    path('async/tools/contexto-cliente/', 
+         async_views.contexto_cliente_tool, 
+         name='contexto_cliente_tool_async'),
+    
+    path('async/tools/crear-ticket/', 
+         async_views.crear_ticket_tool, 
+         name='crear_ticket_tool_async'),
+    
+    path('async/tools/registrar-pago/', 
+         async_views.registrar_pago_tool, 
+         name='registrar_pago_tool_async'),
+    
+    path('async/dashboard/estadisticas/', 
+         async_views.estadisticas_dashboard, 
+         name='estadisticas_dashboard_async'),
+    
+    # ============= 📡 EVENTOS EN TIEMPO REAL (SSE) =============
+    path('events/stream/', 
+         async_views.eventos_stream, 
+         name='eventos_stream'),
+    
     # ============= 🔧 CRUD COMPLETO =============
     # Include router URLs para administración completa
     path('', include(router.urls)),
@@ -53,12 +101,24 @@ urlpatterns = [
 🤖 AI TOOL ENDPOINTS (para Vercel AI SDK):
 - GET  /api/tools/buscar-cliente/?q=nombre     - Buscar cliente
 - GET  /api/tools/cliente/{id}/saldo/          - Consultar saldo
+- GET  /api/tools/contexto-cliente/?id=1       - Contexto completo para el prompt (o ?q=)
 - POST /api/tools/crear-ticket/                - Crear ticket
 - POST /api/tools/registrar-pago/              - Registrar pago
+- POST /api/tools/batch/                       - Varias tool calls en un request
+
+⚡ AI TOOL ENDPOINTS ASYNC (servir con uvicorn):
+- GET  /api/async/tools/buscar-cliente/?q=nombre
+- GET  /api/async/tools/cliente/{id}/saldo/
+- GET  /api/async/tools/contexto-cliente/?id=1
+- POST /api/async/tools/crear-ticket/
+- POST /api/async/tools/registrar-pago/
+- GET  /api/async/dashboard/estadisticas/
 
 📊 UTILITY ENDPOINTS:
 - GET /api/dashboard/estadisticas/             - Estadísticas del sistema
 - GET /api/health/                             - Health check
+- GET /api/export/{recurso}/                   - Exportación NDJSON/CSV por streaming
+- GET /api/events/stream/?cliente=1            - Eventos de tickets y pagos (SSE)
 
 🔧 CRUD COMPLETO (para administración):
 - GET    /api/clientes/                        - Listar clientes
@@ -74,6 +134,7 @@ urlpatterns = [
 - PUT    /api/tickets/{id}/                    - Actualizar ticket completo
 - PATCH  /api/tickets/{id}/                    - Actualizar ticket parcial
 - POST   /api/tickets/{id}/cambiar_estado/     - Cambiar estado del ticket
+- POST   /api/tickets/bulk-cambiar-estado/     - Cambiar estado de varios tickets (ids o filtro)
 - DELETE /api/tickets/{id}/                    - Eliminar ticket
 
 - GET    /api/pagos/                           - Listar pagos
@@ -87,4 +148,5 @@ urlpatterns = [
 - /api/clientes/?nombre=juan                   - Filtrar clientes por nombre
 - /api/tickets/?estado=abierto                 - Filtrar tickets por estado
 - /api/pagos/?cliente=1                        - Filtrar pagos por cliente
+- /api/export/pagos/?formato=csv&desde=2025-01-01&hasta=2025-01-31&cliente=1
 """
\ No newline at end of file
@@ -7,11 +7,21 @@ from rest_framework import status, viewsets
 from rest_framework.decorators import api_view, action
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, JSONObject
 from django.utils import timezone
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from collections import Counter
+from contextlib import nullcontext
+from datetime import date
+from itertools import chain
 import logging
+import time
 
+from . import auditoria, cache_tools, estadisticas, exportacion, idempotencia, limites, metricas, retencion, search, transiciones
 from .models import Cliente, Ticket, Pago, HistorialAccion
 from .serializers import (
     ClienteSerializer, TicketSerializer, PagoSerializer,
@@ -28,17 +38,247 @@ def registrar_accion(tipo, descripcion, cliente=None, usuario=None, ip=None, met
     Útil para tracking de AI tool calls y debugging
     """
     try:
-        HistorialAccion.objects.create(
+        # Según settings.AUDITORIA se guarda en el request o en segundo plano
+        auditoria.registrar(
             tipo=tipo,
             descripcion=descripcion,
             cliente=cliente,
             usuario=usuario,
-            ip_address=ip,
-            metadata=metadata or {}
+            ip=ip,
+            metadata=metadata
         )
     except Exception as e:
         logger.error(f"Error registrando acción: {e}")
 
+# ============= RESPUESTAS DE LAS AI TOOLS =============
+# Compartidas por los endpoints síncronos (DRF) y asíncronos (async_views.py)
+
+def datos_saldo(cliente, ultimos_pagos, total_tickets, total_pagos):
+    """Respuesta de consultar_saldo a partir de datos ya cargados"""
+    return {
+        'success': True,
+        'cliente': {
+            'id': cliente.id,
+            'nombre': cliente.nombre,
+            'email': cliente.email,
+            'saldo': float(cliente.saldo),
+            'saldo_formateado': cliente.saldo_formateado,
+            'fecha_registro': cliente.fecha_registro
+        },
+        'ultimos_pagos': datos_pagos(ultimos_pagos),
+        'resumen': {
+            'total_tickets': total_tickets,
+            'total_pagos': total_pagos,
+            'ultimo_pago_fecha': ultimos_pagos[0].fecha.strftime('%d/%m/%Y') if ultimos_pagos else 'Sin pagos'
+        }
+    }
+
+def datos_pagos(pagos):
+    """Pagos en el formato de las respuestas para AI"""
+    return [
+        {
+            'monto': float(pago.monto),
+            'descripcion': pago.descripcion or 'Pago sin descripción',
+            'fecha': pago.fecha.strftime('%d/%m/%Y %H:%M'),
+            'metodo': pago.get_metodo_pago_display()
+        }
+        for pago in pagos
+    ]
+
+def datos_contexto(cliente, pagos, tickets, actividad):
+    """
+    Respuesta de contexto_cliente: `cliente` anotado con total_tickets,
+    tickets_abiertos y total_pagos (ver consultas_contexto)
+    """
+    datos = {
+        'success': True,
+        'cliente': {
+            'id': cliente.id,
+            'nombre': cliente.nombre,
+            'email': cliente.email,
+            'telefono': cliente.telefono or '',
+            'saldo': float(cliente.saldo),
+            'saldo_formateado': cliente.saldo_formateado,
+            'fecha_registro': cliente.fecha_registro.strftime('%d/%m/%Y')
+        },
+        'tickets_abiertos': [
+            {
+                'id': ticket.id,
+                'numero': f"#{ticket.id:06d}",
+                'titulo': ticket.titulo,
+                'estado': ticket.get_estado_display(),
+                'prioridad': ticket.get_prioridad_display(),
+                'fecha_creacion': ticket.fecha_creacion.strftime('%d/%m/%Y')
+            }
+            for ticket in tickets
+        ],
+        'ultimos_pagos': datos_pagos(pagos),
+        'actividad_reciente': [
+            {
+                'tipo': accion.get_tipo_display(),
+                'descripcion': accion.descripcion,
+                'fecha': accion.fecha.strftime('%d/%m/%Y %H:%M')
+            }
+            for accion in actividad
+        ],
+        'resumen': {
+            'total_tickets': cliente.total_tickets,
+            'tickets_abiertos': cliente.tickets_abiertos,
+            'total_pagos': cliente.total_pagos
+        }
+    }
+    datos['texto'] = texto_contexto(datos)
+    return datos
+
+def texto_contexto(datos):
+    """Resumen compacto del contexto, listo para el prompt del LLM"""
+    cliente, resumen = datos['cliente'], datos['resumen']
+    telefono = f", tel. {cliente['telefono']}" if cliente['telefono'] else ''
+    lineas = [
+        f"Cliente #{cliente['id']}: {cliente['nombre']} <{cliente['email']}>{telefono}, "
+        f"saldo {cliente['saldo_formateado']}, registrado el {cliente['fecha_registro']}."
+    ]
+    if datos['tickets_abiertos']:
+        lineas.append(f"Tickets sin resolver ({resumen['tickets_abiertos']} de {resumen['total_tickets']}): " + '; '.join(
+            f"{t['numero']} {t['titulo']} [{t['estado']}, {t['prioridad']}, {t['fecha_creacion']}]"
+            for t in datos['tickets_abiertos']
+        ) + '.')
+    else:
+        lineas.append(f"Sin tickets sin resolver ({resumen['total_tickets']} en total).")
+    if datos['ultimos_pagos']:
+        lineas.append(f"Últimos pagos ({len(datos['ultimos_pagos'])} de {resumen['total_pagos']}): " + '; '.join(
+            f"${p['monto']:,.2f} el {p['fecha']} ({p['metodo']})" for p in datos['ultimos_pagos']
+        ) + '.')
+    else:
+        lineas.append('Sin pagos registrados.')
+    if datos['actividad_reciente']:
+        lineas.append('Actividad reciente: ' + '; '.join(
+            f"{a['fecha']} {a['tipo']}: {a['descripcion']}" for a in datos['actividad_reciente']
+        ) + '.')
+    return '\n'.join(lineas)
+
+def datos_ticket_creado(ticket, cliente):
+    """Respuesta optimizada para AI de crear_ticket"""
+    return {
+        'success': True,
+        'mensaje': '✅ Ticket creado exitosamente',
+        'ticket': {
+            'id': ticket.id,
+            'numero': f"#{ticket.id:06d}",  # Formato: #000001
+            'cliente': cliente.nombre,
+            'titulo': ticket.titulo,
+            'descripcion': ticket.descripcion[:100] + '...' if len(ticket.descripcion) > 100 else ticket.descripcion,
+            'estado': ticket.get_estado_display(),
+            'prioridad': ticket.get_prioridad_display(),
+            'fecha_creacion': ticket.fecha_creacion.strftime('%d/%m/%Y %H:%M')
+        },
+        'instrucciones': f'Ticket #{ticket.id:06d} creado. El cliente {cliente.nombre} puede hacer seguimiento con este número.'
+    }
+
+def datos_pago_registrado(pago, cliente, monto, saldo_anterior, saldo_nuevo):
+    """Respuesta de registrar_pago con el saldo anterior y el nuevo"""
+    return {
+        'success': True,
+        'mensaje': '✅ Pago registrado exitosamente',
+        'pago': {
+            'id': pago.id,
+            'cliente': cliente.nombre,
+            'monto': float(pago.monto),
+            'descripcion': pago.descripcion or 'Pago registrado por AI Assistant',
+            'metodo': pago.get_metodo_pago_display(),
+            'fecha': pago.fecha.strftime('%d/%m/%Y %H:%M')
+        },
+        'saldos': {
+            'anterior': saldo_anterior,
+            'actual': saldo_nuevo,
+            'incremento': saldo_nuevo - saldo_anterior
+        },
+        'confirmacion': f'💰 Saldo de {cliente.nombre} actualizado: ${saldo_anterior:,.2f} → ${saldo_nuevo:,.2f} (+${monto:,.2f})'
+    }
+
+# ============= CONSULTAS CACHEADAS =============
+# Lo que calculan las tools de solo lectura ante un fallo de cache_tools
+
+def ids_busqueda(query):
+    """IDs de hasta 10 clientes que coinciden con `query`, en el orden de la respuesta"""
+    if search.usar_fts(query):
+        # Índice FTS5 de las claves de búsqueda: sin acentos y tolerando errores de tipeo
+        return search.buscar_ids_tolerante(query, limite=10)
+    # Búsqueda flexible por nombre o email (case insensitive)
+    return list(Cliente.objects.filter(
+        filtro_sin_indice(query),
+        activo=True
+    ).order_by('nombre').values_list('id', flat=True)[:10])  # Limitar a 10 resultados
+
+def filtro_sin_indice(query):
+    """Nombre o email que contiene `query`, o la clave de búsqueda con todas sus palabras"""
+    filtro = Q(nombre__icontains=query) | Q(email__icontains=query)
+    palabras = search.normalizar(query).split()
+    if palabras:
+        filtro |= Q(*(Q(clave_busqueda__contains=palabra) for palabra in palabras))
+    return filtro
+
+def datos_clientes(ids):
+    """{id: datos simplificados para AI} de los clientes `ids`"""
+    return {
+        cliente.id: dict(ToolResponseClienteSerializer(cliente).data)
+        for cliente in Cliente.objects.filter(id__in=ids)
+    }
+
+def calcular_saldo(cliente_id):
+    """Respuesta de consultar_saldo, o None si no hay cliente activo con ese ID"""
+    cliente = Cliente.objects.filter(id=cliente_id, activo=True).first()
+    if cliente is None:
+        return None
+    # Últimos 5 pagos para dar contexto al AI
+    return datos_saldo(
+        cliente,
+        list(cliente.pagos.all()[:5]),
+        total_tickets=cliente.tickets.count(),
+        total_pagos=cliente.pagos.count()
+    )
+
+# Tickets que el contexto del cliente muestra como abiertos (sin resolver)
+ESTADOS_ABIERTOS = ('abierto', 'en_proceso', 'pendiente')
+MAX_TICKETS_CONTEXTO = 10
+MAX_LISTAS_CONTEXTO = 20  # Tope de ?pagos= y ?actividad=
+# Las consultas no aportan al contexto (y cambian en cada request)
+ACTIVIDAD_EXCLUIDA = ('consulta',)
+
+def _total(queryset):
+    """Subquery con la cantidad de filas de `queryset` (filtrado por OuterRef)"""
+    return Coalesce(Subquery(
+        queryset.order_by().values('cliente').annotate(total=Count('*')).values('total')
+    ), 0)
+
+def consultas_contexto(cliente_id, max_pagos, max_actividad):
+    """
+    Las 4 consultas del contexto de un cliente (sin evaluar, para usarlas
+    también con el ORM async): cliente con totales, últimos pagos, tickets
+    sin resolver y actividad reciente
+    """
+    cliente = Cliente.objects.filter(id=cliente_id, activo=True).annotate(
+        total_tickets=_total(Ticket.objects.filter(cliente=OuterRef('pk'))),
+        tickets_abiertos=_total(Ticket.objects.filter(cliente=OuterRef('pk'), estado__in=ESTADOS_ABIERTOS)),
+        total_pagos=_total(Pago.objects.filter(cliente=OuterRef('pk')))
+    )
+    pagos = Pago.objects.filter(cliente_id=cliente_id).order_by('-fecha', '-id')[:max_pagos]
+    tickets = Ticket.objects.filter(
+        cliente_id=cliente_id, estado__in=ESTADOS_ABIERTOS
+    ).order_by('-fecha_creacion', '-id')[:MAX_TICKETS_CONTEXTO]
+    actividad = HistorialAccion.objects.filter(
+        cliente_id=cliente_id
+    ).exclude(tipo__in=ACTIVIDAD_EXCLUIDA).order_by('-fecha', '-id')[:max_actividad]
+    return cliente, pagos, tickets, actividad
+
+def calcular_contexto(cliente_id, max_pagos, max_actividad):
+    """Respuesta de contexto_cliente, o None si no hay cliente activo con ese ID"""
+    cliente, pagos, tickets, actividad = consultas_contexto(cliente_id, max_pagos, max_actividad)
+    cliente = cliente.first()
+    if cliente is None:
+        return None
+    return datos_contexto(cliente, list(pagos), list(tickets), list(actividad))
+
 # ============= AI TOOL ENDPOINTS =============
 # Estos endpoints están diseñados específicamente para ser llamados desde AI tools
 
@@ -56,7 +296,14 @@ def buscar_cliente_tool(request):
     - Lista de clientes que coinciden
     - Información simplificada para AI processing
     """
-    query = request.GET.get('q', '').strip()
+    return buscar_cliente(request.GET, ip=request.META.get('REMOTE_ADDR'))
+
+def buscar_cliente(params, ip=None):
+    """
+    Lógica de la tool buscar_cliente, compartida por el endpoint
+    individual y por el endpoint batch
+    """
+    query = str(params.get('q') or '').strip()
     
     if not query:
         return Response({
@@ -67,14 +314,16 @@ def buscar_cliente_tool(request):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        # Búsqueda flexible por nombre o email (case insensitive)
-        clientes = Cliente.objects.filter(
-            Q(nombre__icontains=query) | 
-            Q(email__icontains=query),
-            activo=True
-        ).order_by('nombre')[:10]  # Limitar a 10 resultados
-        
-        if not clientes.exists():
+        # Caché compartida (cache_tools.py): ids de la búsqueda y datos de cada cliente
+        ids = cache_tools.obtener(
+            'buscar_cliente',
+            cache_tools.clave_busqueda(query),
+            [cache_tools.VERSION_BUSQUEDA],
+            lambda: ids_busqueda(query)
+        )
+        clientes = cache_tools.datos_clientes(ids, datos_clientes)
+
+        if not clientes:
             return Response({
                 'success': True,
                 'message': f'No se encontraron clientes con "{query}"',
@@ -82,14 +331,11 @@ def buscar_cliente_tool(request):
                 'sugerencia': 'Verifica la ortografía o intenta con un término más general'
             })
         
-        # Usar serializer simplificado para AI
-        serializer = ToolResponseClienteSerializer(clientes, many=True)
-        
         # Registrar acción para auditoría
         registrar_accion(
             tipo='consulta',
             descripcion=f'AI Tool: Búsqueda de cliente "{query}"',
-            ip=request.META.get('REMOTE_ADDR'),
+            ip=ip,
             metadata={'query': query, 'resultados': len(clientes)}
         )
         
@@ -97,7 +343,7 @@ def buscar_cliente_tool(request):
             'success': True,
             'message': f'Se encontraron {len(clientes)} cliente(s) con "{query}"',
             'total': len(clientes),
-            'clientes': serializer.data
+            'clientes': clientes
         })
         
     except Exception as e:
@@ -122,58 +368,43 @@ def consultar_saldo_tool(request, cliente_id):
     - Información completa del saldo del cliente
     - Historial reciente de pagos para contexto
     """
+    return consultar_saldo(cliente_id, ip=request.META.get('REMOTE_ADDR'))
+
+def consultar_saldo(cliente_id, ip=None):
+    """
+    Lógica de la tool consultar_saldo, compartida por el endpoint
+    individual y por el endpoint batch
+    """
     try:
         # Convertir cliente_id a int y validar
         try:
             cliente_id = int(cliente_id)
-        except ValueError:
+        except (TypeError, ValueError):
             return Response({
                 'success': False,
                 'error': 'ID de cliente inválido',
                 'message': 'El ID debe ser un número entero'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Buscar cliente
-        cliente = get_object_or_404(Cliente, id=cliente_id, activo=True)
-        
-        # Obtener últimos 5 pagos para dar contexto al AI
-        ultimos_pagos = cliente.pagos.all()[:5]
+        # Respuesta desde la caché compartida (cache_tools.py) o la base
+        response_data = cache_tools.obtener(
+            'consultar_saldo',
+            f'saldo:{cliente_id}',
+            [cache_tools.version_cliente(cliente_id)],
+            lambda: calcular_saldo(cliente_id)
+        )
+        if response_data is None:
+            raise Cliente.DoesNotExist
         
         # Registrar consulta para auditoría
         registrar_accion(
             tipo='consulta',
-            descripcion=f'AI Tool: Consulta de saldo - {cliente.nombre}',
-            cliente=cliente,
-            ip=request.META.get('REMOTE_ADDR'),
+            descripcion=f'AI Tool: Consulta de saldo - {response_data["cliente"]["nombre"]}',
+            cliente=cliente_id,
+            ip=ip,
             metadata={'cliente_id': cliente_id}
         )
         
-        response_data = {
-            'success': True,
-            'cliente': {
-                'id': cliente.id,
-                'nombre': cliente.nombre,
-                'email': cliente.email,
-                'saldo': float(cliente.saldo),
-                'saldo_formateado': cliente.saldo_formateado,
-                'fecha_registro': cliente.fecha_registro
-            },
-            'ultimos_pagos': [
-                {
-                    'monto': float(pago.monto),
-                    'descripcion': pago.descripcion or 'Pago sin descripción',
-                    'fecha': pago.fecha.strftime('%d/%m/%Y %H:%M'),
-                    'metodo': pago.get_metodo_pago_display()
-                }
-                for pago in ultimos_pagos
-            ],
-            'resumen': {
-                'total_tickets': cliente.tickets.count(),
-                'total_pagos': cliente.pagos.count(),
-                'ultimo_pago_fecha': ultimos_pagos.first().fecha.strftime('%d/%m/%Y') if ultimos_pagos else 'Sin pagos'
-            }
-        }
-        
         return Response(response_data)
         
     except Cliente.DoesNotExist:
@@ -191,6 +422,128 @@ def consultar_saldo_tool(request, cliente_id):
             'message': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['GET'])
+def contexto_cliente_tool(request):
+    """
+    🤖 AI Tool: Todo el contexto de un cliente en un request, para el prompt del LLM
+
+    URL: GET /api/tools/contexto-cliente/?id=1
+         GET /api/tools/contexto-cliente/?q=nombre_o_email
+
+    Query params:
+    - id: ID del cliente, o
+    - q: búsqueda como en buscar-cliente (se usa el primer resultado)
+    - pagos: cantidad de últimos pagos (default 5, máximo 20)
+    - actividad: cantidad de acciones recientes del historial (default 5, máximo 20)
+    - formato: "texto" para recibir solo el resumen en text/plain
+
+    Returns:
+    - Cliente con saldo, tickets sin resolver, últimos pagos y actividad reciente
+    - "texto": resumen compacto listo para el prompt
+    """
+    response = contexto_cliente(request.GET, ip=request.META.get('REMOTE_ADDR'))
+    if request.GET.get('formato') == 'texto':
+        texto = response.data.get('texto') or response.data.get('message', '')
+        return HttpResponse(texto, status=response.status_code, content_type='text/plain; charset=utf-8')
+    return response
+
+def parametros_contexto(params):
+    """(max_pagos, max_actividad) de los query params, acotados"""
+    def entero(nombre, defecto):
+        try:
+            valor = int(params.get(nombre, defecto))
+        except (TypeError, ValueError):
+            valor = defecto
+        return min(max(valor, 0), MAX_LISTAS_CONTEXTO)
+    return entero('pagos', 5), entero('actividad', 5)
+
+def contexto_cliente(params, ip=None):
+    """
+    Lógica de la tool contexto_cliente, compartida por el endpoint
+    individual y por el endpoint batch
+    """
+    cliente_id = params.get('id')
+    query = str(params.get('q') or '').strip()
+    max_pagos, max_actividad = parametros_contexto(params)
+
+    if not cliente_id and not query:
+        return Response({
+            'success': False,
+            'error': 'Parámetro "id" o "q" requerido',
+            'message': 'Proporciona el ID del cliente o un nombre o email para buscarlo',
+            'ejemplo': '?q=Juan Perez'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        coincidencias = None
+        if cliente_id:
+            try:
+                cliente_id = int(cliente_id)
+            except (TypeError, ValueError):
+                return Response({
+                    'success': False,
+                    'error': 'ID de cliente inválido',
+                    'message': 'El ID debe ser un número entero'
+                }, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            # Misma entrada de caché que buscar_cliente
+            ids = cache_tools.obtener(
+                'buscar_cliente',
+                cache_tools.clave_busqueda(query),
+                [cache_tools.VERSION_BUSQUEDA],
+                lambda: ids_busqueda(query)
+            )
+            if not ids:
+                return Response({
+                    'success': False,
+                    'error': 'Cliente no encontrado',
+                    'message': f'No se encontraron clientes con "{query}"'
+                }, status=status.HTTP_404_NOT_FOUND)
+            cliente_id, coincidencias = ids[0], len(ids)
+
+        datos = cache_tools.obtener(
+            'contexto_cliente',
+            f'contexto:{cliente_id}:{max_pagos}:{max_actividad}',
+            [cache_tools.version_cliente(cliente_id)],
+            lambda: calcular_contexto(cliente_id, max_pagos, max_actividad)
+        )
+        if datos is None:
+            return Response({
+                'success': False,
+                'error': 'Cliente no encontrado',
+                'message': f'No existe cliente activo con ID {cliente_id}'
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        registrar_accion(
+            tipo='consulta',
+            descripcion=f'AI Tool: Contexto de cliente - {datos["cliente"]["nombre"]}',
+            cliente=cliente_id,
+            ip=ip,
+            metadata={'cliente_id': cliente_id, 'query': query or None}
+        )
+
+        return Response(con_coincidencias(datos, query, coincidencias))
+
+    except Exception as e:
+        logger.error(f"Error en contexto_cliente_tool: {e}")
+        return Response({
+            'success': False,
+            'error': 'Error interno del servidor',
+            'message': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+def con_coincidencias(datos, query, coincidencias):
+    """Agrega a la respuesta cacheada cuántos clientes coincidieron con ?q="""
+    if not coincidencias:
+        return datos
+    datos = {**datos, 'busqueda': {'q': query, 'coincidencias': coincidencias}}
+    if coincidencias > 1:
+        datos['texto'] += (
+            f'\n(Otros {coincidencias - 1} clientes coinciden con "{query}"; '
+            f'buscar-cliente los lista y ?id= elige otro.)'
+        )
+    return datos
+
 @api_view(['POST'])
 def crear_ticket_tool(request):
     """
@@ -206,12 +559,28 @@ def crear_ticket_tool(request):
         "prioridad": "media"             # baja/media/alta/critica (opcional)
     }
     
+    Headers (opcional):
+    - Idempotency-Key: un reintento con la misma clave recibe la respuesta
+      original sin crear otro ticket (también "tool_call_id" en el body)
+    
     Returns:
     - Información del ticket creado
     - Número de ticket para seguimiento
     """
+    return idempotencia.ejecutar(
+        'crear_ticket',
+        idempotencia.clave_de(request.META.get('HTTP_IDEMPOTENCY_KEY'), request.data),
+        request.data,
+        lambda: crear_ticket(request.data, ip=request.META.get('REMOTE_ADDR'))
+    )
+
+def crear_ticket(data, ip=None):
+    """
+    Lógica de la tool crear_ticket, compartida por el endpoint
+    individual y por el endpoint batch
+    """
     try:
-        data = request.data.copy()
+        data = data.copy()
         
         # Validaciones básicas de campos requeridos
         required_fields = ['cliente', 'titulo', 'descripcion']
@@ -255,26 +624,12 @@ def crear_ticket_tool(request):
                 tipo='creacion',
                 descripcion=f'AI Tool: Ticket creado - {ticket.titulo}',
                 cliente=cliente,
-                ip=request.META.get('REMOTE_ADDR'),
+                ip=ip,
                 metadata={'ticket_id': ticket.id, 'titulo': ticket.titulo}
             )
             
             # Respuesta optimizada para AI
-            response_data = {
-                'success': True,
-                'mensaje': '✅ Ticket creado exitosamente',
-                'ticket': {
-                    'id': ticket.id,
-                    'numero': f"#{ticket.id:06d}",  # Formato: #000001
-                    'cliente': cliente.nombre,
-                    'titulo': ticket.titulo,
-                    'descripcion': ticket.descripcion[:100] + '...' if len(ticket.descripcion) > 100 else ticket.descripcion,
-                    'estado': ticket.get_estado_display(),
-                    'prioridad': ticket.get_prioridad_display(),
-                    'fecha_creacion': ticket.fecha_creacion.strftime('%d/%m/%Y %H:%M')
-                },
-                'instrucciones': f'Ticket #{ticket.id:06d} creado. El cliente {cliente.nombre} puede hacer seguimiento con este número.'
-            }
+            response_data = datos_ticket_creado(ticket, cliente)
             
             return Response(response_data, status=status.HTTP_201_CREATED)
         
@@ -309,12 +664,28 @@ def registrar_pago_tool(request):
         "metodo_pago": "transferencia"     # efectivo/tarjeta/transferencia/cheque (opcional)
     }
     
+    Headers (opcional):
+    - Idempotency-Key: un reintento con la misma clave recibe la respuesta
+      original sin registrar otro pago (también "tool_call_id" en el body)
+    
     Returns:
     - Información del pago registrado
     - Saldo anterior y nuevo del cliente
     """
+    return idempotencia.ejecutar(
+        'registrar_pago',
+        idempotencia.clave_de(request.META.get('HTTP_IDEMPOTENCY_KEY'), request.data),
+        request.data,
+        lambda: registrar_pago(request.data, ip=request.META.get('REMOTE_ADDR'))
+    )
+
+def registrar_pago(data, ip=None):
+    """
+    Lógica de la tool registrar_pago, compartida por el endpoint
+    individual y por el endpoint batch
+    """
     try:
-        data = request.data.copy()
+        data = data.copy()
         
         # Validación de cliente requerido
         if not data.get('cliente'):
@@ -357,7 +728,6 @@ def registrar_pago_tool(request):
         # Verificar que el cliente existe
         try:
             cliente = get_object_or_404(Cliente, id=data['cliente'], activo=True)
-            saldo_anterior = float(cliente.saldo)
         except Cliente.DoesNotExist:
             return Response({
                 'success': False,
@@ -376,16 +746,18 @@ def registrar_pago_tool(request):
         if serializer.is_valid():
             pago = serializer.save()
             
-            # El saldo se actualiza automáticamente en el modelo Pago.save()
-            cliente.refresh_from_db()
+            # Pago.save() suma el monto con un UPDATE atómico y deja el
+            # saldo resultante en pago.cliente (sin releer el cliente)
+            cliente = pago.cliente
             saldo_nuevo = float(cliente.saldo)
+            saldo_anterior = float(cliente.saldo - pago.monto)
             
             # Registrar acción para auditoría
             registrar_accion(
                 tipo='pago',
                 descripcion=f'AI Tool: Pago registrado ${monto} - {cliente.nombre}',
                 cliente=cliente,
-                ip=request.META.get('REMOTE_ADDR'),
+                ip=ip,
                 metadata={
                     'pago_id': pago.id,
                     'monto': monto,
@@ -395,24 +767,7 @@ def registrar_pago_tool(request):
                 }
             )
             
-            response_data = {
-                'success': True,
-                'mensaje': '✅ Pago registrado exitosamente',
-                'pago': {
-                    'id': pago.id,
-                    'cliente': cliente.nombre,
-                    'monto': float(pago.monto),
-                    'descripcion': pago.descripcion or 'Pago registrado por AI Assistant',
-                    'metodo': pago.get_metodo_pago_display(),
-                    'fecha': pago.fecha.strftime('%d/%m/%Y %H:%M')
-                },
-                'saldos': {
-                    'anterior': saldo_anterior,
-                    'actual': saldo_nuevo,
-                    'incremento': saldo_nuevo - saldo_anterior
-                },
-                'confirmacion': f'💰 Saldo de {cliente.nombre} actualizado: ${saldo_anterior:,.2f} → ${saldo_nuevo:,.2f} (+${monto:,.2f})'
-            }
+            response_data = datos_pago_registrado(pago, cliente, monto, saldo_anterior, saldo_nuevo)
             
             return Response(response_data, status=status.HTTP_201_CREATED)
         
@@ -431,6 +786,136 @@ def registrar_pago_tool(request):
             'message': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+# Tools disponibles en el endpoint batch: nombre -> función(args, ip)
+TOOLS_BATCH = {
+    'buscar_cliente': buscar_cliente,
+    'consultar_saldo': lambda args, ip=None: consultar_saldo(args.get('cliente_id'), ip=ip),
+    'contexto_cliente': contexto_cliente,
+    'crear_ticket': crear_ticket,
+    'registrar_pago': registrar_pago,
+}
+
+# Tools de escritura que aceptan "idempotency_key" en la llamada
+TOOLS_IDEMPOTENTES = {'crear_ticket', 'registrar_pago'}
+
+MAX_LLAMADAS_BATCH = 25
+
+@api_view(['POST'])
+def batch_tools(request):
+    """
+    🤖 AI Tool: Ejecutar varias tool calls en un solo request HTTP
+
+    URL: POST /api/tools/batch/
+
+    Body params (JSON):
+    {
+        "atomic": false,                 # Todo o nada en una transacción (opcional)
+        "calls": [                       # Lista ordenada de llamadas (requerido)
+            {"tool": "buscar_cliente", "args": {"q": "María"}},
+            {"tool": "consultar_saldo", "args": {"cliente_id": 1}},
+            {"tool": "crear_ticket", "args": {"cliente": 1, "titulo": "...", "descripcion": "..."},
+             "idempotency_key": "call_abc123"}   # Opcional, solo tools de escritura
+        ]
+    }
+
+    Returns:
+    - Resultado, status y tiempo de cada llamada, en el mismo orden
+    - Con "atomic": true, si una llamada falla se revierten todas
+    """
+    calls = request.data.get('calls') if isinstance(request.data, dict) else request.data
+    atomic = request.data.get('atomic', False) if isinstance(request.data, dict) else False
+
+    # Solo booleanos JSON: "false" o "0" como strings activarían el modo todo o nada
+    if not isinstance(atomic, bool):
+        return Response({
+            'success': False,
+            'error': 'Parámetro "atomic" inválido',
+            'message': 'Usa true o false (booleano JSON)'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if not isinstance(calls, list) or not calls:
+        return Response({
+            'success': False,
+            'error': 'Parámetro "calls" requerido',
+            'message': 'Proporciona una lista de llamadas {tool, args}',
+            'tools_disponibles': list(TOOLS_BATCH),
+            'ejemplo': {'calls': [{'tool': 'buscar_cliente', 'args': {'q': 'Maria'}}]}
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    if len(calls) > MAX_LLAMADAS_BATCH:
+        return Response({
+            'success': False,
+            'error': f'Demasiadas llamadas (máximo {MAX_LLAMADAS_BATCH})',
+            'total_recibido': len(calls)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Validar todas las llamadas antes de ejecutar ninguna
+    errores = []
+    for indice, call in enumerate(calls):
+        if not isinstance(call, dict) or call.get('tool') not in TOOLS_BATCH:
+            errores.append({'indice': indice, 'error': 'Tool desconocida o llamada mal formada'})
+        elif not isinstance(call.get('args', {}), dict):
+            errores.append({'indice': indice, 'error': '"args" debe ser un objeto'})
+
+    if errores:
+        return Response({
+            'success': False,
+            'error': 'Llamadas inválidas en el batch',
+            'detalles': errores,
+            'tools_disponibles': list(TOOLS_BATCH)
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Cada llamada cuenta para el límite de tasa de su tool (limites.py)
+    if limites.config()['ACTIVO']:
+        quien = limites.identidad(request)
+        for tool, cantidad in Counter(call['tool'] for call in calls).items():
+            espera = limites.consumir(tool, quien, cantidad)
+            if espera:
+                return limites.demasiadas(tool, espera)
+
+    ip = request.META.get('REMOTE_ADDR')
+    resultados = []
+    inicio_batch = time.perf_counter()
+
+    # Todas las llamadas comparten la conexión del request; con atomic
+    # además comparten una única transacción
+    with transaction.atomic() if atomic else nullcontext():
+        for indice, call in enumerate(calls):
+            inicio = time.perf_counter()
+            args = call.get('args', {})
+            llamar = lambda: TOOLS_BATCH[call['tool']](args, ip=ip)
+            if call['tool'] in TOOLS_IDEMPOTENTES:
+                clave = idempotencia.clave_de(call.get('idempotency_key'), args)
+                response = idempotencia.ejecutar(call['tool'], clave, args, llamar)
+            else:
+                response = llamar()
+            exito = response.status_code < 400
+
+            resultados.append({
+                'indice': indice,
+                'tool': call['tool'],
+                'status': response.status_code,
+                'success': exito,
+                'tiempo_ms': round((time.perf_counter() - inicio) * 1000, 2),
+                'resultado': response.data
+            })
+
+            if atomic and not exito:
+                transaction.set_rollback(True)
+                break
+
+    revertido = atomic and not all(r['success'] for r in resultados)
+
+    return Response({
+        'success': all(r['success'] for r in resultados) and len(resultados) == len(calls),
+        'atomic': atomic,
+        'revertido': revertido,
+        'total': len(calls),
+        'ejecutadas': len(resultados),
+        'tiempo_total_ms': round((time.perf_counter() - inicio_batch) * 1000, 2),
+        'resultados': resultados
+    }, status=status.HTTP_409_CONFLICT if revertido else status.HTTP_200_OK)
+
 # ============= ENDPOINTS ADICIONALES =============
 
 @api_view(['GET'])
@@ -440,35 +925,15 @@ def estadisticas_dashboard(request):
     Útil para el AI assistant para dar contexto general del sistema
     """
     try:
+        # Contadores mantenidos por señales (estadisticas.py): una sola
+        # consulta, y ninguna si están en la caché compartida (cache_tools.py)
         stats = {
-            'clientes': {
-                'total': Cliente.objects.filter(activo=True).count(),
-                'con_saldo_positivo': Cliente.objects.filter(activo=True, saldo__gt=0).count(),
-                'registrados_hoy': Cliente.objects.filter(
-                    activo=True, 
-                    fecha_registro__date=timezone.now().date()
-                ).count(),
-            },
-            'tickets': {
-                'total': Ticket.objects.count(),
-                'abiertos': Ticket.objects.filter(estado='abierto').count(),
-                'en_proceso': Ticket.objects.filter(estado='en_proceso').count(),
-                'resueltos_hoy': Ticket.objects.filter(
-                    estado='resuelto',
-                    fecha_resolucion__date=timezone.now().date()
-                ).count(),
-                'pendientes': Ticket.objects.filter(
-                    estado__in=['abierto', 'en_proceso', 'pendiente']
-                ).count(),
-            },
-            'pagos_hoy': {
-                'total_transacciones': Pago.objects.filter(
-                    fecha__date=timezone.now().date()
-                ).count(),
-                'monto_total': float(sum(
-                    p.monto for p in Pago.objects.filter(fecha__date=timezone.now().date())
-                )),
-            },
+            **cache_tools.obtener(
+                'dashboard',
+                f'dashboard:{estadisticas.hoy()}',
+                [cache_tools.VERSION_DASHBOARD],
+                estadisticas.obtener_estadisticas
+            ),
             'sistema': {
                 'fecha_actual': timezone.now().strftime('%d/%m/%Y %H:%M'),
                 'timezone': 'America/Guayaquil (Ecuador)',
@@ -505,11 +970,95 @@ def health_check(request):
             'GET /api/tools/cliente/{id}/saldo/',
             'POST /api/tools/crear-ticket/',
             'POST /api/tools/registrar-pago/',
+            'POST /api/tools/batch/',
+            'GET /api/export/{clientes,tickets,pagos,historial}/?formato=ndjson|csv',
             'GET /api/dashboard/estadisticas/',
-            'GET /api/health/'
+            'GET /api/health/',
+            'GET /api/metrics/'
         ]
     })
 
+@require_GET
+def metricas_prometheus(request):
+    """
+    📈 Métricas por endpoint en formato de texto de Prometheus
+    
+    URL: GET /api/metrics/
+    Requests, latencia, queries, tiempo en DB y bytes por vista,
+    sumados entre workers si METRICAS['DIRECTORIO'] está configurado
+    """
+    return HttpResponse(
+        metricas.exposicion(metricas.estado_global()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
+
+# ============= EXPORTACIÓN (STREAMING) =============
+
+@require_GET
+def exportar(request, recurso):
+    """
+    📤 Exportación completa por streaming (NDJSON o CSV)
+    
+    URL: GET /api/export/{clientes,tickets,pagos,historial}/
+    Parámetros (opcionales):
+        - formato: ndjson (default) o csv
+        - desde / hasta: fechas AAAA-MM-DD, ambas inclusive (America/Guayaquil)
+        - cliente: ID del cliente
+        - incluir_archivo: 1 para incluir el historial archivado (solo historial)
+    
+    Las filas se envían a medida que se leen, en orden (fecha, id),
+    con memoria constante sin importar el tamaño de la exportación
+    """
+    if recurso not in exportacion.RECURSOS:
+        return JsonResponse({
+            'success': False,
+            'error': 'Recurso no exportable',
+            'recursos_validos': list(exportacion.RECURSOS)
+        }, status=404)
+    
+    formato = request.GET.get('formato', 'ndjson')
+    if formato not in exportacion.FORMATOS:
+        return JsonResponse({
+            'success': False,
+            'error': 'Formato inválido',
+            'formatos_validos': list(exportacion.FORMATOS)
+        }, status=400)
+    
+    filtros = {}
+    try:
+        for nombre in ('desde', 'hasta'):
+            if request.GET.get(nombre):
+                filtros[nombre] = date.fromisoformat(request.GET[nombre])
+        if request.GET.get('cliente'):
+            filtros['cliente_id'] = int(request.GET['cliente'])
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': 'Filtro inválido',
+            'message': str(e),
+            'ejemplo': {'desde': '2025-01-01', 'hasta': '2025-01-31', 'cliente': 1}
+        }, status=400)
+    
+    registrar_accion(
+        tipo='consulta',
+        descripcion=f'Exportación de {recurso} ({formato})',
+        ip=request.META.get('REMOTE_ADDR'),
+        metadata={'recurso': recurso, 'formato': formato, **{k: str(v) for k, v in filtros.items()}}
+    )
+    
+    columnas, tuplas = exportacion.filas(recurso, **filtros)
+    if recurso == 'historial' and request.GET.get('incluir_archivo') in ('1', 'true'):
+        # El archivo tiene las acciones más antiguas: van antes que las de la tabla
+        tuplas = chain(retencion.leer(**filtros), tuplas)
+    bloques = exportacion.GENERADORES[formato](columnas, tuplas)
+    # Bajo ASGI se envía un iterador async para no acumular la exportación en memoria
+    if isinstance(request, ASGIRequest):
+        bloques = exportacion.flujo_async(bloques)
+    
+    response = StreamingHttpResponse(bloques, content_type=exportacion.FORMATOS[formato])
+    response['Content-Disposition'] = f'attachment; filename="{recurso}.{formato}"'
+    return response
+
 # ============= VIEWSETS COMPLETOS (para administración) =============
 
 class ClienteViewSet(viewsets.ModelViewSet):
@@ -519,13 +1068,32 @@ class ClienteViewSet(viewsets.ModelViewSet):
     """
     queryset = Cliente.objects.filter(activo=True)
     serializer_class = ClienteSerializer
+    orden_cursor = ('nombre', 'id')  # ?paginacion=cursor (ver paginacion.py)
     
     def get_queryset(self):
         queryset = Cliente.objects.filter(activo=True)
         nombre = self.request.query_params.get('nombre')
         if nombre:
             queryset = queryset.filter(nombre__icontains=nombre)
-        return queryset.order_by('nombre')
+        
+        # total_tickets y ultimo_pago como anotaciones: la página completa
+        # sale en una sola consulta (ver ClienteSerializer)
+        # (subconsultas correlacionadas en vez de JOIN + GROUP BY: así el
+        # orden por nombre sale del índice parcial de clientes activos)
+        total_tickets = (
+            Ticket.objects.filter(cliente=OuterRef('pk'))
+            .order_by().values('cliente').annotate(total=Count('*')).values('total')
+        )
+        # (el último pago en una sola subconsulta: monto, fecha y descripción
+        # salen juntos como objeto JSON)
+        ultimo_pago = (
+            Pago.objects.filter(cliente=OuterRef('pk')).order_by('-fecha', '-id')
+            .values(datos=JSONObject(monto='monto', fecha='fecha', descripcion='descripcion'))[:1]
+        )
+        return queryset.annotate(
+            total_tickets=Coalesce(Subquery(total_tickets), 0),
+            ultimo_pago_datos=Subquery(ultimo_pago),
+        ).order_by('nombre')
 
 class TicketViewSet(viewsets.ModelViewSet):
     """
@@ -534,9 +1102,10 @@ class TicketViewSet(viewsets.ModelViewSet):
     """
     queryset = Ticket.objects.all()
     serializer_class = TicketSerializer
+    orden_cursor = ('-fecha_creacion', '-id')  # ?paginacion=cursor (ver paginacion.py)
     
     def get_queryset(self):
-        queryset = Ticket.objects.all()
+        queryset = Ticket.objects.select_related('cliente')
         estado = self.request.query_params.get('estado')
         if estado:
             queryset = queryset.filter(estado=estado)
@@ -548,11 +1117,18 @@ class TicketViewSet(viewsets.ModelViewSet):
         Acción personalizada para cambiar estado de ticket
         URL: POST /api/tickets/{id}/cambiar_estado/
         Body: {"estado": "resuelto"}
+        Solo transiciones de transiciones.TRANSICIONES (como el cambio masivo)
         """
         ticket = self.get_object()
         nuevo_estado = request.data.get('estado')
         
         estados_validos = [choice[0] for choice in Ticket.ESTADO_CHOICES]
+        if nuevo_estado in estados_validos and not transiciones.transicion_valida(ticket.estado, nuevo_estado):
+            return Response({
+                'success': False,
+                'error': f'Un ticket {ticket.get_estado_display()} no puede pasar a {nuevo_estado}',
+                'estados_validos': sorted(transiciones.TRANSICIONES[ticket.estado])
+            }, status=status.HTTP_400_BAD_REQUEST)
         if nuevo_estado in estados_validos:
             ticket.estado = nuevo_estado
             if nuevo_estado == 'resuelto' and not ticket.fecha_resolucion:
@@ -571,6 +1147,86 @@ class TicketViewSet(viewsets.ModelViewSet):
             'estados_validos': estados_validos
         }, status=status.HTTP_400_BAD_REQUEST)
 
+    @action(detail=False, methods=['post'], url_path='bulk-cambiar-estado')
+    def bulk_cambiar_estado(self, request):
+        """
+        Cambio de estado masivo (ver transiciones.py)
+        URL: POST /api/tickets/bulk-cambiar-estado/
+        Body: {"estado": "resuelto", "ids": [1, 2, 3]}
+           o: {"estado": "cerrado", "filtro": {"cliente": 5, "estado": ["resuelto"], "prioridad": "baja"}}
+        Responde conteos, no los tickets actualizados
+        """
+        nuevo_estado = request.data.get('estado')
+        ids = request.data.get('ids')
+        filtro = request.data.get('filtro')
+
+        if nuevo_estado not in transiciones.ESTADOS:
+            return Response({
+                'success': False,
+                'error': 'Estado inválido',
+                'estados_validos': transiciones.ESTADOS
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if (ids is None) == (filtro is None):
+            return Response({
+                'success': False,
+                'error': 'Indica "ids" o "filtro" (uno de los dos)'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if ids is not None:
+            if not isinstance(ids, list) or not all(type(i) is int for i in ids):
+                return Response({
+                    'success': False,
+                    'error': '"ids" debe ser una lista de enteros'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            ids = set(ids)
+            if len(ids) > transiciones.MAX_TICKETS:
+                return Response({
+                    'success': False,
+                    'error': f'Máximo {transiciones.MAX_TICKETS} tickets por solicitud'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            queryset = Ticket.objects.filter(id__in=ids)
+        else:
+            campos = {'cliente': 'cliente_id', 'estado': 'estado', 'prioridad': 'prioridad'}
+            if not isinstance(filtro, dict) or not filtro or set(filtro) - set(campos):
+                return Response({
+                    'success': False,
+                    'error': '"filtro" admite: ' + ', '.join(campos)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            queryset = Ticket.objects.all()
+            try:
+                for campo, valor in filtro.items():
+                    if isinstance(valor, list):
+                        queryset = queryset.filter(**{f'{campos[campo]}__in': valor})
+                    else:
+                        queryset = queryset.filter(**{campos[campo]: valor})
+            except (TypeError, ValueError):
+                return Response({
+                    'success': False,
+                    'error': 'Valor inválido en "filtro"'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            resumen = transiciones.cambiar_estado(
+                queryset,
+                nuevo_estado,
+                usuario=request.user if request.user.is_authenticated else None,
+                ip=request.META.get('REMOTE_ADDR'),
+                maximo=transiciones.MAX_TICKETS
+            )
+        except transiciones.DemasiadosTickets:
+            return Response({
+                'success': False,
+                'error': f'El filtro abarca más de {transiciones.MAX_TICKETS} tickets'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if ids is not None:
+            resumen['no_encontrados'] = len(ids) - resumen['encontrados']
+
+        return Response({
+            'success': True,
+            'estado': nuevo_estado,
+            **resumen
+        })
+
 class PagoViewSet(viewsets.ModelViewSet):
     """
     ViewSet completo para CRUD de pagos
@@ -578,9 +1234,10 @@ class PagoViewSet(viewsets.ModelViewSet):
     """
     queryset = Pago.objects.all()
     serializer_class = PagoSerializer
+    orden_cursor = ('-fecha', '-id')  # ?paginacion=cursor (ver paginacion.py)
     
     def get_queryset(self):
-        queryset = Pago.objects.all()
+        queryset = Pago.objects.select_related('cliente')
         cliente_id = self.request.query_params.get('cliente')
         if cliente_id:
             queryset = queryset.filter(cliente_id=cliente_id)
@@ -26,21 +26,14 @@ export async function POST(req: Request) {
     const ultimoMensaje = messages[messages.length - 1]?.content || '';
     let datosReales = '';
 
-    // CONSULTAR CLIENTES por nombre
+    // CONSULTAR CLIENTES por nombre: contexto completo en un solo request
     if (ultimoMensaje.includes('maría') || ultimoMensaje.includes('María') || ultimoMensaje.includes('garcía') || ultimoMensaje.includes('García')) {
-      const clientesData = await fetchFromDjango('/clientes/');
-      if (clientesData && clientesData.results) {
-        const maria = clientesData.results.find((cliente: any) => 
-          cliente.nombre.toLowerCase().includes('maría') || cliente.nombre.toLowerCase().includes('garcía')
-        );
-        
-        if (maria) {
-          datosReales = `CLIENTE: ${maria.nombre}, EMAIL: ${maria.email}, TELÉFONO: ${maria.telefono}, SALDO: ${maria.saldo_formateado}, ÚLTIMO PAGO: ${maria.ultimo_pago?.monto || 'N/A'} (${maria.ultimo_pago?.descripcion || 'Sin pagos'})`;
-        } else {
-          datosReales = 'Cliente María García no encontrado en el sistema';
-        }
+      const contexto = await fetchFromDjango('/tools/contexto-cliente/?q=' + encodeURIComponent('María García'));
+      if (contexto && contexto.success) {
+        datosReales = contexto.texto;
       } else {
-        datosReales = 'Error al conectar con la base de datos de clientes';
+        // fetchFromDjango retorna null también con el 404 de cliente no encontrado
+        datosReales = 'Cliente María García no encontrado en el sistema';
       }
     }
 